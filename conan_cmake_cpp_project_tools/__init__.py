@@ -1 +1,14 @@
-from .script import *
+# Script, CmdGenerator and the helpers in utils are loaded the first time they are used, so that entry points that
+# don't need them (i.e. ccc-client) start quickly.
+def __getattr__(name):
+    import os
+    import importlib
+    # `from . import module` asks for the attribute before importing the submodule. importing script
+    # in the middle of importing one of the modules it depends on would leave script half initialized.
+    if name.startswith('__') or os.path.exists(os.path.join(os.path.dirname(__file__),name+'.py')):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    script = importlib.import_module('.script',__name__)
+    try:
+        return getattr(script,name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
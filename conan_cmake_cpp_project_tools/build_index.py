@@ -0,0 +1,152 @@
+import os
+import json
+import stat
+import pathlib
+import platform
+from . import elf_utils
+from . import warm
+
+
+class BuildArtifactIndex:
+    '''
+    An index of the executables in a build directory.
+
+    The index records every executable below the build directory with its mtime, size, a debug-info flag
+    and (a guess at) the CMake target that produced it, so test discovery can be done with a lookup instead
+    of globbing the whole build tree. Directories that never contain test executables (CMakeFiles, etc.) are
+    not descended into at all.
+
+    The index is refreshed incrementally: a directory is only re-listed if its mtime changed (i.e. a file was
+    created, deleted, or renamed in it). For directories that did not change, only the executables that were
+    already in the index are stat'ed again.
+    '''
+    version = 1
+    pruned_directories = ['CMakeFiles','.cmake','.git']
+
+    def __init__(self,bdir:pathlib.Path,filename:pathlib.Path = None):
+        self.bdir = pathlib.Path(bdir).absolute()
+        self.filename = pathlib.Path(filename) if filename is not None else None
+        self.directories = {}
+
+    def load(self):
+        if self.filename is not None and self.filename.exists():
+            try:
+                data = json.loads(self.filename.read_text())
+                if data.get('version',None) == self.version:
+                    self.directories = data['directories']
+            except (ValueError,KeyError):
+                self.directories = {}
+        return self
+
+    def save(self):
+        if self.filename is None:
+            return
+        self.filename.parent.mkdir(parents=True,exist_ok=True)
+        self.filename.write_text( json.dumps({'version':self.version,'directories':self.directories}) )
+
+    def refresh(self):
+        '''
+        Bring the index up to date with the build directory.
+        '''
+        directories = {}
+        pending = ['.']
+        while len(pending):
+            rel_dir = pending.pop()
+            abs_dir = self.bdir/rel_dir
+            try:
+                mtime = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = self.directories.get(rel_dir,None)
+            if entry is not None and entry['mtime'] == mtime:
+                entry = self._update_directory_entry(abs_dir,entry)
+            else:
+                entry = self._make_directory_entry(abs_dir,mtime,entry)
+
+            directories[rel_dir] = entry
+            pending += [ os.path.normpath(os.path.join(rel_dir,d)) for d in entry['subdirs'] ]
+
+        self.directories = directories
+        return self
+
+    def _make_executable_entry(self,path:pathlib.Path,st,old_entry):
+        if old_entry is not None and old_entry['mtime'] == st.st_mtime_ns and old_entry['size'] == st.st_size:
+            return old_entry
+        return { 'mtime': st.st_mtime_ns,
+                 'size': st.st_size,
+                 'debug': platform.system().lower() == "linux" and elf_utils.has_debug_info(path),
+                 'target': path.stem,
+               }
+
+    def _make_directory_entry(self,abs_dir:pathlib.Path,mtime:int,old_entry):
+        old_executables = old_entry['executables'] if old_entry is not None else {}
+        entry = {'mtime':mtime,'subdirs':[],'executables':{}}
+        try:
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            return entry
+
+        for e in entries:
+            try:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name not in self.pruned_directories:
+                        entry['subdirs'].append(e.name)
+                    continue
+                st = e.stat()
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode) and st.st_mode & (stat.S_IXUSR|stat.S_IXGRP|stat.S_IXOTH) and os.access(e.path,os.X_OK):
+                entry['executables'][e.name] = self._make_executable_entry(pathlib.Path(e.path),st,old_executables.get(e.name,None))
+
+        entry['subdirs'].sort()
+        return entry
+
+    def _update_directory_entry(self,abs_dir:pathlib.Path,entry):
+        # no files were added or removed, but executables may have been rewritten in place.
+        executables = {}
+        for name,old_entry in entry['executables'].items():
+            path = abs_dir/name
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            executables[name] = self._make_executable_entry(path,st,old_entry)
+        entry['executables'] = executables
+        return entry
+
+    def items(self):
+        '''
+        Return a list of (path,entry) tuples for all executables in the index, sorted by path.
+        '''
+        items = []
+        for rel_dir,entry in self.directories.items():
+            for name,exe_entry in entry['executables'].items():
+                items.append( (pathlib.Path(os.path.normpath(self.bdir/rel_dir/name)),exe_entry) )
+        return sorted(items,key=lambda item: item[0])
+
+    def executables(self,debug_only=False):
+        '''
+        Return a list of all executables in the index.
+        '''
+        return [ path for path,entry in self.items() if entry['debug'] or not debug_only ]
+
+    def get(self,path:pathlib.Path):
+        path = pathlib.Path(path).absolute()
+        rel_dir = os.path.normpath(os.path.relpath(path.parent,self.bdir))
+        entry = self.directories.get(rel_dir,None)
+        if entry is None:
+            return None
+        return entry['executables'].get(path.name,None)
+
+
+def get_build_artifact_index(bdir:pathlib.Path,filename:pathlib.Path = None):
+    '''
+    Load, refresh, and save the build artifact index for a build directory.
+    '''
+    if filename is None:
+        filename = pathlib.Path(bdir)/'ccc-artifacts.json'
+    index = warm.memoize('build_artifact_index',(str(bdir),str(filename)),lambda: BuildArtifactIndex(bdir,filename).load())
+    index.refresh()
+    index.save()
+    return index
@@ -0,0 +1,230 @@
+import os
+import json
+import pathlib
+from .change_impact import read_ninja_build_statements
+
+# Build time analysis from Ninja's build log (`ccc build-report`).
+#
+# Ninja appends a line to .ninja_log for every edge (command) it runs: the start and end times (in milliseconds,
+# relative to the start of that ninja run), the output's mtime, the output, and a hash of the command. An edge with
+# several outputs gets one line per output. The log is only ever appended to, except when ninja recompacts it (which
+# it does at the start of a build), so we remember how far we have read and only parse what was added since. Times
+# go back to zero when a new ninja run starts, which is how the builds are told apart.
+#
+# Only the last two builds are kept, the last one is reported and the one before it is what it is compared to.
+
+compile_suffixes = ['.o','.obj']
+link_suffixes = ['.a','.so','.dylib','.lib','.dll','.exe']
+
+
+def parse_ninja_log_line(line:str):
+    '''
+    Parse a line of .ninja_log and return (start,end,output,hash), or None if it is not an entry.
+    '''
+    if line.startswith('#'):
+        return None
+    fields = line.rstrip('\n').split('\t')
+    if len(fields) < 5:
+        return None
+    try:
+        return int(fields[0]),int(fields[1]),fields[3],fields[4]
+    except ValueError:
+        return None
+
+
+def classify_output(output:str):
+    '''
+    Return 'compile', 'link', or 'other' for a build output.
+    '''
+    name = os.path.basename(output)
+    suffix = os.path.splitext(name)[1]
+    if suffix in compile_suffixes:
+        return 'compile'
+    if suffix in link_suffixes or '.so.' in name or (suffix == '' and not name.startswith('.')):
+        return 'link'
+    return 'other'
+
+
+class NinjaLog:
+    '''
+    The edges of the last two builds recorded in a build directory's .ninja_log.
+
+    builds : a list of (at most two) builds, oldest first. a build is a list of edges, and an edge is a dict with
+             'start' and 'end' (ms), 'outputs', and 'hash'.
+    '''
+    version = 1
+
+    def __init__(self,bdir:pathlib.Path,state_filename:pathlib.Path = None):
+        self.bdir = pathlib.Path(bdir)
+        self.log_filename = self.bdir/'.ninja_log'
+        self.state_filename = pathlib.Path(state_filename) if state_filename is not None else None
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.builds = []
+        self.last_end = None
+
+    def load(self):
+        if self.state_filename is not None and self.state_filename.exists():
+            try:
+                data = json.loads(self.state_filename.read_text())
+                if data.get('version',None) == self.version:
+                    self.offset = data['offset']
+                    self.inode = data['inode']
+                    self.builds = data['builds']
+                    self.last_end = data['last_end']
+            except (ValueError,KeyError):
+                self.reset()
+        return self
+
+    def save(self):
+        if self.state_filename is None:
+            return
+        self.state_filename.parent.mkdir(parents=True,exist_ok=True)
+        self.state_filename.write_text( json.dumps({'version':self.version,
+                                                    'offset':self.offset,
+                                                    'inode':self.inode,
+                                                    'builds':self.builds,
+                                                    'last_end':self.last_end}) )
+
+    def update(self):
+        '''
+        Read the entries that were added to the log since the last update.
+        '''
+        try:
+            st = os.stat(self.log_filename)
+        except OSError:
+            self.reset()
+            return self
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            # the log was recompacted (or replaced), start over
+            self.reset()
+            self.inode = st.st_ino
+
+        with open(self.log_filename,'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        # only read complete lines, ninja may be writing the log right now
+        end = data.rfind(b'\n')+1
+        self.offset += end
+        for line in data[:end].decode('utf-8','replace').splitlines():
+            self.add_entry(parse_ninja_log_line(line))
+        return self
+
+    def add_entry(self,entry):
+        if entry is None:
+            return
+        start,end,output,cmd_hash = entry
+        if self.last_end is None or end < self.last_end or len(self.builds) == 0:
+            # times restart at zero for every ninja run
+            self.builds.append([])
+            del self.builds[:-2]
+        self.last_end = end
+        build = self.builds[-1]
+        # an edge with several outputs has a line for each of them
+        if len(build) and build[-1]['start'] == start and build[-1]['end'] == end and build[-1]['hash'] == cmd_hash:
+            build[-1]['outputs'].append(output)
+        else:
+            build.append({'start':start,'end':end,'outputs':[output],'hash':cmd_hash})
+
+    def last_build(self):
+        return self.builds[-1] if len(self.builds) else None
+
+    def previous_build(self):
+        return self.builds[-2] if len(self.builds) > 1 else None
+
+
+def get_critical_path(edges, statements):
+    '''
+    Return the chain of edges (first to last) that took the longest in total, following the dependencies in
+    build.ninja. Edges that were not run in the build count as zero, so the chain can pass through them.
+
+    @param statements : (outputs,rule,explicit_inputs,implicit_inputs) tuples from read_ninja_build_statements.
+    '''
+    inputs_of = {}
+    for outputs,rule,explicit,implicit in statements:
+        for output in outputs:
+            inputs_of[output] = explicit + implicit
+    edge_of = {}
+    for edge in edges:
+        for output in edge['outputs']:
+            edge_of[output] = edge
+
+    # longest path ending at each node, computed depth first without recursion (build graphs can be very deep)
+    longest = {}
+    for root in edge_of:
+        stack = [(root,False)]
+        while len(stack):
+            node,expanded = stack.pop()
+            if node in longest:
+                continue
+            inputs = inputs_of.get(node,[])
+            if not expanded:
+                stack.append((node,True))
+                stack += [ (i,False) for i in inputs if i not in longest ]
+                continue
+            best = max( ((longest[i][0],i) for i in inputs if i in longest), default=(0,None) )
+            edge = edge_of.get(node,None)
+            duration = edge['end'] - edge['start'] if edge is not None else 0
+            longest[node] = (best[0] + duration, best[1])
+
+    if len(longest) == 0:
+        return 0,[]
+    node = max( edge_of, key=lambda n: longest[n][0] )
+    total = longest[node][0]
+    path = []
+    while node is not None:
+        if node in edge_of and (len(path) == 0 or path[-1] is not edge_of[node]):
+            path.append(edge_of[node])
+        node = longest[node][1]
+    return total,list(reversed(path))
+
+
+def analyze_build(edges, statements = None, top:int = 10):
+    '''
+    Summarize a build: wall time, the time spent in each kind of edge, effective parallelism (the sum of the edge
+    durations over the wall time), the slowest compiles and links, and the critical path (if the build statements
+    are given).
+    '''
+    durations = [ e['end'] - e['start'] for e in edges ]
+    wall = max( (e['end'] for e in edges), default=0 ) - min( (e['start'] for e in edges), default=0 )
+    total = sum(durations)
+    kinds = {'compile':[],'link':[],'other':[]}
+    for edge in edges:
+        kinds[classify_output(edge['outputs'][0])].append(edge)
+
+    def slowest(edges):
+        return sorted(edges,key=lambda e: e['start']-e['end'])[:top]
+
+    summary = {'edges':len(edges),
+               'wall_ms':wall,
+               'total_ms':total,
+               'parallelism':total/wall if wall > 0 else None,
+               'compile_ms':sum( e['end']-e['start'] for e in kinds['compile'] ),
+               'link_ms':sum( e['end']-e['start'] for e in kinds['link'] ),
+               'slowest_compiles':slowest(kinds['compile']),
+               'slowest_links':slowest(kinds['link']),
+               'critical_path':None,
+               'critical_path_ms':None}
+    if statements is not None:
+        summary['critical_path_ms'],summary['critical_path'] = get_critical_path(edges,statements)
+    return summary
+
+
+def compare_builds(previous, last, top:int = 10):
+    '''
+    Return the outputs that were built in both builds, sorted by how much slower they got in the last one, as a list
+    of (output,previous_ms,last_ms) tuples.
+    '''
+    previous_durations = { e['outputs'][0]: e['end']-e['start'] for e in previous }
+    changes = [ (e['outputs'][0],previous_durations[e['outputs'][0]],e['end']-e['start']) for e in last if e['outputs'][0] in previous_durations ]
+    return sorted(changes,key=lambda c: c[1]-c[2])[:top]
+
+
+def load_build_statements(bdir:pathlib.Path):
+    build_ninja = pathlib.Path(bdir)/'build.ninja'
+    if not build_ninja.exists():
+        return None
+    return read_ninja_build_statements(build_ninja)
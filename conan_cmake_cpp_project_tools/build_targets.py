@@ -0,0 +1,79 @@
+import re
+import pathlib
+import subprocess
+from .core_utils import *
+from .path_filter_utils import PatternSet
+from . import tracing
+
+# Selecting the build targets for the test executables that `ccc test` will run, so that only those targets (and what
+# they depend on) are built, not the whole project.
+#
+# The targets are listed by the generator's `help` target (`cmake --build . --target help`). For Makefiles, each
+# target is listed as "... name", and for Ninja the help target runs `ninja -t targets`, which lists "name: rule" for
+# every edge, including object files and the library files themselves. Neither says which targets are executables,
+# so the test include/exclude patterns are matched against the target names, and anything that is obviously not a
+# project target (files, and the targets CMake and CTest add) is dropped.
+
+# targets that CMake (and CTest's dashboard support) add to every project
+builtin_targets = ['all','clean','depend','help','edit_cache','rebuild_cache','install','list_install_components',
+                   'test','package','package_source','preinstall']
+builtin_target_patterns = PatternSet('cmake_*','Continuous*','Experimental*','Nightly*','*.dir')
+file_suffixes = ['.o','.obj','.i','.s','.a','.so','.dylib','.lib','.dll','.exe','.ninja','.cmake','.txt']
+
+
+def is_project_target(name:str):
+    if '/' in name or '\\' in name or name in builtin_targets:
+        return False
+    if builtin_target_patterns(name):
+        return False
+    if any( name.endswith(suffix) for suffix in file_suffixes ) or re.search(r'\.so\.[0-9.]+$',name):
+        return False
+    return True
+
+
+def parse_target_help(text:str):
+    '''
+    Return the project targets listed in the output of the `help` target (Makefiles or Ninja).
+    '''
+    targets = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('... '):
+            # "... all (the default if no target is provided)"
+            name = line[4:].split(' ',1)[0]
+        elif ': ' in line and not line.startswith('The following'):
+            name = line.split(': ',1)[0]
+        else:
+            continue
+        if is_project_target(name) and name not in targets:
+            targets.append(name)
+    return targets
+
+
+def get_build_targets(bdir:pathlib.Path, cmake:str = 'cmake'):
+    '''
+    Return the project targets in a configured build directory, or None if they could not be listed.
+    '''
+    with tracing.span("list build targets",'subprocess'):
+        try:
+            result = subprocess.run([cmake,'--build',str(bdir),'--target','help'],capture_output=True)
+        except OSError:
+            return None
+    if result.returncode != 0:
+        return None
+    return parse_target_help(result.stdout.decode(encoding,'replace'))
+
+
+def select_targets(targets, include_patterns, exclude_patterns):
+    '''
+    Return the targets whose names match an include pattern and no exclude pattern, or None if an include pattern
+    cannot be matched against target names (it names a directory), in which case everything has to be built.
+
+    Exclude patterns that name a directory (i.e. the default '*/CMakeFiles/*') are ignored. At worst, that builds a
+    target whose executable is not run.
+    '''
+    if any( '/' in pattern for pattern in include_patterns ):
+        return None
+    include = PatternSet(include_patterns)
+    exclude = PatternSet([ pattern for pattern in exclude_patterns if '/' not in pattern ])
+    return [ name for name in targets if include(name) and not exclude(name) ]
@@ -0,0 +1,350 @@
+import os
+import json
+import shlex
+import fnmatch
+import shutil
+import pathlib
+import subprocess
+from .core_utils import *
+
+# Select the test executables that are affected by a set of changed files.
+#
+# The build system already records what each object file was compiled from (depfiles for Makefiles, `ninja -t deps`
+# for Ninja, or, as a last resort, compile_commands.json which only knows the source file). We combine that with
+# the link graph (what objects and libraries each executable/library is linked from), which is read from the
+# `link.txt` files that CMake writes for Makefiles, or from build.ninja for Ninja.
+#
+# Whenever something is not known (i.e. an executable that does not appear in the link graph), the executable is
+# treated as affected, so that we only ever skip tests that we know are not affected.
+
+# changes to these files can affect every target
+configuration_file_patterns = ['CMakeLists.txt','*.cmake','conanfile.txt','conanfile.py','conandata.yml','CMakePresets.json']
+
+static_library_tools = ['ar','llvm-ar','gcc-ar']
+library_suffixes = ['.a','.so','.dylib','.lib']
+
+
+def normalize(path,cwd = None):
+    path = pathlib.Path(path)
+    if not path.is_absolute() and cwd is not None:
+        path = pathlib.Path(cwd)/path
+    return pathlib.Path(os.path.normpath(path))
+
+
+def get_changed_files(path:pathlib.Path, ref:str):
+    '''
+    Return the set of files (absolute paths) that have changed since a git ref, including uncommitted and untracked files.
+    '''
+    git = shutil.which('git')
+    if git is None:
+        raise RuntimeError("Could not find git. It is needed to determine changed files.")
+    result = subprocess.run([git,'rev-parse','--show-toplevel'],capture_output=True,cwd=path)
+    if result.returncode != 0:
+        raise RuntimeError(f"'{path}' is not in a git repository.")
+    top = pathlib.Path(result.stdout.decode(encoding).strip())
+
+    result = subprocess.run([git,'diff','--name-only','-z',ref,'--'],capture_output=True,cwd=top)
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not get changes since '{ref}': {result.stderr.decode(encoding).strip()}")
+    files = [ f for f in result.stdout.split(b'\0') if len(f) ]
+
+    # untracked files inside build directories (that are not ignored) are not changes to the project
+    build_dirs = {}
+    def in_build_dir(file:pathlib.Path):
+        for parent in file.parents:
+            if parent == top:
+                return False
+            if parent not in build_dirs:
+                build_dirs[parent] = (parent/'CMakeCache.txt').exists()
+            if build_dirs[parent]:
+                return True
+        return False
+
+    result = subprocess.run([git,'ls-files','--others','--exclude-standard','-z'],capture_output=True,cwd=top)
+    files = set( normalize(top/os.fsdecode(f)) for f in files )
+    files.update( f for f in ( normalize(top/os.fsdecode(f)) for f in result.stdout.split(b'\0') if len(f) ) if not in_build_dir(f) )
+
+    return files
+
+
+def _split_make_words(text:str):
+    '''
+    Split a (continuation-joined) line of a Makefile-style depfile into words, handling escaped spaces.
+    '''
+    words = []
+    word = ''
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i+1 < len(text) and text[i+1] in ' #\\':
+            word += text[i+1]
+            i += 2
+            continue
+        if c == '$' and i+1 < len(text) and text[i+1] == '$':
+            word += '$'
+            i += 2
+            continue
+        if c.isspace():
+            if word:
+                words.append(word)
+            word = ''
+        else:
+            word += c
+        i += 1
+    if word:
+        words.append(word)
+    return words
+
+
+def parse_depfile(text:str):
+    '''
+    Parse a Makefile-style depfile (as written by gcc/clang -MD) and return a dict of target -> list of dependencies.
+    '''
+    deps = {}
+    text = text.replace('\\\r\n',' ').replace('\\\n',' ')
+    for line in text.splitlines():
+        if ':' not in line:
+            continue
+        # the first unescaped colon followed by whitespace (or end of line) separates targets and dependencies
+        # (so that windows drive letters are not split)
+        i = 0
+        while True:
+            i = line.find(':',i)
+            if i < 0 or i+1 >= len(line) or line[i+1].isspace():
+                break
+            i += 1
+        if i < 0:
+            continue
+        targets = _split_make_words(line[:i])
+        dependencies = _split_make_words(line[i+1:])
+        for target in targets:
+            deps.setdefault(target,[]).extend(dependencies)
+    return deps
+
+
+def parse_ninja_deps(text:str):
+    '''
+    Parse the output of `ninja -t deps` and return a dict of output -> list of dependencies.
+    '''
+    deps = {}
+    current = None
+    for line in text.splitlines():
+        if not line.strip():
+            current = None
+            continue
+        if line[0].isspace():
+            if current is not None:
+                deps[current].append(line.strip())
+        elif ': #deps' in line:
+            current = line[:line.index(': #deps')]
+            deps[current] = []
+    return deps
+
+
+def _split_ninja_words(text:str):
+    words = []
+    word = ''
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '$' and i+1 < len(text):
+            word += text[i+1]
+            i += 2
+            continue
+        if c == ' ':
+            if word:
+                words.append(word)
+            word = ''
+        else:
+            word += c
+        i += 1
+    if word:
+        words.append(word)
+    return words
+
+
+def read_ninja_build_statements(filename:pathlib.Path):
+    '''
+    Return a list of (outputs,rule,explicit_inputs,implicit_inputs) tuples for the build statements in a ninja file
+    (and any files it includes).
+    '''
+    filename = pathlib.Path(filename)
+    statements = []
+    if not filename.exists():
+        return statements
+
+    lines = []
+    current = ''
+    for line in filename.read_text(errors='replace').splitlines():
+        if line.endswith('$') and not line.endswith('$$'):
+            current += line[:-1]
+            continue
+        current += line.lstrip() if current else line
+        lines.append(current)
+        current = ''
+
+    for line in lines:
+        if line.startswith('include ') or line.startswith('subninja '):
+            statements += read_ninja_build_statements(filename.parent/line.split(None,1)[1].strip())
+            continue
+        if not line.startswith('build '):
+            continue
+        # find the unescaped colon separating the outputs from the rule
+        i = len('build ')
+        while i < len(line):
+            if line[i] == '$':
+                i += 2
+                continue
+            if line[i] == ':':
+                break
+            i += 1
+        outputs = _split_ninja_words(line[len('build '):i].split(' | ')[0])
+        words = _split_ninja_words(line[i+1:])
+        if len(words) == 0:
+            continue
+        rule = words[0]
+        explicit,implicit = [],[]
+        section = explicit
+        for word in words[1:]:
+            if word == '|':
+                section = implicit
+            elif word == '||' or word == '|@':
+                section = []
+            else:
+                section.append(word)
+        statements.append( (outputs,rule,explicit,implicit) )
+    return statements
+
+
+class BuildDependencies:
+    '''
+    The link graph and compile dependencies of a CMake build directory.
+
+    link_inputs : artifact -> list of objects and libraries it is linked from
+    compile_inputs : object -> list of sources and headers it was compiled from
+    '''
+    def __init__(self,bdir:pathlib.Path):
+        self.bdir = pathlib.Path(bdir).absolute()
+        self.link_inputs = {}
+        self.compile_inputs = {}
+
+    def load(self):
+        if (self.bdir/'build.ninja').exists():
+            self._load_ninja()
+        else:
+            self._load_make()
+        self._load_compile_commands()
+        return self
+
+    def _load_ninja(self):
+        for outputs,rule,explicit,implicit in read_ninja_build_statements(self.bdir/'build.ninja'):
+            if 'LINKER' in rule:
+                inputs = [ normalize(p,self.bdir) for p in explicit + implicit ]
+                for output in outputs:
+                    self.link_inputs[normalize(output,self.bdir)] = inputs
+
+        ninja = shutil.which('ninja')
+        if ninja is not None:
+            result = subprocess.run([ninja,'-t','deps'],capture_output=True,cwd=self.bdir)
+            if result.returncode == 0:
+                for output,deps in parse_ninja_deps(result.stdout.decode(encoding,'replace')).items():
+                    self.compile_inputs[normalize(output,self.bdir)] = [ normalize(d,self.bdir) for d in deps ]
+
+    def _load_make(self):
+        for link_txt in self.bdir.glob('**/CMakeFiles/*.dir/link.txt'):
+            # commands in link.txt are run from the directory that contains the CMakeFiles directory
+            cwd = link_txt.parent.parent.parent
+            for line in link_txt.read_text(errors='replace').splitlines():
+                try:
+                    words = shlex.split(line)
+                except ValueError:
+                    continue
+                if len(words) < 3:
+                    continue
+                output = None
+                if '-o' in words[:-1]:
+                    output = words[words.index('-o')+1]
+                elif pathlib.Path(words[0]).name in static_library_tools:
+                    output = words[2]
+                if output is None:
+                    continue
+                inputs = [ w for w in words[1:] if w != output and not w.startswith('-') and (w.endswith('.o') or w.endswith('.obj') or any( w.endswith(s) or (s+'.') in w for s in library_suffixes )) ]
+                self.link_inputs.setdefault(normalize(output,cwd),[]).extend( normalize(w,cwd) for w in inputs )
+
+        for depfile in self.bdir.glob('**/CMakeFiles/*.dir/**/*.d'):
+            # depfile targets are relative to the directory that contains the CMakeFiles directory
+            cwd = next( p for p in depfile.parents if p.name == 'CMakeFiles' ).parent
+            for target,deps in parse_depfile(depfile.read_text(errors='replace')).items():
+                self.compile_inputs[normalize(target,cwd)] = [ normalize(d,cwd) for d in deps ]
+
+    def _load_compile_commands(self):
+        # only used for objects that we don't have dependency information for. this only knows about
+        # the source file, not the headers it includes.
+        compile_commands = self.bdir/'compile_commands.json'
+        if not compile_commands.exists():
+            return
+        try:
+            entries = json.loads(compile_commands.read_text())
+        except ValueError:
+            return
+        for entry in entries:
+            cwd = entry.get('directory',self.bdir)
+            output = entry.get('output',None)
+            if output is None:
+                words = entry['arguments'] if 'arguments' in entry else shlex.split(entry.get('command',''))
+                if '-o' in words[:-1]:
+                    output = words[words.index('-o')+1]
+            if output is None:
+                continue
+            output = normalize(output,cwd)
+            if output not in self.compile_inputs:
+                self.compile_inputs[output] = [ normalize(entry['file'],cwd) ]
+
+    def get_inputs(self,artifact:pathlib.Path):
+        '''
+        Return the set of all sources/headers that an artifact depends on, or None if they are not (fully) known.
+        '''
+        inputs = set()
+        visited = set()
+        pending = [ normalize(pathlib.Path(artifact).absolute()) ]
+        while len(pending):
+            artifact = pending.pop()
+            if artifact in visited:
+                continue
+            visited.add(artifact)
+            if artifact in self.link_inputs:
+                pending += self.link_inputs[artifact]
+            elif artifact in self.compile_inputs:
+                inputs.update(self.compile_inputs[artifact])
+            elif len(visited) == 1:
+                # we don't know anything about the executable itself
+                return None
+            elif artifact.is_relative_to(self.bdir):
+                # something built in this build directory that we don't have information for
+                return None
+            # otherwise, it is an external library (i.e. from a Conan package). changes to those are handled
+            # by the install_deps step.
+        return inputs
+
+
+def select_affected(exes, bdir:pathlib.Path, changed_files, dependencies:BuildDependencies = None):
+    '''
+    Sort executables into those that are (or may be) affected by changes to the given files, and those that are not.
+    The build directory's dependencies are loaded unless they are given (i.e. to sort several batches of executables).
+
+    Returns a tuple of lists: (affected,unaffected).
+    '''
+    changed_files = set( normalize(pathlib.Path(f).absolute()) for f in changed_files )
+    if any( fnmatch.fnmatch(f.name,pattern) for f in changed_files for pattern in configuration_file_patterns ):
+        return list(exes),[]
+
+    if dependencies is None:
+        dependencies = BuildDependencies(bdir).load()
+    affected,unaffected = [],[]
+    for exe in exes:
+        inputs = dependencies.get_inputs(exe)
+        if inputs is None or len(inputs & changed_files) > 0:
+            affected.append(exe)
+        else:
+            unaffected.append(exe)
+    return affected,unaffected
@@ -1,23 +1,34 @@
+import os
+import sys
+import copy
 import typer
 import typing
+import time
 import pathlib
 import tempfile
 import fnmatch
-import yaml
 from rich import print
 import conan_cmake_cpp_project_tools.config as config
 import conan_cmake_cpp_project_tools.utils as utils
-import conan_cmake_cpp_project_tools.steps as steps
+import conan_cmake_cpp_project_tools.warm as warm
+import conan_cmake_cpp_project_tools.tracing as tracing
+
+# `ccc` is called a lot by editor integrations and things like `entr`, so startup time matters. modules that are only
+# needed to run steps (steps, fingerprint, watch, yaml, ...) are imported in the functions that use them, and
+# anything that searches the project is deferred until a command reads the setting.
+# tests/test_startup.py checks that they are not imported at startup.
 
 
 APP_NAME="ccc"
 app = typer.Typer(name=APP_NAME)
 cfg = config.ConfSettings()
 progress = config.fspathtree()
+progress_loaded = False
 
 
 @app.callback()
-def main(config_file:pathlib.Path=typer.Option(None,help='ccc project config file to use.')
+def main(ctx:typer.Context
+        ,config_file:pathlib.Path=typer.Option(None,help='ccc project config file to use.')
         ,build_type:str=typer.Option("Debug",help='The build type to compile/test.')
         ,release:bool=typer.Option(None,"--release/--debug","-R/-D",help='Set build type to "Release" or "Debug"')
         ,build_dir:pathlib.Path=typer.Option(None,help='The build directory to compile/test in. Auto-generated by default.')
@@ -26,8 +37,13 @@ def main(config_file:pathlib.Path=typer.Option(None,help='ccc project config fil
         ,cmakefile:pathlib.Path=typer.Option(None,help='The CMakeLists.txt file to use.')
         ,write_scripts:bool=typer.Option(False,"--write-scripts","-w",help='Write shell scripts to perform each build/test phase.')
         ,config_settings:typing.Optional[typing.List[str]] = typer.Option(None,help='Override project configuration settings.')
+        ,trace:pathlib.Path=typer.Option(None,help='Write a trace of the command (in the Trace Event Format that chrome://tracing and Perfetto load) to this file.')
         ):
 
+    reset()
+    if trace is not None:
+        start_trace(ctx,trace.absolute())
+
     if release:
         build_type = "Release"
     if release is not None and not release:
@@ -35,33 +51,43 @@ def main(config_file:pathlib.Path=typer.Option(None,help='ccc project config fil
 
     config.set_defaults(cfg)
     if root_dir is None:
-        root_dir = utils.find_project_root(pathlib.Path())
+        with tracing.span('find project root','config'):
+            root_dir = warm.memoize('project_root',os.getcwd(),lambda: utils.find_project_root(pathlib.Path()),valid=lambda r: r is not None)
     if root_dir is None:
         print(f"[red]Could not determine root project directory for '{pathlib.Path()}'[/red]")
         raise typer.Exit(code=1)
     root_dir = root_dir.absolute()
 
-    config.load_config_files(cfg,root_dir,"ccc")
+    with tracing.span('load config files','config'):
+        config.load_config_files(cfg,root_dir,"ccc")
 
     cfg['/build_type'] = build_type
     cfg['/directories/root'] = root_dir
 
     config.set_default_build_dir(cfg)
-    config.set_default_conanfile(cfg)
-    config.set_default_cmakefile(cfg)
+    config.set_default_conanfile(cfg,deferred=True)
+    config.set_default_cmakefile(cfg,deferred=True)
 
     if build_dir is not None:
         cfg['directories/build'] = build_dir.absolute()
     if conanfile is not None:
         cfg['files/conanfile'] = conanfile.absolute()
     if cmakefile is not None:
-        cfg['files/CMakeLists.txt'] = conanfile.absolute()
+        cfg['files/CMakeLists.txt'] = cmakefile.absolute()
 
     if write_scripts:
         cfg['directories/scripts'] = cfg['directories/build']
 
     if cfg.get('/files/progress',None) is None:
         cfg['/files/progress'] = cfg['directories/build'] / 'ccc-progress.yml'
+    if cfg.get('/files/test_history',None) is None:
+        cfg['/files/test_history'] = cfg['/files/progress'].parent / 'ccc-test-history.yml'
+    if cfg.get('/files/test_cache',None) is None:
+        cfg['/files/test_cache'] = cfg['/files/progress'].parent / 'ccc-test-cache.json'
+    if cfg.get('/files/build_artifacts',None) is None:
+        cfg['/files/build_artifacts'] = cfg['/files/progress'].parent / 'ccc-artifacts.json'
+    if cfg.get('/files/build_log',None) is None:
+        cfg['/files/build_log'] = cfg['/files/progress'].parent / 'ccc-build-log.json'
 
     if config_settings:
         for config_setting in config_settings:
@@ -69,27 +95,201 @@ def main(config_file:pathlib.Path=typer.Option(None,help='ccc project config fil
             for key in settings:
                 cfg[key] = settings[key]
 
-    if not cfg['/files/progress'].exists():
-        cfg['/files/progress'].parent.mkdir(parents=True,exist_ok=True)
-        cfg['/files/progress'].write_text('{}')
 
 
-    progress.tree.update( yaml.safe_load( cfg['/files/progress'].read_text() ) )
+def reset():
+    '''
+    Reset the state left behind by a previous command (when commands are run by `ccc serve`).
+    '''
+    global progress_loaded
+    import rich
+    cfg.tree.clear()
+    progress.tree.clear()
+    progress_loaded = False
+    tracing.stop()
+    # rich's console detects the terminal (and color support) when it is created, and the terminal may be different now.
+    # if nothing has been printed yet, there is no console to replace (and creating one would slow down startup).
+    if 'rich.console' in sys.modules:
+        rich.reconfigure()
+
+
+def start_trace(ctx:typer.Context,filename:pathlib.Path):
+    '''
+    Collect trace events for the command, and write them to a file when it is done.
+    '''
+    tracing.start()
+    start = time.monotonic()
+    argv = list(sys.argv)
+    def finish():
+        tracing.add_span(f"ccc {ctx.invoked_subcommand}",'command',start,time.monotonic(),{'argv':argv})
+        tracing.stop()
+        tracing.write(filename,{'argv':argv,'cwd':os.getcwd()})
+    ctx.call_on_close(finish)
+
+def load_progress():
+    '''
+    Read the progress file (the first time it is needed). Commands that don't run steps never read it.
+    '''
+    global progress_loaded
+    if progress_loaded:
+        return
+    def load():
+        import yaml
+        return yaml.safe_load( cfg['/files/progress'].read_text() ) if cfg['/files/progress'].exists() else {}
+    data = warm.memoize('progress',str(cfg['/files/progress']),load,stamp=warm.file_stamp(cfg['/files/progress']))
+    progress.tree.update( copy.deepcopy(data or {}) )
+    progress_loaded = True
+
+def save_progress():
+    if not progress_loaded:
+        return
+    import yaml
+    cfg['/files/progress'].parent.mkdir(parents=True,exist_ok=True)
+    cfg['/files/progress'].write_text( yaml.dump(progress.tree) )
 
 
     
-def run_step_if_pending(name,error_msg,force_run=False):
+def get_step_fingerprint(name):
+    '''
+    Render the script for a step (without running it) and return the fingerprint of the step's inputs.
+    '''
+    import conan_cmake_cpp_project_tools.steps as steps
+    import conan_cmake_cpp_project_tools.fingerprint as fingerprint
+    load_progress()
+    if name not in fingerprint.step_inputs:
+        return None
+
+    script_text = ""
+    if all( cfg.get(key,None) is not None for key in fingerprint.step_inputs[name]['files'] ):
+        getattr(steps,name)(cfg,run=False)
+        script_text = (pathlib.Path(cfg['/directories/scripts'])/steps.get_script_filename(cfg,name)).read_text()
+
+    return fingerprint.compute_step_fingerprint(cfg,name,script_text,
+                                                fingerprints=progress.tree.get('fingerprints',{}),
+                                                tool_version_cache=progress.tree.setdefault('tool_versions',{}))
+
+def get_command_timings_filename():
+    return cfg.get('/files/command_timings',None) or cfg['/directories/build']/'ccc-command-timings.json'
+
+def run_step_if_pending(name,error_msg,force_run=False,**kwargs):
+    import conan_cmake_cpp_project_tools.steps as steps
+    import conan_cmake_cpp_project_tools.timing as timing
+    load_progress()
+    with tracing.span(f"fingerprint {name}",'fingerprint'):
+        step_fingerprint = get_step_fingerprint(name)
     if force_run == False and progress.get(f'/steps/{name}', "incomplete") == "complete":
-        print(f'"{name}" step has already completed. Skipping.')
-        return 0
-    if getattr(steps,name)(cfg) != 0:
+        missing = [ output for output in steps.step_outputs.get(name,[]) if not (cfg['/directories/build']/output).exists() ]
+        if len(missing) > 0:
+            print(f'The outputs of the "{name}" step ({", ".join(missing)}) are missing. Running it again.')
+        elif step_fingerprint is None or step_fingerprint == progress.get(f'/fingerprints/{name}',None):
+            print(f'"{name}" step has already completed. Skipping.')
+            return 0
+        else:
+            print(f'The inputs to the "{name}" step have changed since it was completed. Running it again.')
+    timing.take_recorded_commands()
+    returncode = None
+    start = time.monotonic()
+    try:
+        returncode = getattr(steps,name)(cfg,**kwargs)
+    finally:
+        # a step that raised or was interrupted is recorded as an error too
+        end = time.monotonic()
+        status = "complete" if returncode == 0 else "error"
+        build_type = cfg.get('/build_type','Debug')
+        run = timing.record_step(progress,build_type,name,end-start,status,history_size=int(cfg.get('/timings/history_size',50)))
+        timing.CommandTimings.record(get_command_timings_filename(),build_type,name,run['started'],timing.take_recorded_commands())
+        tracing.add_span(name,'step',start,end,{'status':status,'exit_code':returncode})
+    if returncode != 0:
         print(f"{error_msg}")
         progress[f'/steps/{name}'] = "error"
         return 1
 
     progress[f'/steps/{name}'] = "complete"
+    if step_fingerprint is not None:
+        progress[f'/fingerprints/{name}'] = step_fingerprint
     return 0
 
+step_error_messages = { 'install_deps'    : "There was an error installing dependencies.",
+                        'configure_build' : "There was an error configuring build.",
+                        'run_build'       : "There was an error running build.",
+                        'run_tests'       : "There was an error running tests.",
+                        'debug_tests'     : "There was an error running tests through debugger.",
+                        'install'         : "There was an error installing.",
+                      }
+# the steps that are run every time a command asks for a target step (the build tool and test runner decide what needs
+# to be done). the other steps are skipped if they have completed and their inputs have not changed, unless -f is given.
+# i.e. `ccc test` always runs the build and the tests, but `ccc install` only builds and tests if that hasn't been done.
+always_run_steps = { 'run_build'   : ['run_build'],
+                     'run_tests'   : ['run_build','run_tests'],
+                     'debug_tests' : ['run_build','debug_tests'],
+                     'install'     : ['install'],
+                   }
+
+def get_step_graph(targets,force=False,step_args=None):
+    '''
+    Return the graph of steps. The error message of a step that the targets depend on says that the command is halting.
+    `step_args` has extra keyword arguments for some of the step functions.
+
+    The steps form a chain (each one needs the one before it), so an ordinary command runs them one after another.
+    Only `ccc test --pipeline` adds nodes that run at the same time (see get_pipelined_test_graph).
+    '''
+    import functools
+    import conan_cmake_cpp_project_tools.steps as steps
+    import conan_cmake_cpp_project_tools.scheduler as scheduler
+    step_args = step_args or {}
+    always_run = [ name for target in targets for name in always_run_steps.get(target,[]) ]
+    graph = scheduler.StepGraph()
+    for name,deps in steps.step_dependencies.items():
+        error_msg = step_error_messages[name] + ("" if name in targets else " Halting.")
+        graph.add(name,functools.partial(run_step_if_pending,name,f"[red]{error_msg}[/red]",force_run=force or name in always_run,**step_args.get(name,{})),deps)
+    return graph
+
+def get_test_step_args():
+    '''
+    Return the extra arguments for the steps run by commands that run the tests.
+    '''
+    if cfg.get('/run_tests/build_selected_targets',False):
+        return {'run_build':{'test_targets':True}}
+    return {}
+
+def get_pipelined_test_graph(force=False):
+    '''
+    Return the graph of steps for `ccc test --pipeline`, where run_tests runs at the same time as run_build and is
+    given a future that is set to the build's return code when it finishes.
+    '''
+    import functools
+    import concurrent.futures
+    graph = get_step_graph(['run_tests'],force,get_test_step_args())
+    build = concurrent.futures.Future()
+    run_build = graph.nodes['run_build'].run
+
+    def run_build_and_notify():
+        returncode = None
+        try:
+            returncode = run_build()
+            return returncode
+        finally:
+            build.set_result(returncode)
+
+    graph.nodes['run_build'].run = run_build_and_notify
+    graph.nodes['run_tests'].deps = ['configure_build']
+    graph.nodes['run_tests'].run = functools.partial(run_step_if_pending,'run_tests',f"[red]{step_error_messages['run_tests']}[/red]",force_run=True,build=build)
+    graph.add('pipeline',lambda: 0,['run_build','run_tests'])
+    return graph
+
+def run_steps(targets,force=False,completed=None,graph=None):
+    '''
+    Run the target steps and the steps they depend on, and save the progress. Returns the status of each step.
+    '''
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not cfg.get('directories/scripts',False):
+            cfg['directories/scripts'] = pathlib.Path(tmpdir).absolute()
+        try:
+            graph = graph if graph is not None else get_step_graph(targets,force)
+            return graph.run(targets,completed=completed)
+        finally:
+            save_progress()
+
     
 @app.command()
 def install_deps(force:bool=typer.Option(False,"-f",help="Force all steps to run, even if it has been completed.")):
@@ -97,13 +297,7 @@ def install_deps(force:bool=typer.Option(False,"-f",help="Force all steps to run
     Install project dependencies into build directory with Conan.
     '''
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        if not cfg.get('/directories/scripts',False):
-            cfg['/directories/scripts'] = pathlib.Path(tmpdir).absolute()
-        with utils.working_directory(tmpdir):
-            run_step_if_pending('install_deps',"[red]There was an error installing dependencies.[/red]",force_run=force)
-
-    cfg['/files/progress'].write_text( yaml.dump(progress.tree) )
+    run_steps(['install_deps'],force)
 
 
 @app.command()
@@ -112,29 +306,91 @@ def configure(force:bool=typer.Option(False,"-f",help="Force all steps to run, e
     Configure project build.
     '''
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        if not cfg.get('directories/scripts',False):
-            cfg['directories/scripts'] = pathlib.Path(tmpdir).absolute()
-        with utils.working_directory(tmpdir):
-            if run_step_if_pending('install_deps',"[red]There was an error installing dependencies. Halting.[/red]",force_run=force) == 0:
-                run_step_if_pending('configure_build',"[red]There was an error configuring build.[/red]",force_run=force)
-
-    cfg['/files/progress'].write_text( yaml.dump(progress.tree) )
+    run_steps(['configure_build'],force)
 
 @app.command()
-def build(force:bool=typer.Option(False,"-f",help="Force all steps to run, even if it has been completed.")):
+def build(force:bool=typer.Option(False,"-f",help="Force all steps to run, even if it has been completed.")
+         ,matrix:str=typer.Option(None,"--matrix",help="Build several configurations at the same time. A comma separated list of build types, or configurations defined under /matrix in ccc.yml.")
+         ):
     '''
     Build project build.
     '''
 
+    if matrix is not None:
+        names = [ name.strip() for name in matrix.split(',') if name.strip() ]
+        raise typer.Exit(code=build_matrix(names,force))
+
+    run_steps(['run_build'],force)
+
+
+def build_matrix(names,force):
+    '''
+    Build each configuration in its own build directory, all at the same time, and print a summary. Returns 1 if any
+    of the builds failed.
+    '''
+    import rich
+    import conan_cmake_cpp_project_tools.matrix as matrix
+    import conan_cmake_cpp_project_tools.scheduler as scheduler
+    from rich.table import Table
+    from rich.markup import escape
+    if not hasattr(os,'fork'):
+        print("[red]Building a matrix of configurations is not supported on this system yet.[/red]")
+        return 1
+
+    configurations = matrix.get_configurations(names,cfg.get('/matrix',config.ConfSettings({})).tree)
+    # the CPUs (and memory) are shared by all of the builds
+    jobs = matrix.split_jobs(cfg.get('/run_build/jobs',None),len(configurations))
+    link_jobs = matrix.split_jobs(cfg.get('/run_build/link_jobs',None),len(configurations))
+    write_scripts = cfg.get('/directories/scripts',None) == cfg['/directories/build']
+    root_dir = cfg['/directories/root']
+    for configuration in configurations:
+        configuration['build_dir'] = root_dir/utils.make_build_dir_name(build_type=configuration['name'],system=cfg.get('/system','unknown'))
+    print(f"Building {', '.join(c['name'] for c in configurations)} (--parallel {jobs} each).")
+
     with tempfile.TemporaryDirectory() as tmpdir:
-        if not cfg.get('directories/scripts',False):
-            cfg['directories/scripts'] = pathlib.Path(tmpdir).absolute()
-        with utils.working_directory(tmpdir):
-            if run_step_if_pending('install_deps',"[red]There was an error installing dependencies. Halting.[/red]",force_run=force) == 0:
-                if run_step_if_pending('configure_build',"[red]There was an error configuring build. Halting.[/red]",force_run=force) == 0:
-                    run_step_if_pending('run_build',"[red]There was an error running build.[/red]",force_run=True)
-    cfg['/files/progress'].write_text( yaml.dump(progress.tree) )
+        def run(configuration):
+            global progress_loaded
+            bdir = configuration['build_dir']
+            scripts_dir = bdir if write_scripts else pathlib.Path(tmpdir).absolute()/configuration['name']
+            scripts_dir.mkdir(parents=True,exist_ok=True)
+            # the output is going to a file now
+            rich.reconfigure()
+            progress.tree.clear()
+            progress_loaded = False
+            settings = {'build_type':configuration['build_type'],
+                        'directories':{'build':bdir,'scripts':scripts_dir},
+                        'files':{'progress':bdir/'ccc-progress.yml',
+                                 'test_history':bdir/'ccc-test-history.yml',
+                                 'test_cache':bdir/'ccc-test-cache.json',
+                                 'build_artifacts':bdir/'ccc-artifacts.json',
+                                 'build_log':bdir/'ccc-build-log.json'}}
+            if jobs is not None:
+                settings['run_build'] = {'jobs':jobs,'link_jobs':link_jobs}
+            config.apply_settings(cfg,settings)
+            config.apply_settings(cfg,configuration['settings'])
+            failed = scheduler.get_failed(run_steps(['run_build'],force))
+            return 0 if failed is None else matrix.step_exit_codes[failed]
+
+        matrix.run_forked(configurations,run,lambda c: c['build_dir']/'ccc-matrix.log')
+
+    table = Table(title="Build matrix")
+    for column in ["configuration","build type","build directory","result","time"]:
+        table.add_column(column,justify="right" if column == "time" else "left")
+    failed = []
+    for configuration in configurations:
+        step = matrix.get_failed_step(configuration['exit_code'])
+        result = "[green]passed[/green]" if step is None else f"[red]failed ({step})[/red]"
+        if step is not None:
+            failed.append(configuration)
+        table.add_row(escape(configuration['name']),configuration['build_type'],str(configuration['build_dir'].relative_to(root_dir)),result,f"{configuration['seconds']:.1f}s")
+    print(table)
+
+    for configuration in failed:
+        print(f"[red]{escape(configuration['name'])} failed[/red]. The end of its log ({configuration['log']}):")
+        for line in matrix.tail(configuration['log']):
+            print(f"  {escape(line)}")
+
+    return 1 if len(failed) else 0
 
 
 # we are not naming this function `test` because pytest will pick it up as a test to run, which it is not.
@@ -142,6 +398,10 @@ def build(force:bool=typer.Option(False,"-f",help="Force all steps to run, even
 def run_test(force:bool=typer.Option(False,"-f",help="Force all steps to run, even if it has been completed.")
         , include:typing.Optional[typing.List[str]] = typer.Option(None,"--include","-i",help="Include pattern(s) to filter test executables that will run.")
         , exclude:typing.Optional[typing.List[str]] = typer.Option(None,"--exclude","-x",help="Exclude pattern(s) to filter test executables that will run.")
+        , jobs:typing.Optional[int] = typer.Option(None,"--jobs","-j",help="Run N test executables in parallel (0 will use all CPUs).")
+        , changed_since:typing.Optional[str] = typer.Option(None,"--changed-since",help="Only run test executables that are affected by changes since this git ref.")
+        , no_cache:bool = typer.Option(False,"--no-cache",help="Run test executables that passed before, even if they have not changed.")
+        , pipeline:bool = typer.Option(False,"--pipeline",help="Run each test executable as soon as the build links it, instead of waiting for the whole build.")
         ):
     '''
     Run project unit tests.
@@ -150,18 +410,19 @@ def run_test(force:bool=typer.Option(False,"-f",help="Force all steps to run, ev
         cfg['/run_tests/include'] = include
     if exclude:
         cfg['/run_tests/exclude'] = exclude
+    if jobs is not None:
+        cfg['/run_tests/jobs'] = jobs
+    if changed_since is not None:
+        cfg['/run_tests/changed_since'] = changed_since
+    if no_cache:
+        cfg['/run_tests/cache'] = False
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        if not cfg.get('directories/scripts',False):
-            cfg['directories/scripts'] = pathlib.Path(tmpdir).absolute()
-        with utils.working_directory(tmpdir):
-            if run_step_if_pending('install_deps',"[red]There was an error installing dependencies. Halting.[/red]",force_run=force) == 0:
-                if run_step_if_pending('configure_build',"[red]There was an error configuring build. Halting.[/red]",force_run=force) == 0:
-                    if run_step_if_pending('run_build',"[red]There was an error running build. Halting.[/red]",force_run=True) == 0:
-                        if run_step_if_pending('run_tests',"[red]There was an error running tests.[/red]",force_run=True) == 0:
-                            print("[green]All tests passed[/green]")
-
-    cfg['/files/progress'].write_text( yaml.dump(progress.tree) )
+    if pipeline:
+        status = run_steps(['pipeline'],force,graph=get_pipelined_test_graph(force))
+    else:
+        status = run_steps(['run_tests'],force,graph=get_step_graph(['run_tests'],force,get_test_step_args()))
+    if status['run_tests'] == 'complete' and status['run_build'] == 'complete':
+        print("[green]All tests passed[/green]")
 
 
 @app.command()
@@ -172,17 +433,7 @@ def install(install_dir:pathlib.Path,force:bool=typer.Option(False,"-f",help="Fo
 
     cfg['cmake/install/extra_args'] = ['--prefix',str(install_dir)]
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        if not cfg.get('directories/scripts',False):
-            cfg['directories/scripts'] = pathlib.Path(tmpdir).absolute()
-        with utils.working_directory(tmpdir):
-            if run_step_if_pending('install_deps',"[red]There was an error installing dependencies. Halting.[/red]",force_run=force) == 0:
-                if run_step_if_pending('configure_build',"[red]There was an error configuring build. Halting.[/red]",force_run=force) == 0:
-                    if run_step_if_pending('run_build',"[red]There was an error running build. Halting.[/red]",force_run=force) == 0:
-                        if run_step_if_pending('run_tests',"[red]There was an error running tests.[/red]",force_run=force) == 0:
-                            if steps.install(cfg) != 0:
-                                print("[red]There was an error installing.[/red]")
-    cfg['/files/progress'].write_text( yaml.dump(progress.tree) )
+    run_steps(['install'],force)
 
 @app.command()
 def debug_tests(force:bool=typer.Option(False,"-f",help="Force all steps to run, even if it has been completed.")
@@ -198,16 +449,7 @@ def debug_tests(force:bool=typer.Option(False,"-f",help="Force all steps to run,
     if exclude:
         cfg['/run_tests/exclude'] = exclude
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        if not cfg.get('directories/scripts',False):
-            cfg['directories/scripts'] = pathlib.Path(tmpdir).absolute()
-        with utils.working_directory(tmpdir):
-            if run_step_if_pending('install_deps',"[red]There was an error installing dependencies. Halting.[/red]",force_run=force) == 0:
-                if run_step_if_pending('configure_build',"[red]There was an error configuring build. Halting.[/red]",force_run=force) == 0:
-                    if run_step_if_pending('run_build',"[red]There was an error running build. Halting.[/red]",force_run=True) == 0:
-                        run_step_if_pending('debug_tests',"[red]There was an error running tests through debugger.[/red]",force_run=True)
-
-    cfg['/files/progress'].write_text( yaml.dump(progress.tree) )
+    run_steps(['debug_tests'],force)
 
 @app.command()
 def info(config_settings:bool=typer.Option(False,help="Print all configureations settings.")):
@@ -231,6 +473,118 @@ def info(config_settings:bool=typer.Option(False,help="Print all configureations
 
 
 
+@app.command()
+def timings(commands:bool=typer.Option(True,"--commands/--no-commands",help="Show how long each command of the latest run of each step took.")
+           ,threshold:float=typer.Option(1.25,help="Flag steps whose latest run took more than this times their median.")
+           ):
+    '''
+    Show how long each step took the last time it was run, along with its history.
+    '''
+    import conan_cmake_cpp_project_tools.timing as timing
+    from rich.table import Table
+    from rich.markup import escape
+    load_progress()
+    all_timings = progress.tree.get('timings',{})
+    if len(all_timings) == 0:
+        print(f"No timings have been recorded in '{cfg['/files/progress']}' yet.")
+        return
+
+    def fmt(seconds):
+        return "-" if seconds is None else f"{seconds:.2f}s"
+
+    import conan_cmake_cpp_project_tools.steps as steps_module
+    # the progress file is written with sorted keys, so put the steps back in the order they run in
+    step_order = list(steps_module.script_filenames.keys())
+    for build_type,steps in all_timings.items():
+        steps = dict(sorted(steps.items(),key=lambda item: step_order.index(item[0]) if item[0] in step_order else len(step_order)))
+        table = Table(title=f"{build_type} ({cfg['/files/progress'].parent})")
+        for column in ["step","latest","status","runs","p50","p90","vs. median"]:
+            table.add_column(column,justify="left" if column in ["step","status"] else "right")
+        summaries = {}
+        for name,runs in steps.items():
+            if len(runs) == 0:
+                continue
+            summary = timing.summarize(runs,threshold=threshold)
+            summaries[name] = summary
+            latest = summary['latest']
+            change = "-"
+            if summary['baseline'] is not None and summary['baseline'] > 0:
+                change = f"{100*(latest['seconds']/summary['baseline']-1):+.0f}%"
+                if summary['regression']:
+                    change = f"[red]{change} (regression)[/red]"
+            status = latest['status'] if latest['status'] == 'complete' else f"[red]{latest['status']}[/red]"
+            table.add_row(name,fmt(latest['seconds']),status,str(summary['runs']),fmt(summary['p50']),fmt(summary['p90']),change)
+        print(table)
+
+        if commands:
+            command_timings = timing.CommandTimings(get_command_timings_filename()).load()
+            for name,summary in summaries.items():
+                latest_commands,started = command_timings.get(build_type,name)
+                if len(latest_commands) == 0 or started != summary['latest']['started']:
+                    continue
+                print(f"{name} (started {started}):")
+                for command in latest_commands:
+                    # skip the cd's, set -e, etc.
+                    if command['seconds'] < 0.01 and command['status'] == 0:
+                        continue
+                    status = "" if command['status'] == 0 else f" [red](exit {command['status']})[/red]"
+                    # commands can contain brackets, which rich would treat as markup
+                    print(f"  {fmt(command['seconds']):>9}  {escape(command['command'])}{status}")
+
+
+@app.command()
+def build_report(top:int=typer.Option(10,"--top","-n",help="Number of compiles/links to list.")):
+    '''
+    Show where the time went in the last build (Ninja builds only).
+    '''
+    import conan_cmake_cpp_project_tools.steps as steps
+    import conan_cmake_cpp_project_tools.build_report as build_report
+    from rich.markup import escape
+    bdir = cfg['/directories/build']
+    if not (bdir/'.ninja_log').exists():
+        print(f"[yellow]No .ninja_log in '{bdir}'. build-report needs a build that uses the Ninja generator (i.e. add '-G Ninja' to /cmake/extra_args).[/yellow]")
+        raise typer.Exit(code=1)
+
+    log = steps.update_build_log(cfg)
+    last = log.last_build()
+    if last is None or len(last) == 0:
+        print("The build log is empty.")
+        return
+
+    summary = build_report.analyze_build(last,build_report.load_build_statements(bdir),top=top)
+
+    def fmt(ms):
+        return f"{ms/1000:.2f} s"
+    def describe(summary):
+        parallelism = f"{summary['parallelism']:.1f}" if summary['parallelism'] is not None else "-"
+        return (f"{summary['edges']} edges in {fmt(summary['wall_ms'])}, {fmt(summary['total_ms'])} of work (parallelism {parallelism}), "
+                f"{fmt(summary['compile_ms'])} compiling, {fmt(summary['link_ms'])} linking")
+
+    print(f"Last build: {describe(summary)}")
+    previous = log.previous_build()
+    if previous is not None and len(previous) > 0:
+        previous_summary = build_report.analyze_build(previous,top=top)
+        print(f"Previous build: {describe(previous_summary)}")
+
+    if summary['critical_path'] is not None and summary['wall_ms'] > 0:
+        print(f"Critical path: {fmt(summary['critical_path_ms'])} ({100*summary['critical_path_ms']/summary['wall_ms']:.0f}% of the wall time)")
+        for edge in summary['critical_path']:
+            print(f"  {fmt(edge['end']-edge['start']):>10}  {escape(edge['outputs'][0])}")
+
+    for title,key in [("Slowest compiles","slowest_compiles"),("Slowest links","slowest_links")]:
+        if len(summary[key]):
+            print(f"{title}:")
+            for edge in summary[key]:
+                print(f"  {fmt(edge['end']-edge['start']):>10}  {escape(edge['outputs'][0])}")
+
+    if previous is not None:
+        changes = [ c for c in build_report.compare_builds(previous,last,top=top) if c[2] > c[1] ]
+        if len(changes):
+            print("Biggest slowdowns since the previous build:")
+            for output,previous_ms,last_ms in changes:
+                print(f"  {fmt(previous_ms):>10} -> {fmt(last_ms):>10}  {escape(output)}")
+
+
 @app.command()
 def add():
     '''
@@ -245,16 +599,150 @@ def make_editable():
     '''
     pass
 
-@app.command()
-def list_sources():
+def get_project_source_files():
     '''
-    List the source files in a project.
+    Return the project's source files (names relative to the root), filtered by the /list_sources/include and
+    /list_sources/exclude patterns.
     '''
     include_patterns = cfg.get('/list_sources/include',config.ConfSettings(['*'])).tree
     exclude_patterns = cfg.get('/list_sources/exclude',config.ConfSettings([])).tree
-    
 
-    sources = utils.get_source_files(cfg['/directories/root']) | utils.pfilter(utils.filename_matches_pattern_filter(include_patterns)) | -utils.pfilter(utils.filename_matches_pattern_filter(exclude_patterns))
-    for file in sources:
-        print(str(file))
+    root = cfg['/directories/root']
+    filt = utils.include_exclude_pattern_filter(include_patterns,exclude_patterns)
+    if warm.enabled and (root/'.git').is_dir():
+        # `git ls-files` only lists files in the index, so the list can't change unless the index does.
+        files = warm.memoize('source_files',str(root),lambda: list(utils.get_source_file_names(root)),stamp=warm.file_stamp(root/'.git'/'index'))
+        return ( file for file in files if filt(file) )
+
+    return utils.get_source_file_names(root,filt)
+
+@app.command()
+def list_sources(print0:bool=typer.Option(False,"--print0","-0",help="Separate file names with NUL characters instead of newlines (for `xargs -0`).")):
+    '''
+    List the source files in a project.
+    '''
+    # file names are written as-is (as bytes, so names that are not valid utf-8 survive). rich would treat brackets
+    # in file names as markup (and importing its console is a good chunk of our startup time).
+    separator = b'\0' if print0 else b'\n'
+    out = getattr(sys.stdout,'buffer',None)
+    if out is None:
+        for file in get_project_source_files():
+            sys.stdout.write(file+separator.decode())
+        return
+
+    sys.stdout.flush()
+    # on a terminal, show names as soon as we get them. otherwise, let the buffer fill up.
+    interactive = sys.stdout.isatty()
+    try:
+        for file in get_project_source_files():
+            out.write(os.fsencode(file)+separator)
+            if interactive:
+                out.flush()
+        out.flush()
+    except BrokenPipeError:
+        # i.e. `ccc list-sources | head`. anything left in the buffer goes nowhere.
+        devnull = os.open(os.devnull,os.O_WRONLY)
+        os.dup2(devnull,sys.stdout.fileno())
+        os.close(devnull)
+
+@app.command()
+def watch(debounce:float=typer.Option(0.2,help="Wait until files have not changed for this many seconds before rebuilding.")
+        , poll:bool=typer.Option(False,"--poll",help="Poll files for changes instead of using inotify.")
+        , include:typing.Optional[typing.List[str]] = typer.Option(None,"--include","-i",help="Include pattern(s) to filter test executables that will run.")
+        , exclude:typing.Optional[typing.List[str]] = typer.Option(None,"--exclude","-x",help="Exclude pattern(s) to filter test executables that will run.")
+        , jobs:typing.Optional[int] = typer.Option(None,"--jobs","-j",help="Run N test executables in parallel (0 will use all CPUs).")
+        ):
+    '''
+    Watch the project's source files and rebuild and re-run the unit tests when they change.
+
+    This is a faster alternative to `ccc list-sources | entr ccc test`. The configuration and list of source files are
+    only loaded once. When a file changes, the build and tests are run, and the install and configure steps are run
+    again if their inputs (i.e. the conanfile or CMakeLists.txt) changed.
+    '''
+    if include:
+        cfg['/run_tests/include'] = include
+    if exclude:
+        cfg['/run_tests/exclude'] = exclude
+    if jobs is not None:
+        cfg['/run_tests/jobs'] = jobs
+
+    import conan_cmake_cpp_project_tools.watch as watcher_module
 
+    root = cfg['/directories/root']
+    sources = set( root/file for file in get_project_source_files() )
+    watcher = watcher_module.make_watcher(sources,poll=poll)
+
+    def build_and_test():
+        # install_deps and configure_build are skipped by their fingerprints unless their inputs changed
+        if run_steps(['run_tests'],graph=get_step_graph(['run_tests'],False,get_test_step_args()))['run_tests'] == 'complete':
+            print("[green]All tests passed[/green]")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not cfg.get('directories/scripts',False):
+            cfg['directories/scripts'] = pathlib.Path(tmpdir).absolute()
+        build_and_test()
+        try:
+            while True:
+                print(f"Watching {len(sources)} files for changes...")
+                changed = watcher_module.wait_for_changes(watcher,debounce=debounce)
+                if any( path not in sources for path in changed ):
+                    # a file was created or renamed, so the list of sources may have changed.
+                    sources = set( root/file for file in get_project_source_files() )
+                    watcher.set_paths(sources)
+                changed = [ path for path in changed if path in sources ]
+                if len(changed) == 0:
+                    continue
+                print(f"Detected changes in: {' '.join(str(path.relative_to(root)) for path in changed)}")
+                build_and_test()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+
+
+def run_command(argv):
+    '''
+    Run a ccc command line in this process and return its exit code.
+    '''
+    try:
+        app(args=list(argv),prog_name=APP_NAME)
+    except SystemExit as e:
+        if e.code is None or type(e.code) == int:
+            return e.code or 0
+        return 1
+    return 0
+
+@app.command()
+def serve(idle_timeout:float=typer.Option(3600,help="Exit if no commands are received for this many seconds (0 to never exit)."),
+          stop:bool=typer.Option(False,"--stop",help="Stop the server that is running for the project.")):
+    '''
+    Run a server for the project that `ccc-client` sends commands to.
+
+    The server keeps the configuration, source list, build artifact index, and captured run environments loaded between
+    commands, so `ccc-client test` (i.e. from an editor) does not have to start up and load everything every time.
+    '''
+    import conan_cmake_cpp_project_tools.daemon as daemon
+
+    root = cfg['/directories/root']
+    try:
+        if stop:
+            if not daemon.stop_server(root):
+                print(f"[yellow]No server is running for '{root}'.[/yellow]")
+            return
+
+        server = daemon.Server(root,run_command,idle_timeout=idle_timeout if idle_timeout > 0 else None)
+        server.listen()
+    except PermissionError as e:
+        print(f"[red]Refusing to use the server socket: {e}[/red]")
+        raise typer.Exit(code=1)
+    except RuntimeError as e:
+        # i.e. a server is already running for the project
+        print(f"[red]{e}[/red]")
+        raise typer.Exit(code=1)
+    print(f"Serving ccc commands for '{root}' on {server.socket_path}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
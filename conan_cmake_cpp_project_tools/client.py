@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import stat
+import socket
+import struct
+import hashlib
+
+# A thin client for `ccc serve`.
+#
+# `ccc-client` takes the same arguments as `ccc`. If a server is running for the project that the current directory
+# belongs to, the command line, working directory, and environment are sent to it over a unix socket along with the
+# client's stdin/stdout/stderr file descriptors, so the server writes its output (and the output of anything it runs)
+# directly to the client's terminal. The server replies with the exit code when the command finishes. If there is no
+# server, the command is just run by the client.
+#
+# This module is imported by the client on every call, so it should only import (cheap) standard library modules.
+#
+# Anyone who can connect to the socket can run commands as the server's user, and the server hands the client's
+# terminal to whoever is listening. The socket lives in a directory that only the current user can access, and
+# both ends check the other's uid (SO_PEERCRED) where the platform supports it. If the directory is in a shared
+# location (i.e. /tmp) and someone else created it first, the server refuses to start and the client ignores it.
+
+
+def get_socket_directory():
+    '''
+    Return the directory that the servers for the current user put their sockets in.
+    '''
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR',None) or os.environ.get('TMPDIR',None) or '/tmp'
+    return os.path.join(runtime_dir,f'ccc-{os.getuid()}')
+
+
+def get_socket_path(root):
+    '''
+    Return the path of the socket that the server for a project root listens on.
+    '''
+    name = hashlib.sha256(os.fsencode(os.path.abspath(root))).hexdigest()[:16]
+    return os.path.join(get_socket_directory(),f'{name}.sock')
+
+
+def check_socket_directory(path):
+    '''
+    Raise PermissionError if a socket directory is not a directory (i.e. a symlink), is not owned by the current
+    user, or can be accessed by anyone else.
+    '''
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise PermissionError(f"'{path}' is not a directory.")
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"'{path}' is owned by another user (uid {st.st_uid}).")
+    if st.st_mode & 0o077:
+        raise PermissionError(f"'{path}' can be accessed by other users (mode {stat.S_IMODE(st.st_mode):o}, it should be 700).")
+
+
+def get_peer_uid(sock):
+    '''
+    Return the uid of the process on the other end of a unix socket, or None if the platform can't tell us.
+    '''
+    if not hasattr(socket,'SO_PEERCRED'):
+        return None
+    pid,uid,gid = struct.unpack('3i',sock.getsockopt(socket.SOL_SOCKET,socket.SO_PEERCRED,struct.calcsize('3i')))
+    return uid
+
+
+def check_peer(sock):
+    '''
+    Raise PermissionError if the process on the other end of a unix socket belongs to another user.
+    '''
+    uid = get_peer_uid(sock)
+    if uid is not None and uid != os.getuid():
+        raise PermissionError(f"The other end of the socket belongs to another user (uid {uid}).")
+
+
+def find_server(path):
+    '''
+    Return the socket path of a server for the directory or one of its parents, or None.
+
+    Raises PermissionError if the socket directory is not private to the current user.
+    '''
+    path = os.path.abspath(path)
+    socket_directory = get_socket_directory()
+    if not os.path.lexists(socket_directory):
+        return None
+    check_socket_directory(socket_directory)
+    while True:
+        socket_path = get_socket_path(path)
+        if os.path.exists(socket_path):
+            return socket_path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+# messages are a 4 byte (big endian) length followed by json. file descriptors are sent with the length.
+def send_message(sock, message, fds = None):
+    data = json.dumps(message).encode()
+    header = len(data).to_bytes(4,'big')
+    if fds:
+        socket.send_fds(sock,[header],fds)
+    else:
+        sock.sendall(header)
+    sock.sendall(data)
+
+
+def recv_exactly(sock, n:int):
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n-len(data))
+        if len(chunk) == 0:
+            raise ConnectionError("Connection closed in the middle of a message.")
+        data += chunk
+    return data
+
+
+def recv_message(sock, maxfds:int = 0):
+    '''
+    Receive a message. Returns a tuple of (message,fds). message is None if the connection was closed.
+    '''
+    fds = []
+    if maxfds > 0:
+        header,fds,flags,addr = socket.recv_fds(sock,4,maxfds)
+    else:
+        header = sock.recv(4)
+    if len(header) == 0:
+        return None,fds
+    header += recv_exactly(sock,4-len(header))
+    return json.loads(recv_exactly(sock,int.from_bytes(header,'big'))),fds
+
+
+def run(argv, cwd = None):
+    '''
+    Run a ccc command on the server for the current project and return its exit code, or None if there is no server.
+    '''
+    cwd = os.path.abspath(cwd or os.getcwd())
+    try:
+        socket_path = find_server(cwd)
+    except PermissionError as e:
+        sys.stderr.write(f"ccc-client: not using the server: {e}\n")
+        return None
+    if socket_path is None:
+        return None
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        # stale socket, the server is gone
+        sock.close()
+        return None
+    try:
+        check_peer(sock)
+    except PermissionError as e:
+        sock.close()
+        sys.stderr.write(f"ccc-client: not using the server: {e}\n")
+        return None
+
+    with sock:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        send_message(sock,{'argv':list(argv),'cwd':cwd,'env':dict(os.environ)},fds=[0,1,2])
+        while True:
+            try:
+                reply,_ = recv_message(sock)
+                break
+            except KeyboardInterrupt:
+                # the processes the server starts are not in our process group, so they don't get the SIGINT
+                sock.sendall(b'I')
+            except ConnectionError:
+                reply = None
+                break
+    if reply is None:
+        sys.stderr.write("ccc-client: lost connection to the server.\n")
+        return 1
+    return reply['exit']
+
+
+def main():
+    code = run(sys.argv[1:])
+    if code is None:
+        from conan_cmake_cpp_project_tools.cli import app
+        app(prog_name="ccc")
+        return
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
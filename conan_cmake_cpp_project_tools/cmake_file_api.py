@@ -0,0 +1,152 @@
+import os
+import re
+import json
+import pathlib
+from .core_utils import *
+
+# Reading the project's targets from the CMake File API (https://cmake.org/cmake/help/latest/manual/cmake-file-api.7.html).
+#
+# The configure step drops a query file for the codemodel into the build directory, and CMake writes a reply every time
+# it generates the build system (including when the build re-runs it). The codemodel lists every target with its type
+# and the paths of the files it produces, so the test executables are known exactly, without walking the build tree
+# and guessing from file names. Which of them are registered with CTest is read from the CTestTestfile.cmake that
+# CMake writes in each build directory.
+#
+# If there is no reply (CMake older than 3.14, or a build directory that was configured without the query), the
+# functions here return None and the build tree is searched instead.
+
+client_name = 'client-ccc'
+
+
+def get_api_directory(bdir:pathlib.Path):
+    return pathlib.Path(bdir)/'.cmake'/'api'/'v1'
+
+
+def get_query_filename(bdir:pathlib.Path):
+    return get_api_directory(bdir)/'query'/client_name/'codemodel-v2'
+
+
+def write_query(bdir:pathlib.Path):
+    '''
+    Ask CMake to write a codemodel reply the next time it generates the build system in `bdir`.
+    '''
+    query = get_query_filename(bdir)
+    if not query.exists():
+        query.parent.mkdir(parents=True,exist_ok=True)
+        query.write_text('')
+    return query
+
+
+def read_json(path:pathlib.Path):
+    try:
+        with open(path,encoding=encoding) as f:
+            return json.load(f)
+    except (OSError,ValueError):
+        return None
+
+
+def get_codemodel(bdir:pathlib.Path):
+    '''
+    Return the codemodel from the latest reply in a build directory, or None if there isn't one.
+    '''
+    reply_dir = get_api_directory(bdir)/'reply'
+    try:
+        # the index file names have a timestamp in them, the latest one is the current reply
+        indexes = sorted( name for name in os.listdir(reply_dir) if name.startswith('index-') and name.endswith('.json') )
+    except OSError:
+        return None
+    if len(indexes) == 0:
+        return None
+    index = read_json(reply_dir/indexes[-1])
+    if index is None:
+        return None
+    reply = index.get('reply',{}).get(client_name,{}).get('codemodel-v2',None)
+    if reply is None or 'jsonFile' not in reply:
+        return None
+    return read_json(reply_dir/reply['jsonFile'])
+
+
+def get_configuration(codemodel:dict, build_type:str = None):
+    '''
+    Return the configuration for a build type (multi-config generators have one for each), or the first one.
+    '''
+    configurations = codemodel.get('configurations',[])
+    for configuration in configurations:
+        if configuration.get('name','') == build_type:
+            return configuration
+    return configurations[0] if len(configurations) else None
+
+
+add_test_pattern = re.compile(r'^\s*add_test\(\s*(\[(=*)\[.*?\]\2\]|"(?:[^"\\]|\\.)*"|[^\s)]+)\s+("(?:[^"\\]|\\.)*"|[^\s)]+)',re.MULTILINE)
+
+
+def parse_ctest_file(text:str):
+    '''
+    Return the commands (first argument of each test's command line) of the tests in a CTestTestfile.cmake.
+    '''
+    commands = []
+    for match in add_test_pattern.finditer(text):
+        command = match.group(3)
+        if command.startswith('"'):
+            command = re.sub(r'\\(.)',r'\1',command[1:-1])
+        commands.append(command)
+    return commands
+
+
+def get_ctest_commands(bdir:pathlib.Path, configuration:dict):
+    '''
+    Return the set of test commands (normalized absolute paths) registered with CTest in all build directories of a
+    configuration.
+    '''
+    commands = set()
+    for directory in configuration.get('directories',[]):
+        ctest_file = pathlib.Path(bdir)/directory.get('build','.')/'CTestTestfile.cmake'
+        try:
+            text = ctest_file.read_text(encoding=encoding,errors='replace')
+        except OSError:
+            continue
+        for command in parse_ctest_file(text):
+            commands.add(os.path.normpath(pathlib.Path(bdir)/command))
+    return commands
+
+
+def get_targets(bdir:pathlib.Path, build_type:str = None):
+    '''
+    Return a list of the targets in a build directory, or None if CMake has not written a codemodel reply. Each target
+    is a dict with its 'name', 'type' (i.e. 'EXECUTABLE'), 'artifacts' (absolute paths), and 'ctest' (True if one of
+    its artifacts is the command of a test registered with CTest).
+    '''
+    bdir = pathlib.Path(bdir).absolute()
+    codemodel = get_codemodel(bdir)
+    if codemodel is None:
+        return None
+    configuration = get_configuration(codemodel,build_type)
+    if configuration is None:
+        return None
+    reply_dir = get_api_directory(bdir)/'reply'
+    ctest_commands = get_ctest_commands(bdir,configuration)
+    targets = []
+    for target in configuration.get('targets',[]):
+        reply = read_json(reply_dir/target['jsonFile'])
+        if reply is None:
+            return None
+        artifacts = [ pathlib.Path(os.path.normpath(bdir/artifact['path'])) for artifact in reply.get('artifacts',[]) ]
+        targets.append({'name':reply['name'],
+                        'type':reply.get('type',None),
+                        'artifacts':artifacts,
+                        'ctest':any( str(artifact) in ctest_commands for artifact in artifacts ),
+                       })
+    return targets
+
+
+def get_executable(target:dict):
+    '''
+    Return the path of the executable an EXECUTABLE target builds, or None for other targets. (On Windows, the
+    artifacts also include the .pdb file, and the import library if the executable exports symbols.)
+    '''
+    if target['type'] != 'EXECUTABLE':
+        return None
+    for artifact in target['artifacts']:
+        if artifact.suffix.lower() not in ['.pdb','.lib','.exp']:
+            return artifact
+    return None
@@ -0,0 +1,140 @@
+import json
+import shutil
+import pathlib
+import subprocess
+
+# Compiler cache (ccache or sccache) support.
+#
+# CMake runs the compiler through a "launcher" if CMAKE_<LANG>_COMPILER_LAUNCHER is set, which is all ccache and
+# sccache need. The cache directory and size limit are passed to them through the environment when the build runs,
+# so they can be set per project in ccc.yml without touching the user's ccache/sccache config.
+#
+# Hit/miss statistics are read before and after a build and the difference is reported. Both tools keep cumulative
+# counters (sccache per server session), so the difference is what the build did (as long as nothing else was
+# using the same cache at the same time).
+
+supported_tools = ['ccache','sccache']
+
+environment_variables = {'ccache' :{'directory':'CCACHE_DIR','max_size':'CCACHE_MAXSIZE'},
+                         'sccache':{'directory':'SCCACHE_DIR','max_size':'SCCACHE_CACHE_SIZE'}}
+
+
+def find_compiler_cache(tools = None):
+    '''
+    Return the path to the first compiler cache that is installed (ccache is preferred), or None.
+    '''
+    for tool in tools or supported_tools:
+        path = shutil.which(tool)
+        if path is not None:
+            return pathlib.Path(path)
+    return None
+
+
+def get_tool_name(tool):
+    '''
+    Return 'ccache' or 'sccache' for a path to (or name of) a compiler cache, or None if it is not one we know.
+    '''
+    name = pathlib.Path(tool).name
+    if name.lower().endswith('.exe'):
+        name = name[:-4]
+    return name if name in supported_tools else None
+
+
+def launcher_args(tool, languages, cmake_args = None):
+    '''
+    Return the CMake arguments that set the compiler launcher for each language to `tool`. Languages that already
+    have a launcher in `cmake_args` (i.e. set by the user) are left alone.
+    '''
+    cmake_args = cmake_args or []
+    args = []
+    for lang in languages:
+        var = f"CMAKE_{lang}_COMPILER_LAUNCHER"
+        if any( arg.startswith(f"-D{var}=") or arg.startswith(f"-D{var}:") for arg in cmake_args ):
+            continue
+        args.append(f"-D{var}={tool}")
+    return args
+
+
+def cache_environment(tool, directory = None, max_size = None):
+    '''
+    Return the environment variables that set the cache directory and size limit for `tool`.
+    '''
+    names = environment_variables.get(get_tool_name(tool),None)
+    env = {}
+    if names is None:
+        return env
+    if directory is not None:
+        env[names['directory']] = str(directory)
+    if max_size is not None:
+        env[names['max_size']] = str(max_size)
+    return env
+
+
+def parse_ccache_stats(text:str):
+    '''
+    Parse the output of `ccache --print-stats` (tab separated counter names and values).
+    '''
+    counters = {}
+    for line in text.splitlines():
+        fields = line.split('\t')
+        if len(fields) == 2:
+            try:
+                counters[fields[0]] = int(fields[1])
+            except ValueError:
+                pass
+    hits = counters.get('direct_cache_hit',0) + counters.get('preprocessed_cache_hit',0)
+    return {'hits':hits,'misses':counters.get('cache_miss',0)}
+
+
+def parse_sccache_stats(text:str):
+    '''
+    Parse the output of `sccache --show-stats --stats-format=json`. Hits and misses are counted per language, we add
+    them up.
+    '''
+    stats = json.loads(text).get('stats',{})
+    def total(key):
+        counts = stats.get(key,{})
+        if isinstance(counts,dict):
+            counts = counts.get('counts',{})
+            return sum( v for v in counts.values() if isinstance(v,int) )
+        return counts if isinstance(counts,int) else 0
+    return {'hits':total('cache_hits'),'misses':total('cache_misses')}
+
+
+def get_stats(tool, env = None):
+    '''
+    Return the cumulative hit and miss counts of a compiler cache as a dict with 'hits' and 'misses', or None if they
+    can't be read (i.e. ccache older than 4.0, which does not have --print-stats).
+    '''
+    name = get_tool_name(tool)
+    if name == 'ccache':
+        cmd,parse = [str(tool),'--print-stats'],parse_ccache_stats
+    elif name == 'sccache':
+        cmd,parse = [str(tool),'--show-stats','--stats-format=json'],parse_sccache_stats
+    else:
+        return None
+    try:
+        result = subprocess.run(cmd,capture_output=True,env=env,timeout=30)
+    except (OSError,subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        return parse(result.stdout.decode('utf-8','replace'))
+    except ValueError:
+        return None
+
+
+def stats_delta(before, after):
+    '''
+    Return the hits and misses between two snapshots of the stats, or None if either is missing.
+    '''
+    if before is None or after is None:
+        return None
+    return { key: after[key] - before[key] for key in ('hits','misses') }
+
+
+def format_stats(name:str, delta):
+    total = delta['hits'] + delta['misses']
+    rate = 100*delta['hits']/total if total > 0 else 0
+    return f"Compiler cache ({name}): {delta['hits']} hits, {delta['misses']} misses ({rate:.1f}% hit rate)"
@@ -0,0 +1,312 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import pathlib
+import tempfile
+from .core_utils import *
+from .fingerprint import hash_file, get_tool_version
+
+# A cache for the files that `conan install` generates in a build directory (toolchain, activate scripts,
+# find-modules, etc.) shared between build directories and checkouts. Entries are keyed by a hash of everything
+# that determines what Conan generates, so if the key matches, the files can be copied (or hard-linked) into the
+# build directory instead of running `conan install`.
+#
+# Absolute paths to the build and source directories that appear in the generated files are replaced by
+# placeholders when an entry is stored, and substituted back when it is materialized.
+#
+# The generated files also point into Conan's own package cache. The package folders they refer to are recorded with
+# the entry, and an entry whose packages have been removed (i.e. `conan remove`) is a miss.
+
+BUILD_DIR_PLACEHOLDER = b'@@CCC_BUILD_DIR@@'
+SOURCE_DIR_PLACEHOLDER = b'@@CCC_SOURCE_DIR@@'
+MATERIALIZED_FILES_RECORD = '.ccc-conan-cache.json'
+
+
+def default_cache_directory():
+    cache_home = os.environ.get('XDG_CACHE_HOME',None)
+    if cache_home is None:
+        cache_home = pathlib.Path.home()/'.cache'
+    return pathlib.Path(cache_home)/'ccc'/'conan'
+
+
+def get_conan_home():
+    return pathlib.Path(os.environ.get('CONAN_HOME',pathlib.Path.home()/'.conan2'))
+
+
+def get_conan_storage_directories():
+    '''
+    Return the directories that Conan (2 and 1) keeps packages in, and the number of path components below them that
+    name a package folder.
+    '''
+    conan_home = get_conan_home()
+    conan_user_home = pathlib.Path(os.environ.get('CONAN_USER_HOME',pathlib.Path.home()))
+    # conan 2: p/<folder>, or p/b/<folder> for packages built from source. conan 1: data/<name>/<version>/<user>/<channel>/package/<id>
+    return [ (conan_home/'p',1), (conan_user_home/'.conan'/'data',6) ]
+
+
+def find_package_folders(data:bytes, storage_directories):
+    '''
+    Return the Conan package folders that are referred to in a generated file.
+    '''
+    folders = set()
+    for directory,depth in storage_directories:
+        for match in re.finditer(re.escape(os.fsencode(str(directory)))+rb'((?:/[^/\s"\'$;()]+)+)',data):
+            parts = os.fsdecode(match.group(1)).strip('/').split('/')
+            n = depth+1 if depth == 1 and parts[0] == 'b' else depth
+            if len(parts) >= n:
+                folders.add(str(directory.joinpath(*parts[:n])))
+    return folders
+
+
+profile_include_pattern = re.compile(r'^\s*include\(\s*(.+?)\s*\)\s*$',re.MULTILINE)
+
+
+def find_option_values(conan_args, options):
+    '''
+    Return the values given for any of the options (i.e. ['--lockfile','-l']) on a conan command line.
+    '''
+    values = []
+    args = list(conan_args)
+    for i,arg in enumerate(args):
+        for option in options:
+            if arg.startswith(option+'='):
+                values.append(arg[len(option)+1:])
+            elif arg == option and i+1 < len(args):
+                values.append(args[i+1])
+    return values
+
+
+def find_conan_profiles(conan_args, cwd:pathlib.Path):
+    '''
+    Return the list of profile files referenced by a conan command line. The default profile is used if
+    a profile is not given for the host or build context. The profiles that these include (`include(...)`) follow
+    the host and build profiles.
+    '''
+    names = {'host':None,'build':None}
+    args = list(conan_args)
+    for i,arg in enumerate(args):
+        for prefix,contexts in [ ('--profile:host',['host']), ('--profile:build',['build']), ('--profile:all',['host','build']),
+                                 ('-pr:h',['host']), ('-pr:b',['build']), ('-pr:a',['host','build']),
+                                 ('--profile',['host']), ('-pr',['host']) ]:
+            value = None
+            if arg.startswith(prefix+'='):
+                value = arg[len(prefix)+1:]
+            elif arg == prefix and i+1 < len(args):
+                value = args[i+1]
+            if value is not None:
+                for context in contexts:
+                    names[context] = value
+                break
+
+    conan_home = os.environ.get('CONAN_HOME',None)
+    profile_dirs = [ pathlib.Path(conan_home)/'profiles' ] if conan_home else []
+    profile_dirs += [ pathlib.Path.home()/'.conan2'/'profiles', pathlib.Path(os.environ.get('CONAN_USER_HOME',pathlib.Path.home()))/'.conan'/'profiles' ]
+
+    def find(name,directory):
+        candidates = [ pathlib.Path(directory)/name ] + [ d/name for d in profile_dirs ]
+        return next( (c for c in candidates if c.is_file()), pathlib.Path(name) )
+
+    profiles = [ find(names['host'] or 'default',cwd), find(names['build'] or 'default',cwd) ]
+    # included profiles are relative to the profile that includes them (or in the profiles directory)
+    pending = list(profiles)
+    seen = set( str(p) for p in profiles )
+    while len(pending):
+        profile = pending.pop(0)
+        try:
+            text = profile.read_text(encoding=encoding,errors='replace')
+        except OSError:
+            continue
+        for match in profile_include_pattern.finditer(text):
+            included = find(match.group(1).strip('"\''),profile.parent)
+            if str(included) not in seen:
+                seen.add(str(included))
+                profiles.append(included)
+                pending.append(included)
+    return profiles
+
+
+class ConanInstallCache:
+    def __init__(self,directory:pathlib.Path = None):
+        self.directory = pathlib.Path(directory) if directory is not None else default_cache_directory()
+        self.storage_directories = get_conan_storage_directories()
+
+    def get_tool_version(self,cmd:str):
+        '''
+        Return the output of `cmd --version`, cached in the cache directory (keyed by the tool's path and stamp, like
+        the step fingerprints do), so that Conan does not have to be started to compute a key.
+        '''
+        filename = self.directory/'tool-versions.json'
+        try:
+            versions = json.loads(filename.read_text())
+        except (OSError,ValueError):
+            versions = {}
+        old = json.dumps(versions,sort_keys=True)
+        version = get_tool_version(cmd,versions)
+        if json.dumps(versions,sort_keys=True) != old:
+            try:
+                self.directory.mkdir(parents=True,exist_ok=True)
+                tmp = filename.with_name(f'.{filename.name}.{os.getpid()}')
+                tmp.write_text(json.dumps(versions))
+                os.replace(tmp,filename)
+            except OSError:
+                pass
+        return version
+
+    def make_key(self, conan_cmd, conanfile:pathlib.Path, bdir:pathlib.Path, settings = None):
+        '''
+        Return the cache key for running `conan_cmd` from the build directory.
+
+        The key includes the content of the conanfile (and conandata.yml), the lockfiles (the conan.lock next to the
+        conanfile, which Conan uses automatically, and any given on the command line), the profiles (and the profiles
+        they include), Conan's global.conf, the command line arguments (which contain the conanfile location relative
+        to the build directory, not its absolute path), any extra settings, and the Conan version.
+        '''
+        settings = settings or {}
+        h = hashlib.sha256()
+        def add(label,val):
+            h.update(f"{label}={val}\n".encode(encoding))
+
+        conanfile = pathlib.Path(conanfile)
+        add("conanfile",hash_file(conanfile))
+        add("conandata",hash_file(conanfile.parent/'conandata.yml'))
+        add("lockfile",hash_file(conanfile.parent/'conan.lock'))
+        for lockfile in find_option_values(conan_cmd[1:],['--lockfile','-l','--lockfile-out']):
+            add(f"lockfile:{lockfile}",hash_file(pathlib.Path(bdir)/lockfile))
+        add("global.conf",hash_file(get_conan_home()/'global.conf'))
+        add("args",json.dumps(list(conan_cmd[1:])))
+        for profile in find_conan_profiles(conan_cmd[1:],bdir):
+            add(f"profile:{profile.name}",hash_file(profile))
+        for key in sorted(settings):
+            add(f"setting:{key}",settings[key])
+        add("version",self.get_tool_version(conan_cmd[0]))
+        return h.hexdigest()
+
+    def entry_directory(self,key:str):
+        return self.directory/key[:2]/key
+
+    def has(self,key:str):
+        return (self.entry_directory(key)/'manifest.json').exists()
+
+    def snapshot(self,bdir:pathlib.Path):
+        '''
+        Return the (mtime,size) of every file in the build directory (relative path -> stamp), so that the files
+        Conan generates (or rewrites, i.e. in an existing generators/ directory) can be found by comparing against a
+        later snapshot. CMake's CMakeFiles directories are skipped, Conan does not write to them.
+        '''
+        state = {}
+        pending = [pathlib.Path(bdir)]
+        while len(pending):
+            directory = pending.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for e in entries:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name != 'CMakeFiles':
+                        pending.append(pathlib.Path(e.path))
+                elif e.is_file(follow_symlinks=False):
+                    st = e.stat(follow_symlinks=False)
+                    state[os.path.relpath(e.path,bdir)] = (st.st_mtime_ns,st.st_size)
+        return state
+
+    def generated_files(self,bdir:pathlib.Path,before):
+        '''
+        Return the files (relative to bdir) that were created or modified since the snapshot was taken.
+        '''
+        after = self.snapshot(bdir)
+        return sorted( pathlib.Path(name) for name,state in after.items()
+                       if before.get(name,None) != state and name != MATERIALIZED_FILES_RECORD )
+
+    def store(self, key:str, bdir:pathlib.Path, sdir:pathlib.Path, files):
+        '''
+        Store generated files in the cache under a key. Returns False if there was nothing to store.
+        '''
+        if len(files) == 0 or self.has(key):
+            return False
+
+        bdir_bytes = os.fsencode(str(pathlib.Path(bdir).absolute()))
+        sdir_bytes = os.fsencode(str(pathlib.Path(sdir).absolute()))
+
+        self.directory.mkdir(parents=True,exist_ok=True)
+        tmpdir = pathlib.Path(tempfile.mkdtemp(dir=self.directory,prefix='.tmp-'))
+        try:
+            manifest = {'files':[],'templated':[]}
+            package_folders = set()
+            for file in files:
+                data = (bdir/file).read_bytes()
+                package_folders |= find_package_folders(data,self.storage_directories)
+                templated = data.replace(bdir_bytes,BUILD_DIR_PLACEHOLDER).replace(sdir_bytes,SOURCE_DIR_PLACEHOLDER)
+                (tmpdir/'files'/file).parent.mkdir(parents=True,exist_ok=True)
+                (tmpdir/'files'/file).write_bytes(templated)
+                shutil.copymode(bdir/file,tmpdir/'files'/file)
+                manifest['files'].append(str(file))
+                if templated != data:
+                    manifest['templated'].append(str(file))
+            manifest['package_folders'] = sorted(package_folders)
+            (tmpdir/'manifest.json').write_text(json.dumps(manifest))
+
+            self.entry_directory(key).parent.mkdir(parents=True,exist_ok=True)
+            os.rename(tmpdir,self.entry_directory(key))
+        except OSError:
+            shutil.rmtree(tmpdir,ignore_errors=True)
+            if not self.has(key):
+                raise
+        return True
+
+    def materialize(self, key:str, bdir:pathlib.Path, sdir:pathlib.Path, link:bool = True):
+        '''
+        Copy (or hard-link) the files stored under a key into the build directory. Returns False on a cache miss.
+
+        Files that contain build or source directory paths are always copied. The materialized files are recorded in
+        the build directory so that they can be removed before Conan is run for real (otherwise Conan would write
+        through the hard-links into the cache).
+        '''
+        if not self.has(key):
+            return False
+
+        entry = self.entry_directory(key)
+        manifest = json.loads((entry/'manifest.json').read_text())
+        missing = [ folder for folder in manifest.get('package_folders',[]) if not os.path.isdir(folder) ]
+        if len(missing) > 0:
+            # the packages were removed from Conan's cache, conan install has to run (and will store a new entry)
+            shutil.rmtree(entry,ignore_errors=True)
+            return False
+        bdir_bytes = os.fsencode(str(pathlib.Path(bdir).absolute()))
+        sdir_bytes = os.fsencode(str(pathlib.Path(sdir).absolute()))
+
+        bdir.mkdir(parents=True,exist_ok=True)
+        self.remove_materialized(bdir)
+        for file in manifest['files']:
+            src = entry/'files'/file
+            dst = bdir/file
+            dst.parent.mkdir(parents=True,exist_ok=True)
+            if dst.exists() or dst.is_symlink():
+                dst.unlink()
+            if file in manifest['templated']:
+                dst.write_bytes( src.read_bytes().replace(BUILD_DIR_PLACEHOLDER,bdir_bytes).replace(SOURCE_DIR_PLACEHOLDER,sdir_bytes) )
+                shutil.copymode(src,dst)
+            else:
+                try:
+                    if not link:
+                        raise OSError("hard-linking disabled")
+                    os.link(src,dst)
+                except OSError:
+                    shutil.copy2(src,dst)
+
+        (bdir/MATERIALIZED_FILES_RECORD).write_text(json.dumps({'key':key,'files':manifest['files']}))
+        return True
+
+    def remove_materialized(self,bdir:pathlib.Path):
+        '''
+        Remove files that were materialized from the cache into a build directory.
+        '''
+        record = bdir/MATERIALIZED_FILES_RECORD
+        if not record.exists():
+            return
+        for file in json.loads(record.read_text())['files']:
+            if (bdir/file).exists():
+                (bdir/file).unlink()
+        record.unlink()
@@ -1,7 +1,7 @@
 from fspathtree import fspathtree
 import pathlib
 from .utils import *
-import yaml
+from . import warm
 import shutil
 import os
 
@@ -16,6 +16,9 @@ import os
 # /conan/cmd
 # /conan/args
 # /conan/extra_args
+# /conan/cache/enabled
+# /conan/cache/directory
+# /conan/cache/link
 # /cmake/cmd
 # /cmake/args
 # /cmake/extra_args
@@ -23,6 +26,19 @@ import os
 # /configure_build/script_name
 # /run_build/script_name
 # /run_tests/script_name
+# /run_tests/jobs
+# /run_tests/cache
+# /run_tests/build_selected_targets
+# /run_tests/ctest_only
+# /run_build/jobs
+# /run_build/memory_per_job
+# /run_build/link_jobs
+# /run_build/memory_per_link_job
+# /matrix
+# /compiler_cache/enabled
+# /compiler_cache/tool
+# /compiler_cache/directory
+# /compiler_cache/max_size
 
 class ConfSettings(fspathtree):
     class Null:
@@ -34,10 +50,33 @@ class ConfSettings(fspathtree):
             else:
                 return f"<NULL>"
 
+    class Deferred:
+        '''
+        A setting whose value is computed the first time it is read (i.e. settings that are detected by searching
+        the project), so commands that never read it don't pay for the detection.
+        '''
+        def __init__(self,func,msg=None):
+            self.func = func
+            self.msg = msg
+        def __repr__(self):
+            if self.msg:
+                return f"<DEFERRED:{self.msg}>"
+            else:
+                return f"<DEFERRED>"
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
         self.__allow_missing_keys = False
 
+    def __getitem__(self,path,*args,**kwargs):
+        val = super().__getitem__(path,*args,**kwargs)
+        if type(val) == ConfSettings.Deferred:
+            # replace the deferred setting with its value so that it is only computed once
+            resolved = val.func()
+            self[path] = resolved if resolved is not None else ConfSettings.Null(val.msg)
+            val = super().__getitem__(path,*args,**kwargs)
+        return val
+
     def allow_missing_keys(self,val:bool):
         self.__allow_missing_keys = bool(val)
 
@@ -59,11 +98,34 @@ class ConfSettings(fspathtree):
 
 def load_config_files( cfg: ConfSettings, root_dir:pathlib.Path, config_file_basename:str):
     # look for yaml files
-    data = ConfSettings({})
-    for file in sorted(list(find_file_at_or_above(root_dir,config_file_basename+".yml")),key=lambda p: len(p.parts)):
-        with open(file) as f:
-            data.update(ConfSettings(yaml.safe_load(f)))
-    cfg.update(data)
+    files = sorted(list(find_file_at_or_above(root_dir,config_file_basename+".yml")),key=lambda p: len(p.parts))
+    def load():
+        data = ConfSettings({})
+        for file in files:
+            import yaml
+            with open(file) as f:
+                data.update(ConfSettings(yaml.safe_load(f)))
+        return data
+    cfg.update( warm.memoize('config_files',(tuple(files),config_file_basename),load,stamp=warm.file_stamp(*files)) )
+
+def apply_settings( cfg: ConfSettings, settings:dict, prefix:str = ''):
+    '''
+    Set each of the (nested) settings in a dict, leaving the settings it does not mention alone.
+    '''
+    for key,val in settings.items():
+        if isinstance(val,dict):
+            apply_settings(cfg,val,f"{prefix}/{key}")
+        else:
+            cfg[f"{prefix}/{key}"] = val
+
+# the deferred defaults import what they need when they are evaluated, so loading the config doesn't import them.
+def get_default_jobs(memory_per_job):
+    from . import resources
+    return resources.get_default_jobs(memory_per_job)
+
+def find_compiler_cache():
+    from . import compiler_cache
+    return compiler_cache.find_compiler_cache()
 
 def set_defaults( cfg: ConfSettings, overwrite:bool = True):
 
@@ -75,6 +137,11 @@ def set_defaults( cfg: ConfSettings, overwrite:bool = True):
     set('/shell', get_shell())
     set('/build_type', ConfSettings.Null())
     set('/files/progress', ConfSettings.Null())
+    set('/files/test_history', ConfSettings.Null())
+    set('/files/test_cache', ConfSettings.Null())
+    set('/files/build_artifacts', ConfSettings.Null())
+    set('/files/build_log', ConfSettings.Null())
+    set('/files/command_timings', ConfSettings.Null())
     set('/files/conanfile', ConfSettings.Null())
     set('/files/CMakeLists.txt', ConfSettings.Null())
     set('/directories/root', ConfSettings.Null())
@@ -83,46 +150,99 @@ def set_defaults( cfg: ConfSettings, overwrite:bool = True):
     set('/conan/cmd', ConfSettings.Null())
     set('/conan/args', ConfSettings.Null("Will be generated depending on specific settings and files that are detected."))
     set('/conan/extra_args', ConfSettings.Null("Pass extra command line arguments here."))
+    set('/conan/cache/enabled', True)
+    set('/conan/cache/directory', ConfSettings.Null("Defaults to ~/.cache/ccc/conan"))
+    set('/conan/cache/link', True)
     set('/cmake/cmd', ConfSettings.Null())
     set('/cmake/args', ConfSettings.Null("Will be generated depending on specific settings and files that are detected."))
     set('/cmake/extra_args', ConfSettings.Null("Pass extra command line arguments here."))
     set('/cmake/build/cmd', ConfSettings.Null())
     set('/cmake/build/args', ConfSettings.Null("Will be detected by default."))
     set('/cmake/build/extra_args', ConfSettings.Null("Pass extra command line arg here."))
+    set('/run_build/jobs', ConfSettings.Deferred(lambda: get_default_jobs(cfg.get('/run_build/memory_per_job',None)),"One per available CPU, limited by the total (or cgroup limit) memory."))
+    set('/run_build/memory_per_job', '1G')
+    set('/run_build/link_jobs', ConfSettings.Deferred(lambda: get_default_jobs(cfg.get('/run_build/memory_per_link_job',None)),"Ninja only. One per available CPU, limited by the total (or cgroup limit) memory."))
+    set('/run_build/memory_per_link_job', '4G')
     set('/run_tests/args', ConfSettings.Null())
+    set('/run_tests/jobs', ConfSettings.Null("Number of test executables to run in parallel. 0 will use all CPUs."))
+    set('/run_tests/cache', True)
+    set('/run_tests/changed_since', ConfSettings.Null("Only run test executables affected by changes since this git ref."))
     set('/run_tests/include', ['*test*','*Test*'])
     set('/run_tests/exclude', ['*/CMakeFiles/*'])
+    set('/run_tests/build_selected_targets', False)
+    set('/run_tests/ctest_only', False)
     set('/debug_tests/args', ConfSettings.Null())
     set('/debug_tests/include', ['*test*','*Test*'])
     set('/debug_tests/exclude', ['*/CMakeFiles/*'])
     set('/debug_tests/debugger/cmd', ConfSettings.Null())
     set('/debug_tests/debugger/args', ConfSettings.Null())
+    set('/compiler_cache/enabled', True)
+    set('/compiler_cache/tool', ConfSettings.Deferred(find_compiler_cache,"ccache or sccache. Detected by default."))
+    set('/compiler_cache/directory', ConfSettings.Null("Defaults to the compiler cache's own directory. Relative paths are relative to the project root."))
+    set('/compiler_cache/max_size', ConfSettings.Null("i.e. 5G. Defaults to the compiler cache's own setting."))
+    set('/compiler_cache/languages', ['C','CXX'])
+    set('/compiler_cache/stats', True)
+    set('/timings/commands', True)
+    set('/timings/history_size', 50)
+    set('/matrix', ConfSettings.Null("Named build configurations for `ccc build --matrix`, i.e. sanitizer builds."))
     set('/list_sources/include', ['*'])
     set('/list_sources/exclude', [])
     set('/install_deps/script_filename', ConfSettings.Null() )
     set('/configure_build/script_filename', ConfSettings.Null() )
     set('/run_build/script_filename', ConfSettings.Null() )
     set('/run_tests/script_filename', ConfSettings.Null() )
+    set('/debug_tests/script_filename', ConfSettings.Null() )
+    set('/install/script_filename', ConfSettings.Null() )
 
 
 
 def set_default_build_dir(cfg:ConfSettings):
-    cfg['directories/build'] = cfg.get('directories/root',pathlib.Path())/MAKE_BUild_dir_name(build_type=cfg.get('/build_type','unknown'),system=cfg.get('/system','unknown') )
-
-
-def set_default_conanfile(cfg:ConfSettings):
-    conanfiles = list(find_file_at_or_below(cfg['/directories/root'],"conanfile.py"))
-    if len(conanfiles) < 1:
-        conanfiles = list(find_file_at_or_below(cfg['/directories/root'],"conanfile.txt"))
-
-    if len(conanfiles) > 0:
-        cfg['files/conanfile']= sorted(conanfiles,key=lambda p: p.parts)[0].absolute()
-
-
-
-def set_default_cmakefile(cfg:ConfSettings):
-    cmakefiles = list(find_file_at_or_below(cfg['/directories/root'],"CMakeLists.txt"))
-
-    if len(cmakefiles) > 0:
-        cfg['files/CMakeLists.txt'] = sorted(cmakefiles,key=lambda p: p.parts)[0].absolute()
-
+    cfg['directories/build'] = cfg.get('directories/root',pathlib.Path())/make_build_dir_name(build_type=cfg.get('/build_type','unknown'),system=cfg.get('/system','unknown') )
+
+
+def find_default_conanfile(root_dir:pathlib.Path):
+    def find():
+        from . import tracing
+        with tracing.span('find conanfile','config'):
+            conanfile = find_shallowest_file_at_or_below(root_dir,["conanfile.py","conanfile.txt"])
+        return conanfile.absolute() if conanfile is not None else None
+    return warm.memoize('conanfile',root_dir,find,valid=lambda f: f is not None and f.exists())
+
+def find_default_cmakefile(root_dir:pathlib.Path):
+    def find():
+        from . import tracing
+        with tracing.span('find CMakeLists.txt','config'):
+            cmakefile = find_shallowest_file_at_or_below(root_dir,"CMakeLists.txt")
+        return cmakefile.absolute() if cmakefile is not None else None
+    return warm.memoize('cmakefile',root_dir,find,valid=lambda f: f is not None and f.exists())
+
+
+def set_default_conanfile(cfg:ConfSettings,deferred:bool = False):
+    '''
+    Set /files/conanfile to the shallowest conanfile below the project root. If `deferred` is set, the search is
+    not done until the setting is read.
+    '''
+    root_dir = cfg['/directories/root']
+    if deferred:
+        cfg['files/conanfile'] = ConfSettings.Deferred(lambda: find_default_conanfile(root_dir))
+        return
+
+    conanfile = find_default_conanfile(root_dir)
+    if conanfile is not None:
+        cfg['files/conanfile'] = conanfile
+
+
+
+def set_default_cmakefile(cfg:ConfSettings,deferred:bool = False):
+    '''
+    Set /files/CMakeLists.txt to the shallowest CMakeLists.txt below the project root. If `deferred` is set, the search
+    is not done until the setting is read.
+    '''
+    root_dir = cfg['/directories/root']
+    if deferred:
+        cfg['files/CMakeLists.txt'] = ConfSettings.Deferred(lambda: find_default_cmakefile(root_dir))
+        return
+
+    cmakefile = find_default_cmakefile(root_dir)
+    if cmakefile is not None:
+        cfg['files/CMakeLists.txt'] = cmakefile
@@ -0,0 +1,189 @@
+import os
+import sys
+import socket
+import signal
+import select
+import threading
+import traceback
+from . import warm
+from .client import get_socket_path, check_socket_directory, check_peer, send_message, recv_message
+
+# The server for `ccc serve`. See client.py for the protocol.
+#
+# Commands are run in the server process, one at a time, so that everything that was loaded by an earlier command
+# (modules, and whatever is memoized in `warm`) is reused. While a command runs, the client's stdin/stdout/stderr are
+# dup'ed onto file descriptors 0, 1, and 2, and the client's working directory and environment are used.
+
+
+class Server:
+    '''
+    Serve ccc commands for a project root.
+
+    @param run : a function that runs a command line (list of arguments) and returns the exit code.
+    @param idle_timeout : the server exits if it does not get a request for this many seconds (None to run forever).
+    '''
+    def __init__(self, root, run, idle_timeout:float = None):
+        self.root = os.path.abspath(root)
+        self.run = run
+        self.idle_timeout = idle_timeout
+        self.socket_path = get_socket_path(self.root)
+        self.sock = None
+        self.interrupted = False
+
+    def listen(self):
+        # the directory may already exist, and in /tmp, anyone could have made it
+        os.makedirs(os.path.dirname(self.socket_path),mode=0o700,exist_ok=True)
+        check_socket_directory(os.path.dirname(self.socket_path))
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise RuntimeError(f"A server is already running for '{self.root}' ({self.socket_path}).")
+            except OSError:
+                os.unlink(self.socket_path)
+            finally:
+                probe.close()
+        self.sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        self.sock.bind(self.socket_path)
+        self.sock.listen(16)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def serve_forever(self):
+        if self.sock is None:
+            self.listen()
+        # our output is interleaved with the output of the processes we run, so it can't sit in a buffer.
+        sys.stdout.reconfigure(line_buffering=True)
+        sys.stderr.reconfigure(line_buffering=True)
+        # SIGINT is ignored if the server was started in the background, but we need it to stop commands.
+        signal.signal(signal.SIGINT,signal.default_int_handler)
+        warm.enabled = True
+        try:
+            while True:
+                try:
+                    ready,_,_ = select.select([self.sock],[],[],self.idle_timeout)
+                    if len(ready) == 0:
+                        break
+                    conn,_ = self.sock.accept()
+                    with conn:
+                        try:
+                            check_peer(conn)
+                        except PermissionError as e:
+                            sys.stderr.write(f"Refusing connection: {e}\n")
+                            continue
+                        if not self.handle(conn):
+                            break
+                except KeyboardInterrupt:
+                    # an interrupt forwarded from a client can arrive just after its command finished
+                    if not self.interrupted:
+                        raise
+                    self.interrupted = False
+        finally:
+            warm.enabled = False
+            warm.clear()
+            self.close()
+
+    def handle(self, conn):
+        '''
+        Handle one connection. Returns False if the server should stop.
+        '''
+        request,fds = recv_message(conn,maxfds=3)
+        try:
+            if request is None:
+                return True
+            if request.get('stop',False):
+                send_message(conn,{'exit':0})
+                return False
+            if len(fds) != 3:
+                send_message(conn,{'exit':1})
+                return True
+            code = self.run_request(request,fds,conn)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+        try:
+            send_message(conn,{'exit':code})
+        except OSError:
+            pass
+        return True
+
+    def run_request(self, request, fds, conn):
+        saved_fds = [ os.dup(fd) for fd in (0,1,2) ]
+        saved_env = dict(os.environ)
+        saved_cwd = os.getcwd()
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for target,fd in enumerate(fds):
+            os.dup2(fd,target)
+        os.environ.clear()
+        os.environ.update(request.get('env',{}))
+
+        done = threading.Event()
+        lock = threading.Lock()
+        wake_r,wake_w = os.pipe()
+        def forward_interrupts():
+            # the client sends a byte when it gets a SIGINT, or goes away. either way, we stop the command.
+            ready,_,_ = select.select([conn,wake_r],[],[])
+            if conn in ready:
+                conn.recv(16)
+                with lock:
+                    if not done.is_set():
+                        self.interrupted = True
+                        # a real signal (rather than _thread.interrupt_main) so that blocking calls are interrupted too
+                        signal.pthread_kill(threading.main_thread().ident,signal.SIGINT)
+        watcher = threading.Thread(target=forward_interrupts,daemon=True)
+        watcher.start()
+
+        try:
+            os.chdir(request['cwd'])
+            code = self.run(request['argv'])
+        except KeyboardInterrupt:
+            code = 130
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            with lock:
+                done.set()
+            os.write(wake_w,b'x')
+            watcher.join()
+            os.close(wake_r)
+            os.close(wake_w)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for target,fd in enumerate(saved_fds):
+                os.dup2(fd,target)
+                os.close(fd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            os.chdir(saved_cwd)
+
+        return code
+
+
+def stop_server(root):
+    '''
+    Ask the server for a project root to exit. Returns False if no server is running.
+    '''
+    socket_path = get_socket_path(root)
+    if not os.path.lexists(os.path.dirname(socket_path)):
+        return False
+    check_socket_directory(os.path.dirname(socket_path))
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return False
+    with sock:
+        check_peer(sock)
+        send_message(sock,{'stop':True})
+        recv_message(sock)
+    return True
@@ -0,0 +1,203 @@
+import os
+import mmap
+import functools
+import struct
+import pathlib
+
+# Minimal, read-only support for ELF files. We only need to look at the section
+# names and the dynamic section (the shared libraries a binary needs, and where it
+# looks for them), so only the ELF header, the section header table, the section name
+# string table, and the dynamic section and its string table are read. The file is
+# memory-mapped, so only the pages holding those tables are actually read from disk.
+
+ELF_MAGIC = b'\x7fELF'
+SHN_XINDEX = 0xffff
+SHT_DYNAMIC = 6
+DT_NULL = 0
+DT_NEEDED = 1
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+DEBUG_SECTIONS = ['.debug_info','.zdebug_info','.gnu_debuglink']
+
+class NotAnElfFile(Exception):
+    pass
+
+class _Elf:
+    '''
+    The section headers of a memory-mapped ELF file.
+    '''
+    def __init__(self,data,size,path):
+        if data[0:4] != ELF_MAGIC:
+            raise NotAnElfFile(f"'{path}' is not an ELF file.")
+
+        self.data = data
+        self.size = size
+        self.path = path
+        elf_class = data[4]
+        byte_order = {1:'<',2:'>'}.get(data[5],None)
+        if elf_class not in [1,2] or byte_order is None:
+            raise NotAnElfFile(f"'{path}' has an unknown ELF class or data encoding.")
+        self.byte_order = byte_order
+        self.elf_class = elf_class
+
+        if elf_class == 2:
+            self.shoff, = struct.unpack_from(byte_order+'Q',data,0x28)
+            self.shentsize,self.shnum,self.shstrndx = struct.unpack_from(byte_order+'HHH',data,0x3a)
+            # sh_name, sh_type, sh_offset, sh_size, sh_link
+            self.section_fields = [ (byte_order+'I',0x00), (byte_order+'I',0x04), (byte_order+'Q',0x18), (byte_order+'Q',0x20), (byte_order+'I',0x28) ]
+        else:
+            self.shoff, = struct.unpack_from(byte_order+'I',data,0x20)
+            self.shentsize,self.shnum,self.shstrndx = struct.unpack_from(byte_order+'HHH',data,0x2e)
+            self.section_fields = [ (byte_order+'I',0x00), (byte_order+'I',0x04), (byte_order+'I',0x10), (byte_order+'I',0x14), (byte_order+'I',0x18) ]
+
+        if self.shoff != 0:
+            # large section counts/indices are stored in the first section header
+            if self.shnum == 0:
+                self.shnum = self.section(0)[3]
+            if self.shstrndx == SHN_XINDEX:
+                self.shstrndx = self.section(0)[4]
+            if self.shstrndx >= self.shnum:
+                raise NotAnElfFile(f"'{path}' has an invalid section name table index.")
+
+    def section(self,i):
+        '''
+        Return (sh_name, sh_type, sh_offset, sh_size, sh_link) of a section.
+        '''
+        offset = self.shoff + i*self.shentsize
+        if offset + self.shentsize > self.size:
+            raise NotAnElfFile(f"'{self.path}' has a truncated section header table.")
+        return [ struct.unpack_from(fmt,self.data,offset+field_offset)[0] for fmt,field_offset in self.section_fields ]
+
+    def string(self,table_offset,table_size,offset):
+        if offset >= table_size:
+            return None
+        start = table_offset + offset
+        end = self.data.find(b'\0',start,table_offset+table_size)
+        if end < 0:
+            end = table_offset+table_size
+        return self.data[start:end].decode('utf-8','replace')
+
+    def string_table(self,i):
+        if i >= self.shnum:
+            raise NotAnElfFile(f"'{self.path}' has an invalid string table index.")
+        _,_,offset,size,_ = self.section(i)
+        if offset + size > self.size:
+            raise NotAnElfFile(f"'{self.path}' has a truncated string table.")
+        return offset,size
+
+    def section_names(self):
+        if self.shoff == 0:
+            return []
+        strtab_offset,strtab_size = self.string_table(self.shstrndx)
+        names = []
+        for i in range(self.shnum):
+            name = self.string(strtab_offset,strtab_size,self.section(i)[0])
+            if name is not None:
+                names.append(name)
+        return names
+
+    def dynamic_entries(self):
+        '''
+        Return the (tag,value) entries of the dynamic section, with string values (i.e. DT_NEEDED) looked up.
+        '''
+        if self.shoff == 0:
+            return []
+        entry_format,entry_size = (self.byte_order+'qQ',16) if self.elf_class == 2 else (self.byte_order+'iI',8)
+        entries = []
+        for i in range(self.shnum):
+            _,sh_type,offset,size,link = self.section(i)
+            if sh_type != SHT_DYNAMIC:
+                continue
+            if offset + size > self.size:
+                raise NotAnElfFile(f"'{self.path}' has a truncated dynamic section.")
+            strtab_offset,strtab_size = self.string_table(link)
+            for entry_offset in range(offset,offset+size-entry_size+1,entry_size):
+                tag,value = struct.unpack_from(entry_format,self.data,entry_offset)
+                if tag == DT_NULL:
+                    break
+                if tag in [DT_NEEDED,DT_RPATH,DT_RUNPATH]:
+                    value = self.string(strtab_offset,strtab_size,value)
+                entries.append((tag,value))
+        return entries
+
+
+def _read(path:pathlib.Path, read):
+    with open(path,'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 64:
+            raise NotAnElfFile(f"'{path}' is too small to be an ELF file.")
+        with mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as data:
+            return read(_Elf(data,size,path))
+
+def read_section_names(path:pathlib.Path):
+    '''
+    Return a list of the section names in an ELF file.
+
+    Raises NotAnElfFile if the file is not an ELF file, or is truncated/malformed.
+    '''
+    return _read(path,lambda elf: elf.section_names())
+
+def read_dynamic_dependencies(path:pathlib.Path):
+    '''
+    Return the shared libraries an ELF file needs (DT_NEEDED) and the directories it searches for them (DT_RUNPATH,
+    or DT_RPATH if there is no runpath), with $ORIGIN expanded.
+
+    Raises NotAnElfFile if the file is not an ELF file, or is truncated/malformed.
+    '''
+    entries = _read(path,lambda elf: elf.dynamic_entries())
+    needed = [ value for tag,value in entries if tag == DT_NEEDED and value ]
+    runpath = [ value for tag,value in entries if tag == DT_RUNPATH and value ]
+    if len(runpath) == 0:
+        runpath = [ value for tag,value in entries if tag == DT_RPATH and value ]
+    origin = str(pathlib.Path(path).absolute().parent)
+    directories = []
+    for value in runpath:
+        for directory in value.split(':'):
+            if directory:
+                directories.append( directory.replace('${ORIGIN}',origin).replace('$ORIGIN',origin) )
+    return needed,directories
+
+def find_needed_libraries(path:pathlib.Path, within:pathlib.Path = None):
+    '''
+    Return the shared libraries (paths) that an ELF file needs and that can be found in its runpath. If `within` is
+    given, only libraries below that directory are returned. Returns [] for files that are not ELF files.
+    '''
+    try:
+        needed,directories = read_dynamic_dependencies(path)
+    except (NotAnElfFile,ValueError,OSError,struct.error):
+        return []
+    within = os.path.normpath(pathlib.Path(within).absolute()) if within is not None else None
+    libraries = []
+    for name in needed:
+        for directory in directories:
+            candidate = os.path.normpath(os.path.join(directory,name))
+            if within is not None and os.path.commonpath([within,candidate]) != within:
+                continue
+            if os.path.isfile(candidate):
+                libraries.append(pathlib.Path(candidate))
+                break
+    return libraries
+
+
+def has_debug_info(path:pathlib.Path, st = None):
+    '''
+    Return true if the file is an ELF file with debug info (or a link to a separate debug info file).
+
+    Results are cached by the file's inode, modification time and size, so repeated calls for a file
+    that has not been rebuilt do not touch it again. If the caller already has the os.stat result for
+    the file, it can be passed in as `st`.
+    '''
+    if st is None:
+        st = os.stat(path)
+    return _has_debug_info(str(path),(st.st_dev,st.st_ino,st.st_mtime_ns,st.st_size))
+
+# the server (`ccc serve`) keeps this around for as long as it runs, and every rebuild of a binary adds an entry,
+# so only the most recently used ones are kept.
+@functools.lru_cache(maxsize=4096)
+def _has_debug_info(path:str, stamp):
+    try:
+        names = read_section_names(path)
+        return any( name in names for name in DEBUG_SECTIONS )
+    except (NotAnElfFile,ValueError,OSError,struct.error):
+        return False
@@ -0,0 +1,88 @@
+import os
+import shutil
+import hashlib
+import pathlib
+import subprocess
+from .core_utils import *
+
+# The inputs that determine whether a (completed) step needs to run again.
+#
+# files : config keys of files whose content is hashed
+# tools : config key and default for the tool that the step runs. the tool's `--version` output is hashed.
+# upstream : steps whose fingerprints are included, so that a step is re-run when a step it depends on is re-run.
+#
+# In addition to these, the text of the script rendered for the step is always hashed, so any change to
+# the command line (i.e. changing /cmake/extra_args) will cause the step to re-run.
+step_inputs = { 'install_deps'    : { 'files': ['/files/conanfile'], 'tools': [('/conan/cmd','conan')], 'upstream': [] },
+                'configure_build' : { 'files': ['/files/CMakeLists.txt'], 'tools': [('/cmake/cmd','cmake')], 'upstream': ['install_deps'] },
+              }
+
+
+def hash_file(path:pathlib.Path):
+    '''
+    Return the sha256 digest of a file's content, or None if the file does not exist.
+    '''
+    path = pathlib.Path(path)
+    if not path.is_file():
+        return None
+    h = hashlib.sha256()
+    with open(path,'rb') as f:
+        for chunk in iter(lambda: f.read(1024*1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_tool_version(cmd:str, cache:dict = None):
+    '''
+    Return the output of `cmd --version`.
+
+    If a cache (dict) is given, the result is stored in it keyed by the tool's resolved path, and reused as long as
+    the tool's executable has not been modified. This avoids starting the tool (which can be slow for Conan) every time.
+    '''
+    tool = shutil.which(cmd)
+    if tool is None:
+        return None
+    tool = os.path.realpath(tool)
+    st = os.stat(tool)
+    stamp = [st.st_mtime_ns,st.st_size]
+
+    if cache is not None and tool in cache and cache[tool].get('stamp',None) == stamp:
+        return cache[tool]['version']
+
+    try:
+        result = subprocess.run([tool,'--version'],capture_output=True)
+        version = result.stdout.decode(encoding,'replace').strip()
+    except OSError:
+        version = None
+
+    if cache is not None:
+        cache[tool] = {'stamp':stamp,'version':version}
+    return version
+
+
+def compute_step_fingerprint(config, name:str, script_text:str, fingerprints:dict = None, tool_version_cache:dict = None):
+    '''
+    Return a fingerprint (hex digest) of all inputs for the step with a given name, or None if the step does not
+    declare its inputs (in which case, it cannot be skipped based on its fingerprint).
+
+    @param script_text : the text of the script rendered for the step.
+    @param fingerprints : the current fingerprints of other steps, used for the step's upstream dependencies.
+    '''
+    if name not in step_inputs:
+        return None
+    inputs = step_inputs[name]
+
+    h = hashlib.sha256()
+    def add(label,val):
+        h.update(f"{label}={val}\n".encode(encoding))
+
+    add("script",script_text)
+    for key in inputs['files']:
+        file = config.get(key,None)
+        add(key, hash_file(file) if file is not None else None)
+    for key,default in inputs['tools']:
+        add(key, get_tool_version(config.get(key,default),tool_version_cache))
+    for upstream in inputs['upstream']:
+        add(f"upstream:{upstream}", (fingerprints or {}).get(upstream,None))
+
+    return h.hexdigest()
@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import signal
+import pathlib
+import traceback
+from . import tracing
+
+# Building several configurations (build types, or variants like sanitizer builds) at the same time
+# (`ccc build --matrix Debug,Release,asan`).
+#
+# Each configuration is built in a forked copy of ccc, so it gets its own copy of the config and progress state (and
+# its own build directory) without any of the steps having to know about it. The forked builds all share the parent's
+# working directory, so nothing they do may depend on (or change) the current directory. A configuration's output goes
+# to a log file in its build directory, and only a summary is printed when they are all done.
+#
+# Variants are defined in ccc.yml under /matrix. A variant has a build type, and any other settings in it override
+# the project's settings for that variant's build:
+#
+# matrix:
+#   asan:
+#     build_type: Debug
+#     cmake:
+#       extra_args: ['-DCMAKE_CXX_FLAGS=-fsanitize=address']
+#
+# Names that are not defined under /matrix are build types.
+
+# exit codes used by the forked builds to report which step failed
+step_exit_codes = {'install_deps':1,'configure_build':2,'run_build':3}
+error_exit_code = 100
+
+
+def get_configurations(names, variants:dict):
+    '''
+    Return a dict with the 'name', 'build_type', and 'settings' (overrides) for each configuration name.
+    '''
+    configurations = []
+    for name in names:
+        variant = dict(variants.get(name,None) or {})
+        build_type = variant.pop('build_type',name if name not in variants else 'Debug')
+        configurations.append({'name':name,'build_type':build_type,'settings':variant})
+    return configurations
+
+
+def split_jobs(jobs, count:int):
+    '''
+    Return the number of jobs each of `count` concurrent builds gets out of `jobs` (at least one).
+    '''
+    if jobs is None:
+        return None
+    return max(1,int(jobs) // max(1,count))
+
+
+def run_forked(configurations, run, log_filename):
+    '''
+    Run `run(configuration)` for each configuration in a forked process, all at the same time, with the process'
+    output going to `log_filename(configuration)`. `run` returns the exit code for the process.
+
+    Each configuration gets its 'exit_code', 'seconds', and 'log' set. Returns the configurations.
+    '''
+    # anything still buffered would be written by the parent and every child
+    sys.stdout.flush()
+    sys.stderr.flush()
+    running = {}
+    for configuration in configurations:
+        log = pathlib.Path(log_filename(configuration))
+        log.parent.mkdir(parents=True,exist_ok=True)
+        configuration['log'] = log
+        configuration['start'] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = error_exit_code
+            try:
+                fd = os.open(log,os.O_WRONLY|os.O_CREAT|os.O_TRUNC,0o644)
+                os.dup2(fd,1)
+                os.dup2(fd,2)
+                os.close(fd)
+                # sys.stdout may not be writing to fd 1 (i.e. under pytest)
+                sys.stdout = open(1,'w',buffering=1,closefd=False)
+                sys.stderr = open(2,'w',buffering=1,closefd=False)
+                # the parent records a span for the whole build, and writes the trace
+                tracing.stop()
+                exit_code = run(configuration)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                try:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                finally:
+                    os._exit(exit_code)
+        running[pid] = configuration
+
+    try:
+        while len(running):
+            pid,status = os.wait()
+            if pid not in running:
+                continue
+            configuration = running.pop(pid)
+            end = time.monotonic()
+            configuration['exit_code'] = os.waitstatus_to_exitcode(status)
+            configuration['seconds'] = end - configuration['start']
+            tracing.add_span(f"build {configuration['name']}",'matrix',configuration['start'],end,
+                             {'pid':pid,'exit_code':configuration['exit_code']},tid=pid)
+    except BaseException:
+        # the builds got the SIGINT too, but make sure they don't outlive us
+        for pid in running:
+            try:
+                os.kill(pid,signal.SIGTERM)
+                os.waitpid(pid,0)
+            except OSError:
+                pass
+        raise
+    return configurations
+
+
+def get_failed_step(exit_code:int):
+    '''
+    Return the name of the step that failed for a forked build's exit code, or None if it succeeded.
+    '''
+    if exit_code == 0:
+        return None
+    for name,code in step_exit_codes.items():
+        if code == exit_code:
+            return name
+    return 'error'
+
+
+def tail(filename:pathlib.Path, lines:int = 20):
+    try:
+        text = pathlib.Path(filename).read_text(errors='replace')
+    except OSError:
+        return []
+    return text.splitlines()[-lines:]
@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import pathlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .utils import *
+from .fingerprint import hash_file
+from .elf_utils import find_needed_libraries
+from . import warm
+from . import tracing
+
+
+def capture_environment(script_dir:pathlib.Path, script_name:str = 'activate_run.sh'):
+    '''
+    Return the environment that results from sourcing a script (i.e. the `activate_run.sh` script generated by Conan).
+
+    The script is sourced once in a subshell and the resulting environment is returned as a dict, so that
+    test binaries can be launched directly instead of through a shell script.
+    '''
+    script = pathlib.Path(script_dir)/script_name
+    if not script.exists():
+        return dict(os.environ)
+
+    stamp = ( warm.file_stamp(script,*sorted(script.parent.glob('conanrun*.sh'))), tuple(sorted(os.environ.items())) )
+    return dict( warm.memoize('run_environment',str(script),lambda: _capture_environment(script_dir,script_name),stamp=stamp) )
+
+
+def _capture_environment(script_dir:pathlib.Path, script_name:str):
+    script = pathlib.Path(script_dir)/script_name
+    shell = get_shell()
+    with tracing.span(f"capture environment ({script_name})",'subprocess'):
+        result = subprocess.run([shell,'-c',f'source {shlex.quote(script_name)} > /dev/null && env -0'],cwd=script_dir,capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not capture environment from '{script}': {result.stderr.decode(encoding)}")
+
+    env = {}
+    for entry in result.stdout.split(b'\0'):
+        if b'=' not in entry:
+            continue
+        key,val = entry.split(b'=',1)
+        env[os.fsdecode(key)] = os.fsdecode(val)
+    return env
+
+
+class TestResult:
+    def __init__(self,exe:pathlib.Path,returncode:int,duration:float,output:bytes):
+        self.exe = exe
+        self.returncode = returncode
+        self.duration = duration
+        self.output = output
+
+    @property
+    def passed(self):
+        return self.returncode == 0
+
+
+def run_test_binary(exe:pathlib.Path, args = None, cwd:pathlib.Path = None, env = None):
+    '''
+    Run a single test binary and return a TestResult. stdout and stderr are captured together.
+    '''
+    start = time.monotonic()
+    try:
+        result = tracing.run_process([str(exe)] + list(args or []),name=pathlib.Path(exe).name,cat='test',
+                                     cwd=cwd,env=env,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+        returncode = result.returncode
+        output = result.stdout
+    except OSError as e:
+        returncode = 127
+        output = str(e).encode(encoding)
+    return TestResult(exe,returncode,time.monotonic()-start,output)
+
+
+def print_test_result(result:TestResult, bdir:pathlib.Path = None):
+    '''
+    Print the captured output of a test binary followed by a one-line status.
+
+    Test output is written directly to stdout, it may contain text that rich would treat as markup.
+    '''
+    name = os.path.relpath(result.exe,bdir) if bdir else str(result.exe)
+    sys.stdout.flush()
+    sys.stdout.buffer.write(result.output)
+    if len(result.output) and not result.output.endswith(b'\n'):
+        sys.stdout.buffer.write(b'\n')
+    sys.stdout.buffer.flush()
+    status = "PASSED" if result.passed else f"FAILED (exit code {result.returncode})"
+    sys.stdout.write(f"{status}: {name} ({result.duration:.2f} s)\n")
+    sys.stdout.flush()
+
+
+def run_test_binaries(tests, cwd:pathlib.Path = None, env = None, jobs:int = 1, on_result = print_test_result):
+    '''
+    Run test binaries concurrently with up to `jobs` running at the same time.
+
+    @param tests : a list of (exe,args) tuples. binaries are started in the order given.
+    @param on_result : a function that is called with each TestResult as soon as the binary finishes.
+
+    All binaries are run, even if some fail. Returns a list of TestResults in the order the tests were given.
+    '''
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count() or 1
+
+    results = [None]*len(tests)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = { pool.submit(run_test_binary,exe,args,cwd,env) : i for i,(exe,args) in enumerate(tests) }
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result is not None:
+                on_result(result)
+
+    return results
+
+
+class TestHistory:
+    '''
+    A record of the wall time and status of each test binary from previous runs.
+
+    Binaries are keyed by their path relative to the build directory, so the history
+    is kept in a yaml file in the build directory (next to the progress file).
+    '''
+    def __init__(self,filename:pathlib.Path,bdir:pathlib.Path):
+        self.filename = pathlib.Path(filename)
+        self.bdir = pathlib.Path(bdir).absolute()
+        self.entries = {}
+
+    def load(self):
+        if self.filename.exists():
+            import yaml
+            self.entries = yaml.safe_load(self.filename.read_text()) or {}
+        return self
+
+    def save(self):
+        import yaml
+        self.filename.parent.mkdir(parents=True,exist_ok=True)
+        self.filename.write_text( yaml.dump(self.entries) )
+
+    def key(self,exe:pathlib.Path):
+        return os.path.relpath(pathlib.Path(exe).absolute(),self.bdir)
+
+    def get(self,exe:pathlib.Path):
+        return self.entries.get(self.key(exe),None)
+
+    def record(self,result:TestResult):
+        self.entries[self.key(result.exe)] = {'duration': round(result.duration,3), 'status': "passed" if result.passed else "failed"}
+
+    def schedule(self,exes):
+        '''
+        Return the binaries in the order they should be started: binaries that failed last time first,
+        then binaries that have not been run before, and then the rest, longest first.
+        '''
+        def priority(exe):
+            entry = self.get(exe)
+            if entry is None:
+                return (1,0)
+            if entry.get('status',None) == "failed":
+                return (0,-entry.get('duration',0))
+            return (2,-entry.get('duration',0))
+
+        return sorted(exes,key=priority)
+
+
+def hash_run_environment(bdir:pathlib.Path, script_name:str = 'activate_run.sh'):
+    '''
+    Return a hash of the scripts that set up the run environment in a build directory (`activate_run.sh` and the
+    Conan scripts it sources), or None if there is no run environment.
+    '''
+    bdir = pathlib.Path(bdir)
+    scripts = [ bdir/script_name ] + sorted( p for p in bdir.glob('conanrun*.sh') if p.name != script_name )
+    scripts = [ p for p in scripts if p.is_file() ]
+    if len(scripts) == 0:
+        return None
+    h = hashlib.sha256()
+    for script in scripts:
+        h.update(f"{script.name}={hash_file(script)}\n".encode(encoding))
+    return h.hexdigest()
+
+
+class TestResultCache:
+    '''
+    A record of the test binaries that passed, keyed by the binary's content, the content of the shared libraries in
+    the build directory that it loads, its arguments, and the run environment.
+
+    A test binary that passed before is not run again unless one of these changed. Content hashes (and the libraries a
+    binary needs) are stored with the file's inode, mtime, and size so that a file that was not relinked is not read
+    again.
+    '''
+    version = 2
+
+    def __init__(self,filename:pathlib.Path,bdir:pathlib.Path):
+        self.filename = pathlib.Path(filename)
+        self.bdir = pathlib.Path(bdir).absolute()
+        self.entries = {}
+
+    def load(self):
+        if self.filename.exists():
+            try:
+                data = json.loads(self.filename.read_text())
+                if data.get('version',None) == self.version:
+                    self.entries = data['entries']
+            except (ValueError,KeyError):
+                self.entries = {}
+        return self
+
+    def save(self):
+        self.filename.parent.mkdir(parents=True,exist_ok=True)
+        self.filename.write_text( json.dumps({'version':self.version,'entries':self.entries}) )
+
+    def _name(self,exe:pathlib.Path):
+        return os.path.relpath(pathlib.Path(exe).absolute(),self.bdir)
+
+    def _entry(self,path:pathlib.Path):
+        '''
+        Return the entry for a file, dropping anything computed from its content if it has been touched since.
+        '''
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = [st.st_ino,st.st_mtime_ns,st.st_size]
+        entry = self.entries.setdefault(self._name(path),{})
+        if entry.get('stamp',None) != stamp:
+            entry['stamp'] = stamp
+            entry.pop('sha256',None)
+            entry.pop('libraries',None)
+        return entry
+
+    def hash_binary(self,exe:pathlib.Path):
+        '''
+        Return the content hash of a binary, reusing the stored hash if the binary has not been touched since.
+        '''
+        entry = self._entry(exe)
+        if entry is None:
+            return None
+        if 'sha256' not in entry:
+            entry['sha256'] = hash_file(exe)
+        return entry['sha256']
+
+    def get_libraries(self,exe:pathlib.Path):
+        '''
+        Return the shared libraries in the build directory that a binary loads (directly or through other libraries
+        in the build directory), found with the binary's DT_NEEDED and runpath entries.
+        '''
+        libraries = []
+        pending = [pathlib.Path(exe).absolute()]
+        seen = {str(pending[0])}
+        while len(pending):
+            path = pending.pop(0)
+            entry = self._entry(path)
+            if entry is None:
+                continue
+            if 'libraries' not in entry:
+                entry['libraries'] = [ self._name(library) for library in find_needed_libraries(path,self.bdir) ]
+            for name in entry['libraries']:
+                library = self.bdir/name
+                if str(library) not in seen:
+                    seen.add(str(library))
+                    libraries.append(library)
+                    pending.append(library)
+        return libraries
+
+    def make_key(self,exe:pathlib.Path,args,env_hash:str):
+        h = hashlib.sha256()
+        h.update(f"binary={self.hash_binary(exe)}\n".encode(encoding))
+        for library in sorted(self.get_libraries(exe)):
+            h.update(f"library:{self._name(library)}={self.hash_binary(library)}\n".encode(encoding))
+        h.update(f"args={json.dumps(list(args))}\n".encode(encoding))
+        h.update(f"env={env_hash}\n".encode(encoding))
+        return h.hexdigest()
+
+    def passed(self,exe:pathlib.Path,key:str):
+        '''
+        Return True if the binary passed the last time it was run with the given key.
+        '''
+        return self.entries.get(self._name(exe),{}).get('passed',None) == key
+
+    def record(self,exe:pathlib.Path,key:str,passed:bool):
+        entry = self.entries.setdefault(self._name(exe),{})
+        if passed:
+            entry['passed'] = key
+        else:
+            entry.pop('passed',None)
@@ -1,10 +1,11 @@
 import pathlib
 import os
 import platform
+import re
+import stat
 import fnmatch
 import shutil
 import subprocess
-import itertools
 from .core_utils import *
 
 
@@ -48,28 +49,130 @@ class ptransform:
         for item in iter:
             yield self.transform_func(item)
 
-def is_file(path:pathlib.Path):
-    return path.is_file()
+# Filters are functions that take a path and return True if it should be kept. Some of them are a lot more
+# expensive than others (a glob pattern only looks at the name, is_exe has to stat the file, is_debug_exe reads
+# it, and is_git_repo runs git), so filters can declare a cost, and FilterPipeline runs the cheap ones first.
+NAME_COST = 0
+STAT_COST = 1
+READ_COST = 2
+SUBPROCESS_COST = 3
 
-def is_exe(path):
-  '''Return true if file specified by path is an executable.'''
-  if path.is_file():
-    if os.access(str(path),os.X_OK):
-      return True
+# filters that don't declare a cost (i.e. lambdas) might touch the file system, so they are not moved ahead of
+# the name-only filters.
+default_filter_cost = STAT_COST
 
-  return False
 
-def is_debug_exe(path:pathlib.Path):
-  '''
-  Return true if the file is a debug-able executable.
-  '''
-  if is_exe(path):
-    if platform.system().lower() == "linux":
-      ret = subprocess.check_output(["file",str(path.absolute())])
-      return ret.decode(encoding).find("with debug_info") > -1
+class PathFilter:
+    '''
+    A filter with a declared cost.
+
+    If `needs_stat` is True, the function is called with the path and its os.stat result (or None if
+    the path does not exist), so that a FilterPipeline can share one stat between all of its filters.
+    Otherwise it is called with just the path. Either way, the PathFilter itself is called with just a path.
+    '''
+    def __init__(self,func,cost:int = default_filter_cost,needs_stat:bool = False):
+        self.func = func
+        self.cost = cost
+        self.needs_stat = needs_stat
+        self.__doc__ = func.__doc__
+        self.__name__ = getattr(func,'__name__',type(func).__name__)
+
+    def __call__(self,path):
+        if self.needs_stat:
+            return self.func(path,stat_or_none(path))
+        return self.func(path)
+
+    def __repr__(self):
+        return f"PathFilter({self.__name__},cost={self.cost})"
+
+
+def stat_or_none(path):
+    try:
+        return os.stat(path)
+    except (OSError,ValueError):
+        return None
+
+def stat_filter(cost:int = STAT_COST):
+    '''
+    Decorator for filters that take (path,st) arguments.
+    '''
+    def decorator(func):
+        return PathFilter(func,cost,needs_stat=True)
+    return decorator
+
+def filter_cost(cost:int):
+    '''
+    Decorator for declaring the cost of a filter that takes a path argument.
+    '''
+    def decorator(func):
+        return PathFilter(func,cost)
+    return decorator
+
+
+class FilterPipeline:
+    '''
+    Combine filters so that a path is kept if it passes all of them (or any of them, with match_any=True).
+
+    Filters are evaluated cheapest first (filters with the same cost keep their order), evaluation stops as
+    soon as the result is known, and the path is stat'ed at most once, the first time a filter needs it.
+    '''
+    def __init__(self,*filters,match_any:bool = False):
+        self.match_any = match_any
+        entries = []
+        for f in flatten(filters):
+            if isinstance(f,FilterPipeline) and f.match_any == match_any:
+                entries += f.entries
+            elif isinstance(f,PathFilter):
+                entries.append( (f.cost,f.needs_stat,f.func) )
+            else:
+                entries.append( (getattr(f,'cost',default_filter_cost),False,f) )
+        self.entries = sorted(entries,key=lambda e: e[0])
+        self.cost = max( [e[0] for e in self.entries], default=NAME_COST )
+        self.needs_stat = False
+
+    def __call__(self,path):
+        st = None
+        have_stat = False
+        for cost,needs_stat,func in self.entries:
+            if needs_stat:
+                if not have_stat:
+                    st = stat_or_none(path)
+                    have_stat = True
+                result = func(path,st)
+            else:
+                result = func(path)
+            if bool(result) == self.match_any:
+                return self.match_any
+        return not self.match_any
+
+
+@stat_filter()
+def is_file(path:pathlib.Path,st):
+    return st is not None and stat.S_ISREG(st.st_mode)
+
+@stat_filter()
+def is_exe(path,st):
+    '''Return true if file specified by path is an executable.'''
+    if st is None or not stat.S_ISREG(st.st_mode):
+        return False
+    # os.access is another system call, so only ask it if the mode bits say someone can run it.
+    if st.st_mode & (stat.S_IXUSR|stat.S_IXGRP|stat.S_IXOTH) == 0:
+        return False
+    return os.access(str(path),os.X_OK)
+
+@stat_filter(READ_COST)
+def is_debug_exe(path:pathlib.Path,st):
+    '''
+    Return true if the file is a debug-able executable.
+    '''
+    if is_exe.func(path,st):
+        if platform.system().lower() == "linux":
+            from . import elf_utils
+            return elf_utils.has_debug_info(path,st)
 
-  return False
+    return False
 
+@filter_cost(SUBPROCESS_COST)
 def is_git_repo(path : pathlib.Path):
     '''
     Return true if path is part of a git repository.
@@ -84,23 +187,131 @@ def is_git_repo(path : pathlib.Path):
     return False
 
 def all_filters(*filters):
-    def passes(path:pathlib.Path):
-        return all( [f(path) for f in filters] )
-    return passes
+    return FilterPipeline(*filters)
 
 def any_filters(*filters):
-    def passes(path:pathlib.Path):
-        return any( [f(path) for f in filters] )
-    return passes
+    return FilterPipeline(*filters,match_any=True)
 
 
-def filename_matches_pattern_filter(*patterns):
-    patterns = list(flatten(patterns))
-    def matches(path:pathlib.Path):
-        for pattern in itertools.chain(patterns):
-            if fnmatch.fnmatch(path,pattern):
+class PatternSet:
+    '''
+    A set of glob-style patterns (the same syntax as fnmatch) that is compiled once, so that
+    checking if a path matches any of them does not loop over the patterns.
+
+    The most common patterns (i.e. '*', '*.cpp', 'build*', '*/CMakeFiles/*') are checked with
+    plain string operations. Everything else is combined into a single regex.
+
+    A PatternSet can be called like a filter: PatternSet('*.cpp','*.h')(path)
+    '''
+    magic_characters = '*?['
+    cost = NAME_COST
+
+    def __init__(self,*patterns):
+        # fnmatch normalizes the case of the name (and pattern) on every call. on posix this does nothing,
+        # so we only do it when it matters, and only do it to the patterns once.
+        self.normcase = os.path.normcase('A/') != 'A/'
+        self.patterns = [ os.path.normcase(p) if self.normcase else p for p in flatten(patterns) ]
+        self.match_all = False
+        exact = set()
+        prefixes = []
+        suffixes = []
+        substrings = []
+        others = []
+        for pattern in self.patterns:
+            literal = pattern.strip('*')
+            if any( c in self.magic_characters for c in literal ):
+                others.append(pattern)
+            elif literal == '':
+                if len(pattern) > 0:
+                    self.match_all = True
+                else:
+                    exact.add(pattern)
+            elif pattern.startswith('*') and pattern.endswith('*'):
+                substrings.append(literal)
+            elif pattern.startswith('*'):
+                suffixes.append(literal)
+            elif pattern.endswith('*'):
+                prefixes.append(literal)
+            else:
+                exact.add(pattern)
+        self.exact = exact
+        self.prefixes = tuple(prefixes)
+        self.suffixes = tuple(suffixes)
+        self.substrings = substrings
+        self.regex = re.compile('|'.join( fnmatch.translate(p) for p in others )).match if len(others) > 0 else None
+
+    def matches(self,path):
+        '''
+        Return True if the path (a string or path-like object) matches any of the patterns.
+        '''
+        if self.match_all:
+            return True
+        name = os.fspath(path)
+        if self.normcase:
+            name = os.path.normcase(name)
+        if name in self.exact:
+            return True
+        if self.suffixes and name.endswith(self.suffixes):
+            return True
+        if self.prefixes and name.startswith(self.prefixes):
+            return True
+        for substring in self.substrings:
+            if substring in name:
                 return True
+        if self.regex is not None and self.regex(name) is not None:
+            return True
         return False
 
-    return matches
+    __call__ = matches
+
+    def __bool__(self):
+        return self.match_all or len(self.patterns) > 0
 
+    def select(self,paths,key = None):
+        '''
+        Return the list of paths that match any of the patterns.
+
+        @param key : a function that returns the string to match for a path (i.e. lambda p : p.stem).
+        '''
+        matches = self.matches
+        if key is None:
+            return [ p for p in paths if matches(p) ]
+        return [ p for p in paths if matches(key(p)) ]
+
+
+def classify_paths(paths,include_patterns,exclude_patterns,key = None):
+    '''
+    Sort paths into those that match an include pattern (and no exclude pattern), those that match
+    an exclude pattern, and those that match neither, in one pass.
+
+    Returns a dict with "included", "excluded", and "unspecified" lists.
+    '''
+    include = include_patterns if isinstance(include_patterns,PatternSet) else PatternSet(include_patterns)
+    exclude = exclude_patterns if isinstance(exclude_patterns,PatternSet) else PatternSet(exclude_patterns)
+    included,excluded,unspecified = [],[],[]
+    for path in paths:
+        name = path if key is None else key(path)
+        if exclude and exclude.matches(name):
+            excluded.append(path)
+        elif include.matches(name):
+            included.append(path)
+        else:
+            unspecified.append(path)
+    return {"included":included,"excluded":excluded,"unspecified":unspecified}
+
+
+def filename_matches_pattern_filter(*patterns):
+    return PatternSet(*patterns)
+
+
+def include_exclude_pattern_filter(include_patterns,exclude_patterns):
+    '''
+    Return a filter that keeps paths that match one of the include patterns and none of the exclude patterns.
+    '''
+    include = PatternSet(include_patterns)
+    exclude = PatternSet(exclude_patterns)
+    if not exclude:
+        return include
+    def matches(path):
+        return include.matches(path) and not exclude.matches(path)
+    return PathFilter(matches,NAME_COST)
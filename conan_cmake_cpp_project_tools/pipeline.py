@@ -0,0 +1,104 @@
+import os
+import stat
+import pathlib
+from .build_index import BuildArtifactIndex
+from .build_report import parse_ninja_log_line
+
+# Following a build as it runs, so test executables can be started as soon as they are linked (`ccc test --pipeline`).
+#
+# An executable is only reported once it has been (re)written by the build that is running. One that the build does not
+# relink is up to date (or the build will fail), and is left for after the build finishes. Running an executable that
+# exists but is about to be relinked would test old code.
+#
+# With Ninja, every edge is appended to .ninja_log when its command finishes, so the outputs that appear in the log
+# after the build started are complete. Otherwise (Makefiles), the executables are checked again (the ones CMake's File
+# API says the project builds, or everything in the build directory using the build artifact index, so unchanged
+# directories are cheap), and an executable that has changed since the build started is reported once it has stopped
+# changing between two scans (the linker may still be writing it).
+
+
+def get_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode) or not st.st_mode & (stat.S_IXUSR|stat.S_IXGRP|stat.S_IXOTH):
+        return None
+    return (st.st_mtime_ns,st.st_size)
+
+
+class LinkedExecutableWatcher:
+    '''
+    Reports the executables in a build directory as they are linked. Create it before the build starts and call
+    `poll()` while it runs. If `executables` is given, only those are checked, otherwise the whole build directory is.
+    '''
+    def __init__(self,bdir:pathlib.Path,executables = None):
+        self.bdir = pathlib.Path(bdir).absolute()
+        self.log_filename = self.bdir/'.ninja_log'
+        self.ninja = (self.bdir/'build.ninja').exists()
+        self.executables = list(executables) if executables is not None else None
+        # an index that is only kept in memory, the run_build step owns the one on disk
+        self.index = BuildArtifactIndex(self.bdir) if self.executables is None else None
+        self.snapshot = self.get_stamps()
+        self.previous = dict(self.snapshot)
+        self.reported = set()
+        self.log_offset = 0
+        self.log_inode = None
+        try:
+            st = os.stat(self.log_filename)
+            self.log_offset = st.st_size
+            self.log_inode = st.st_ino
+        except OSError:
+            pass
+
+    def get_stamps(self):
+        if self.executables is not None:
+            stamps = { path: get_stamp(path) for path in self.executables }
+            return { path: stamp for path,stamp in stamps.items() if stamp is not None }
+        self.index.refresh()
+        return { path: (entry['mtime'],entry['size']) for path,entry in self.index.items() }
+
+    def is_new(self,path:pathlib.Path,stamp):
+        return stamp is not None and path not in self.reported and stamp != self.snapshot.get(path,None)
+
+    def poll(self):
+        '''
+        Return the executables that have been linked since the last poll.
+        '''
+        linked = self._poll_ninja_log() if self.ninja else self._poll_build_tree()
+        self.reported.update(linked)
+        return linked
+
+    def _poll_ninja_log(self):
+        try:
+            st = os.stat(self.log_filename)
+        except OSError:
+            return []
+        if st.st_ino != self.log_inode or st.st_size < self.log_offset:
+            # ninja recompacted the log, the snapshot tells us which outputs are old
+            self.log_offset = 0
+            self.log_inode = st.st_ino
+        with open(self.log_filename,'rb') as f:
+            f.seek(self.log_offset)
+            data = f.read()
+        # only read complete lines, ninja may be writing the log right now
+        end = data.rfind(b'\n')+1
+        self.log_offset += end
+        linked = []
+        for line in data[:end].decode('utf-8','replace').splitlines():
+            entry = parse_ninja_log_line(line)
+            if entry is None:
+                continue
+            path = pathlib.Path(os.path.normpath(self.bdir/entry[2]))
+            if path not in linked and self.is_new(path,get_stamp(path)):
+                linked.append(path)
+        return linked
+
+    def _poll_build_tree(self):
+        linked = []
+        current = self.get_stamps()
+        for path,stamp in sorted(current.items()):
+            if self.is_new(path,stamp) and self.previous.get(path,None) == stamp:
+                linked.append(path)
+        self.previous = current
+        return linked
@@ -0,0 +1,146 @@
+import os
+import re
+import math
+import pathlib
+
+# The CPUs and memory available to builds, for picking a default number of parallel build jobs.
+#
+# os.cpu_count() is the number of CPUs in the machine, but a container (or CI runner) is often only allowed to use
+# some of them, either through the CPU affinity mask or a cgroup CPU quota. The quota is a fraction of time, not
+# specific CPUs, so running more jobs than it allows just makes every job slower. Memory is limited the same way
+# (a cgroup limit can be far below what /proc/meminfo reports), and running out of it is worse, so the number of
+# jobs is also limited to what fits in memory given an estimate of how much each job needs.
+#
+# The default job counts end up in the configure and build scripts, which are fingerprinted, so they are computed from
+# the total memory (or the cgroup limit), not from what happens to be free right now. Otherwise every change in free
+# memory would reconfigure the build.
+
+cgroup_root = pathlib.Path('/sys/fs/cgroup')
+
+size_units = {'':1,'K':1024,'M':1024**2,'G':1024**3,'T':1024**4}
+
+
+def parse_size(size):
+    '''
+    Parse a size like '512M', '1.5G', or '2GiB' into bytes. Numbers are returned as they are.
+    '''
+    if isinstance(size,(int,float)):
+        return int(size)
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMGT]?)(?:I?B)?\s*',str(size).upper())
+    if match is None:
+        raise ValueError(f"Could not parse size '{size}'. Expected a number followed by K, M, G, or T.")
+    return int(float(match.group(1))*size_units[match.group(2)])
+
+
+def read_file(path):
+    try:
+        return pathlib.Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def get_cgroup_directories(controller:str):
+    '''
+    Return the cgroup directories that may hold the limits for a controller ('cpu' or 'memory'), the process' own
+    cgroup first. In a container, /proc/self/cgroup often names a path that is not visible, so the root is tried too.
+    '''
+    directories = []
+    text = read_file('/proc/self/cgroup') or ''
+    for line in text.splitlines():
+        fields = line.split(':',2)
+        if len(fields) != 3:
+            continue
+        hierarchy,controllers,path = fields
+        if hierarchy == '0' and controllers == '':
+            # cgroup v2
+            directories.append(cgroup_root/path.lstrip('/'))
+        elif controller in controllers.split(','):
+            directories.append(cgroup_root/controllers/path.lstrip('/'))
+            directories.append(cgroup_root/controller/path.lstrip('/'))
+    directories += [cgroup_root,cgroup_root/controller]
+    return [ d for d in dict.fromkeys(directories) if d.is_dir() ]
+
+
+def get_cgroup_cpu_limit():
+    '''
+    Return the number of CPUs the cgroup CPU quota allows (rounded up), or None if there is no quota.
+    '''
+    for directory in get_cgroup_directories('cpu'):
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        text = read_file(directory/'cpu.max')
+        if text is not None:
+            fields = text.split()
+            if len(fields) == 2 and fields[0] != 'max':
+                return max(1,math.ceil(int(fields[0])/int(fields[1])))
+            return None
+        # cgroup v1: the quota is -1 if there is none
+        quota = read_file(directory/'cpu.cfs_quota_us')
+        period = read_file(directory/'cpu.cfs_period_us')
+        if quota is not None and period is not None:
+            if int(quota) > 0:
+                return max(1,math.ceil(int(quota)/int(period)))
+            return None
+    return None
+
+
+def get_available_cpus():
+    '''
+    Return the number of CPUs this process can use, taking the affinity mask and the cgroup CPU quota into account.
+    '''
+    if hasattr(os,'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = get_cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus,limit)
+    return max(1,cpus)
+
+
+def get_meminfo_total():
+    text = read_file('/proc/meminfo')
+    if text is not None:
+        for line in text.splitlines():
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1])*1024
+    try:
+        return os.sysconf('SC_PHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (ValueError,OSError,AttributeError):
+        return None
+
+
+def get_cgroup_memory_limit():
+    '''
+    Return the cgroup memory limit, or None if there is no limit.
+    '''
+    for directory in get_cgroup_directories('memory'):
+        # cgroup v2
+        limit = read_file(directory/'memory.max')
+        if limit is not None:
+            return None if limit == 'max' else int(limit)
+        # cgroup v1: "no limit" is a huge number
+        limit = read_file(directory/'memory.limit_in_bytes')
+        if limit is not None:
+            return None if int(limit) >= 2**60 else int(limit)
+    return None
+
+
+def get_total_memory():
+    '''
+    Return the total memory (in bytes) this process can use, the machine's or the cgroup limit, or None if it is not
+    known. Unlike the free memory, this does not change from one run to the next.
+    '''
+    total = [ m for m in (get_meminfo_total(),get_cgroup_memory_limit()) if m is not None ]
+    return min(total) if len(total) else None
+
+
+def get_default_jobs(memory_per_job, cpus:int = None, memory:int = None):
+    '''
+    Return the number of jobs to run in parallel: one per available CPU, but no more than fit in the total memory
+    (see get_total_memory) if each job needs `memory_per_job`.
+    '''
+    jobs = cpus if cpus is not None else get_available_cpus()
+    memory = memory if memory is not None else get_total_memory()
+    if memory is not None and memory_per_job:
+        jobs = min(jobs,memory // parse_size(memory_per_job))
+    return max(1,jobs)
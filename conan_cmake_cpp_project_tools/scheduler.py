@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# A small scheduler for running the steps (and anything else a command needs done) as a dependency graph.
+#
+# Commands ask for the node(s) they want (i.e. `ccc test` wants run_tests) and everything those depend on is run
+# first. A node starts as soon as all of its dependencies have completed, so nodes that don't depend on each other
+# run at the same time (in threads; the actual work is done by subprocesses). Nothing new is started once a node
+# fails, the nodes that are already running are waited for, and everything that did not get to run is reported as
+# 'not run'.
+#
+# Whether a step is up to date (its fingerprint) is up to the node's function, the scheduler only cares about the
+# return code.
+#
+# The steps themselves are a chain (install_deps -> configure_build -> run_build -> run_tests/debug_tests -> install),
+# so for ordinary commands nothing actually runs at the same time. The concurrency is used by `ccc test --pipeline`,
+# which runs the tests alongside the build.
+
+
+class Node:
+    '''
+    A unit of work in a StepGraph.
+
+    name : the name of the node.
+    run : a function that does the work and returns 0 on success.
+    deps : the names of the nodes that must complete before this one starts.
+    '''
+    def __init__(self,name:str,run,deps = None):
+        self.name = name
+        self.run = run
+        self.deps = list(deps or [])
+
+
+class StepGraph:
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self,name:str,run,deps = None):
+        self.nodes[name] = Node(name,run,deps)
+        return self.nodes[name]
+
+    def get_order(self,targets):
+        '''
+        Return the targets and all of the nodes they depend on, in an order that puts every node after its
+        dependencies.
+        '''
+        order = []
+        state = {}
+        for target in targets:
+            stack = [(target,False)]
+            while len(stack):
+                name,expanded = stack.pop()
+                if expanded:
+                    state[name] = 'done'
+                    order.append(name)
+                    continue
+                if state.get(name,None) == 'done':
+                    continue
+                if state.get(name,None) == 'visiting':
+                    raise RuntimeError(f"The step graph has a cycle through '{name}'.")
+                if name not in self.nodes:
+                    raise RuntimeError(f"Unknown step '{name}'.")
+                state[name] = 'visiting'
+                stack.append((name,True))
+                stack += [ (dep,False) for dep in reversed(self.nodes[name].deps) if state.get(dep,None) != 'done' ]
+        return order
+
+    def run(self,targets,jobs:int = None,completed = None):
+        '''
+        Run the targets (and the nodes they depend on). Returns a dict with the status of each node: 'complete',
+        'failed', or 'not run'. Nodes listed in `completed` are treated as complete without running them.
+
+        A node that is the only one that can run is run in the calling thread (so a plain chain of steps runs just
+        like a sequence of function calls would, Ctrl-C included).
+        '''
+        completed = completed or []
+        order = self.get_order(targets)
+        status = { name: 'complete' if name in completed else 'not run' for name in order }
+        pending = [ name for name in order if name not in completed ]
+        running = {}
+
+        def ready():
+            return [ name for name in pending if all( status[dep] == 'complete' for dep in self.nodes[name].deps ) ]
+
+        def finish(name,returncode):
+            status[name] = 'complete' if returncode == 0 else 'failed'
+
+        with ThreadPoolExecutor(max_workers=jobs or max(1,len(order))) as pool:
+            try:
+                while True:
+                    if 'failed' not in status.values():
+                        names = ready()
+                        if len(names) == 1 and len(running) == 0:
+                            pending.remove(names[0])
+                            finish(names[0],self.nodes[names[0]].run())
+                            continue
+                        for name in names:
+                            pending.remove(name)
+                            running[pool.submit(self.nodes[name].run)] = name
+                    if len(running) == 0:
+                        break
+                    done,_ = wait(running,return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(running.pop(future),future.result())
+            finally:
+                # don't start anything else, but let whatever is running finish (the pool waits for it)
+                pending.clear()
+        return status
+
+
+def get_failed(status:dict):
+    '''
+    Return the name of the first node that failed, or None.
+    '''
+    for name,s in status.items():
+        if s == 'failed':
+            return name
+    return None
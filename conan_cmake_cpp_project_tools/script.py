@@ -109,6 +109,16 @@ class CmdGenerator:
         return self.source_scripts_if_present_for_system( [ ('deactivate_build.sh','linux'), ('deactivate_build.ps1','windows') ], script_dir, source_from_dir )
 
 
+    def set_environment_variable(self,name:str,value:str):
+        cmd = None
+        if self.shell.name == "bash":
+            cmd = "export "+shlex.join([f"{name}={value}"])
+
+        if cmd is None:
+            raise RuntimeError(f"Shell '{self.shell}' is not supported for the 'set_environment_variable' command yet.")
+
+        return cmd
+
     def enable_exit_on_error(self):
         if self.shell.name == "bash":
             return "set -e"
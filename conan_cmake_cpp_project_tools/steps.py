@@ -1,14 +1,104 @@
 from .utils import *
 from .script import Script, CmdGenerator
+from .change_impact import get_changed_files, select_affected, BuildDependencies
+from .conan_cache import ConanInstallCache
+from .build_index import get_build_artifact_index
+from .build_report import NinjaLog
+from . import timing
+from . import compiler_cache
+from . import build_targets
+from . import cmake_file_api
+from .parallel_tests import capture_environment, run_test_binary, run_test_binaries, print_test_result, TestResult, TestHistory, TestResultCache, hash_run_environment
+from .pipeline import LinkedExecutableWatcher
 import tempfile
 import platform
 import subprocess
 import fnmatch
-import typer
 from os.path import relpath
 from .config import ConfSettings
 from rich import print
 
+script_filenames = { 'install_deps'    : '01-install_deps',
+                     'configure_build' : '02-configure_build',
+                     'run_build'       : '03-run_build',
+                     'run_tests'       : '04-run_tests',
+                     'debug_tests'     : '05-debug_tests',
+                     'install'         : '05-install',
+                   }
+
+# The steps that each step needs to have completed before it can run, and the files (in the build directory) that a
+# completed step leaves behind. A step whose outputs are missing is run again, even if its inputs (see
+# fingerprint.step_inputs) have not changed.
+step_dependencies = { 'install_deps'    : [],
+                      'configure_build' : ['install_deps'],
+                      'run_build'       : ['configure_build'],
+                      'run_tests'       : ['run_build'],
+                      'debug_tests'     : ['run_build'],
+                      'install'         : ['run_tests'],
+                    }
+step_outputs = { 'configure_build' : ['CMakeCache.txt','.cmake/api/v1/query/client-ccc/codemodel-v2'] }
+
+def run_script(config:ConfSettings,script_filename):
+    '''
+    Run a step's script, timing each of its commands (unless /timings/commands is turned off).
+    '''
+    return timing.run_script(script_filename,trace=config.get('/timings/commands',True))
+
+def get_compiler_cache(config:ConfSettings):
+    '''
+    Return the compiler cache (ccache or sccache) to build with, or None.
+    '''
+    if not config.get('/compiler_cache/enabled',True):
+        return None
+    return config.get('/compiler_cache/tool',None)
+
+def get_compiler_cache_environment(config:ConfSettings,tool):
+    '''
+    Return the environment variables that set the compiler cache's directory and size limit from the config.
+    '''
+    directory = config.get('/compiler_cache/directory',None)
+    if directory is not None:
+        directory = pathlib.Path(directory)
+        if not directory.is_absolute():
+            directory = config.get('/directories/root',pathlib.Path()).absolute()/directory
+    return compiler_cache.cache_environment(tool,directory,config.get('/compiler_cache/max_size',None))
+
+def uses_ninja(cmake_args):
+    '''
+    Return True if a CMake configure command line (or the CMAKE_GENERATOR environment variable) selects a Ninja generator.
+    '''
+    for i,arg in enumerate(cmake_args):
+        if arg == '-G' and i+1 < len(cmake_args):
+            return cmake_args[i+1].startswith('Ninja')
+        if arg.startswith('-G'):
+            return arg[2:].strip().startswith('Ninja')
+    return os.environ.get('CMAKE_GENERATOR','').startswith('Ninja')
+
+def link_job_pool_args(config:ConfSettings,cmake_args):
+    '''
+    Return the CMake arguments that put link jobs in their own (smaller) Ninja job pool. Links of large C++ binaries
+    can take several times the memory of a compile.
+    '''
+    if not uses_ninja(cmake_args) or any( 'CMAKE_JOB_POOL' in arg for arg in cmake_args ):
+        return []
+    link_jobs = config.get('/run_build/link_jobs',None)
+    if link_jobs is None:
+        return []
+    return [f"-DCMAKE_JOB_POOLS=link_jobs={int(link_jobs)}","-DCMAKE_JOB_POOL_LINK=link_jobs"]
+
+def get_script_filename(config:ConfSettings,name:str):
+    '''
+    Return the name of the script that a step writes (relative to the scripts directory).
+    '''
+    return config.get(f'/{name}/script_filename',script_filenames[name])
+
+def get_script_path(config:ConfSettings,name:str):
+    '''
+    Return the path to the script that a step writes. Steps don't change the working directory (several can run at
+    the same time), so this is an absolute path.
+    '''
+    return pathlib.Path(config['/directories/scripts']).absolute()/get_script_filename(config,name)
+
 def install_deps(config:ConfSettings,run=True):
     if config.get('/files/conanfile',None) is None:
         print("No conanfile found. Skipping install_deps step.")
@@ -17,37 +107,47 @@ def install_deps(config:ConfSettings,run=True):
     if config.get('/directories/build',None) is None:
         raise RuntimeError("No build directory given. Cannot run install_deps step.")
     script = Script( system=config.get('/system',get_system()), shell=config.get('/shell', get_shell()) )
-    script_filename = config.get('/install_deps/script_filename','01-install_deps')
+    script_filename = get_script_path(config,'install_deps')
     
     
-    with working_directory(config['directories/scripts']):
-        bdir = config['/directories/build'].absolute()
-        cdir = config['/files/conanfile'].absolute().parent
+    bdir = config['/directories/build'].absolute()
+    cdir = config['/files/conanfile'].absolute().parent
 
-        script.cd(bdir.parent)
-        script.mkdir(relpath(bdir,bdir.parent))
-        script.cd(relpath(bdir,bdir.parent))
+    script.cd(bdir.parent)
+    script.mkdir(relpath(bdir,bdir.parent))
+    script.cd(relpath(bdir,bdir.parent))
 
 
-        build_type = config.get('/build_type','Debug')
+    build_type = config.get('/build_type','Debug')
 
-        conan_cmd = [ config.get('/conan/cmd','conan') ]
-        default_args = ['install','{conan_dir}','-pr:b=default','-s','build_type={build_type}']
-        conan_cmd += [ arg.format(conan_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/conan/args',ConfSettings(default_args)).tree ]
-        conan_cmd += [ arg.format(conan_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/conan/extra_args',ConfSettings([])).tree ]
+    conan_cmd = [ config.get('/conan/cmd','conan') ]
+    default_args = ['install','{conan_dir}','-pr:b=default','-s','build_type={build_type}']
+    conan_cmd += [ arg.format(conan_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/conan/args',ConfSettings(default_args)).tree ]
+    conan_cmd += [ arg.format(conan_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/conan/extra_args',ConfSettings([])).tree ]
 
 
-        script.add_command( conan_cmd )
+    script.add_command( conan_cmd )
 
 
-        script.write(pathlib.Path(script_filename),exit_on_error=True)
-        
-        if run:
-            cmd = cmd_to_run_shell_script(script_filename)
-            result = subprocess.run(cmd)
-            return result.returncode
+    script.write(pathlib.Path(script_filename),exit_on_error=True)
+    
+    if run:
+        cache = None
+        if config.get('/conan/cache/enabled',True):
+            cache = ConanInstallCache(config.get('/conan/cache/directory',None))
+            key = cache.make_key(conan_cmd,config['/files/conanfile'].absolute(),bdir,{'system':config.get('/system',get_system()),'build_type':build_type})
+            if cache.materialize(key,bdir,cdir,link=config.get('/conan/cache/link',True)):
+                print(f"Found Conan install output in cache ({cache.entry_directory(key)}). Skipping conan install.")
+                return 0
+            cache.remove_materialized(bdir)
+            snapshot = cache.snapshot(bdir)
+
+        result = run_script(config,script_filename)
+        if result.returncode == 0 and cache is not None:
+            cache.store(key,bdir,cdir,cache.generated_files(bdir,snapshot))
+        return result.returncode
 
-        
+    
 
 
     
@@ -57,44 +157,52 @@ def configure_build(config:ConfSettings,run=True):
     if config.get('/directories/build',None) is None:
         raise RuntimeError("No build directory given. Cannot run configure_build step.")
     script = Script( system=config.get('/system',get_system()), shell=config.get('/shell', get_shell()) )
-    script_filename = config.get('/configure_build/script_filename','02-configure_build')
+    script_filename = get_script_path(config,'configure_build')
     
     
-    with working_directory(config['directories/scripts']):
-        bdir = config['directories/build'].absolute()
-        cdir = config['files/CMakeLists.txt'].absolute().parent
+    bdir = config['directories/build'].absolute()
+    cdir = config['files/CMakeLists.txt'].absolute().parent
 
-        script.cd(bdir.parent)
-        script.mkdir(relpath(bdir,bdir.parent))
-        script.cd(relpath(bdir,bdir.parent))
-        script.activate_environment(bdir,bdir) 
+    script.cd(bdir.parent)
+    script.mkdir(relpath(bdir,bdir.parent))
+    script.cd(relpath(bdir,bdir.parent))
+    script.activate_environment(bdir,bdir) 
 
 
 
-        build_type = config.get('/build_type','Debug')
-        cmake_cmd = [ config.get('/cmake/cmd','cmake') ]
-        default_args = ["{cmake_dir}"]
-        if (bdir/"conan_toolchain.cmake").exists():
-            default_args += ["-DCMAKE_TOOLCHAIN_FILE=conan_toolchain.cmake"]
-        default_args += ["-DCMAKE_BUILD_TYPE={build_type}"]
-        cmake_cmd += [ arg.format(cmake_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/cmake/args',ConfSettings(default_args)).tree ]
-        cmake_cmd += [ arg.format(cmake_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/cmake/extra_args',ConfSettings([])).tree ]
+    build_type = config.get('/build_type','Debug')
+    cmake_cmd = [ config.get('/cmake/cmd','cmake') ]
+    default_args = ["{cmake_dir}"]
+    if (bdir/"conan_toolchain.cmake").exists():
+        default_args += ["-DCMAKE_TOOLCHAIN_FILE=conan_toolchain.cmake"]
+    default_args += ["-DCMAKE_BUILD_TYPE={build_type}"]
+    cmake_cmd += [ arg.format(cmake_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/cmake/args',ConfSettings(default_args)).tree ]
+    cmake_cmd += [ arg.format(cmake_dir=relpath(cdir,bdir),build_type=build_type) for arg in config.get('/cmake/extra_args',ConfSettings([])).tree ]
+    tool = get_compiler_cache(config)
+    if tool is not None:
+        cmake_cmd += compiler_cache.launcher_args(tool,config.get('/compiler_cache/languages',ConfSettings(['C','CXX'])).tree,cmake_cmd)
+    cmake_cmd += link_job_pool_args(config,cmake_cmd)
 
-        script.add_command( cmake_cmd )
+    script.add_command( cmake_cmd )
 
 
-        script.deactivate_environment(bdir,bdir)
+    script.deactivate_environment(bdir,bdir)
 
 
-        script.write(pathlib.Path(script_filename),exit_on_error=True)
-        
-        if run:
-            cmd = cmd_to_run_shell_script(script_filename)
-            result = subprocess.run(cmd)
-            return result.returncode
+    script.write(pathlib.Path(script_filename),exit_on_error=True)
+    
+    if run:
+        # so that CMake tells us what targets the project has
+        cmake_file_api.write_query(bdir)
+        result = run_script(config,script_filename)
+        return result.returncode
 
 
-def run_build(config:ConfSettings,run=True):
+def run_build(config:ConfSettings,run=True,test_targets=False):
+    '''
+    Build the project. If `test_targets` is set, only the targets that match the test include/exclude patterns (and
+    the targets they depend on) are built, if they can be determined.
+    '''
 
     if config.get('/directories/build',None) is None:
         raise RuntimeError("No build directory given. Cannot run configure_build step.")
@@ -105,30 +213,137 @@ def run_build(config:ConfSettings,run=True):
         raise RuntimeError(f"The build directory '{bdir}' has not been created yet.")
 
     script = Script( system=config.get('/system',get_system()), shell=config.get('/shell', get_shell()) )
-    script_filename = config.get('/run_build/script_filename','03-run_build')
-
-    with working_directory(config['directories/scripts']):
-        script.cd(bdir.parent)
-        script.cd(relpath(bdir,bdir.parent))
-        script.activate_environment(bdir,bdir)
-
-        cmake_cmd = [ config.get('/cmake/cmd','cmake') ]
-        default_args = ["--build",'.']
-        cmake_cmd += [ arg for arg in config.get('/cmake/build/args',ConfSettings(default_args)).tree ]
-        cmake_cmd += [ arg for arg in config.get('/cmake/build/extra_args',ConfSettings([])).tree ]
-
-        script.add_command( cmake_cmd )
-
-        script.deactivate_environment(bdir,bdir)
+    script_filename = get_script_path(config,'run_build')
+
+    script.cd(bdir.parent)
+    script.cd(relpath(bdir,bdir.parent))
+    script.activate_environment(bdir,bdir)
+    # the launcher was set when the build was configured, the cache's settings are read when it runs
+    tool = get_compiler_cache(config)
+    cache_env = get_compiler_cache_environment(config,tool) if tool is not None else {}
+    for name,value in cache_env.items():
+        script.set_environment_variable(name,value)
+
+    cmake_cmd = [ config.get('/cmake/cmd','cmake') ]
+    default_args = ["--build",'.']
+    extra_args = config.get('/cmake/build/extra_args',ConfSettings([])).tree
+    jobs = config.get('/run_build/jobs',None)
+    if jobs is not None and not any( arg.startswith('-j') or arg.startswith('--parallel') for arg in extra_args ):
+        default_args += ['--parallel',str(jobs)]
+    cmake_cmd += [ arg for arg in config.get('/cmake/build/args',ConfSettings(default_args)).tree ]
+    cmake_cmd += [ arg for arg in extra_args ]
+    if test_targets and not any( arg in ['--target','-t'] or arg.startswith('--target=') for arg in cmake_cmd ):
+        targets = get_test_targets(config)
+        if targets is not None:
+            cmake_cmd += ['--target'] + targets
+
+    script.add_command( cmake_cmd )
+
+    script.deactivate_environment(bdir,bdir)
+
+    script.write(pathlib.Path(script_filename),exit_on_error=True)
+    
+    if run:
+        stats = tool is not None and config.get('/compiler_cache/stats',True)
+        if stats:
+            env = dict(os.environ,**cache_env)
+            before = compiler_cache.get_stats(tool,env)
+        result = run_script(config,script_filename)
+        if stats:
+            delta = compiler_cache.stats_delta(before,compiler_cache.get_stats(tool,env))
+            if delta is not None and delta['hits'] + delta['misses'] > 0:
+                print(compiler_cache.format_stats(compiler_cache.get_tool_name(tool) or tool,delta))
+        if result.returncode == 0:
+            get_artifact_index(config)
+        if (bdir/'.ninja_log').exists():
+            # the build log is recompacted every now and then, so we read what this build added now
+            update_build_log(config)
+        return result.returncode
+
+
+def get_test_targets(config:ConfSettings):
+    '''
+    Return the build targets that match the test include/exclude patterns, or None if the whole project needs to be
+    built.
+    '''
+    bdir = config['directories/build'].absolute()
+    include_patterns = config.get('/run_tests/include',ConfSettings(['*test*','*Test*'])).tree
+    exclude_patterns = config.get('/run_tests/exclude',ConfSettings([])).tree
+
+    test_targets,_ = get_test_executable_targets(config)
+    if test_targets is not None:
+        # the patterns are matched against the executables' paths, just like run_tests does
+        names = { cmake_file_api.get_executable(target): target['name'] for target in test_targets }
+        selected = [ names[exe] for exe in classify_paths(list(names),include_patterns,exclude_patterns)['included'] ]
+        if len(selected) == 0:
+            print("[yellow]No build targets match the test include/exclude patterns. Building everything.[/yellow]")
+            return None
+        print(f"Building test targets: {' '.join(selected)}")
+        return selected
+
+    targets = build_targets.get_build_targets(bdir,config.get('/cmake/cmd','cmake'))
+    if targets is None:
+        print("[yellow]Could not list the build targets. Building everything.[/yellow]")
+        return None
+    selected = build_targets.select_targets(targets,include_patterns,exclude_patterns)
+    if selected is None:
+        print("[yellow]The test include patterns name directories, so they can't be matched against build targets. Building everything.[/yellow]")
+        return None
+    if len(selected) == 0:
+        print("[yellow]No build targets match the test include/exclude patterns. Building everything.[/yellow]")
+        return None
+    print(f"Building test targets: {' '.join(selected)}")
+    return selected
+
+
+def update_build_log(config:ConfSettings):
+    '''
+    Read the new entries in the build directory's .ninja_log and return the NinjaLog.
+    '''
+    bdir = config['directories/build'].absolute()
+    log = NinjaLog(bdir,config.get('/files/build_log',bdir/'ccc-build-log.json')).load().update()
+    log.save()
+    return log
 
-        script.write(pathlib.Path(script_filename),exit_on_error=True)
-        
-        if run:
-            cmd = cmd_to_run_shell_script(script_filename)
-            result = subprocess.run(cmd)
-            return result.returncode
+def get_artifact_index(config:ConfSettings):
+    '''
+    Return the (refreshed) index of executables in the build directory.
+    '''
+    bdir = config['directories/build'].absolute()
+    return get_build_artifact_index(bdir,config.get('/files/build_artifacts',bdir/'ccc-artifacts.json'))
 
-def run_tests(config:ConfSettings,run=True):
+def get_test_executable_targets(config:ConfSettings):
+    '''
+    Return the executable targets that can be tests, and the ones that can't because they are not registered with
+    CTest (if /run_tests/ctest_only is set and the project registers any tests), from CMake's File API reply. Returns
+    (None,None) if there is no reply.
+    '''
+    bdir = config['directories/build'].absolute()
+    targets = cmake_file_api.get_targets(bdir,config.get('/build_type','Debug'))
+    if targets is None:
+        return None,None
+    targets = [ target for target in targets if cmake_file_api.get_executable(target) is not None ]
+    if config.get('/run_tests/ctest_only',False) and any( target['ctest'] for target in targets ):
+        return [ target for target in targets if target['ctest'] ],[ target for target in targets if not target['ctest'] ]
+    return targets,[]
+
+def get_test_candidates(config:ConfSettings):
+    '''
+    Return the executables that have been built and can be tests, and the ones that are skipped because they are not
+    registered with CTest. Without a File API reply, all of the executables in the build directory can be tests.
+    '''
+    targets,unregistered = get_test_executable_targets(config)
+    if targets is None:
+        return get_artifact_index(config).executables(),[]
+    exes = sorted( exe for exe in map(cmake_file_api.get_executable,targets) if exe.exists() )
+    unregistered = sorted( exe for exe in map(cmake_file_api.get_executable,unregistered) if exe.exists() )
+    return exes,unregistered
+
+def run_tests(config:ConfSettings,run=True,build=None):
+    '''
+    Run the test executables. If `build` (a Future for the run_build step's return code) is given, the build is still
+    running, and the tests are started as they are linked.
+    '''
     if config.get('/directories/build',None) is None:
         raise RuntimeError("No build directory given. Cannot run configure_build step.")
 
@@ -137,62 +352,256 @@ def run_tests(config:ConfSettings,run=True):
     if not bdir.exists():
         raise RuntimeError(f"The build directory '{bdir}' has not been created yet.")
 
+    if run and build is not None:
+        return run_tests_pipelined(config,build)
+
     cmd_generator = CmdGenerator(config.get('/system',None))
     script = Script( system=config.get('/system',get_system()), shell=config.get('/shell', get_shell()) )
-    script_filename = config.get('/run_build/script_filename','04-run_tests')
+    script_filename = get_script_path(config,'run_tests')
 
-    with working_directory(config['directories/scripts']):
-        script.cd(bdir.parent)
-        script.cd(relpath(bdir,bdir.parent))
-        script.activate_run_environment(bdir,bdir)
+    script.cd(bdir.parent)
+    script.cd(relpath(bdir,bdir.parent))
+    script.activate_run_environment(bdir,bdir)
 
-        include_patterns = config.get('/run_tests/include',ConfSettings(['*test*','*Test*']))
-        exclude_patterns = config.get('/run_tests/exclude',ConfSettings([]))
-        include_patterns_filter = filename_matches_pattern_filter(include_patterns.tree)
-        exclude_patterns_filter = filename_matches_pattern_filter(exclude_patterns.tree)
+    include_patterns = config.get('/run_tests/include',ConfSettings(['*test*','*Test*']))
+    exclude_patterns = config.get('/run_tests/exclude',ConfSettings([]))
 
-        exes = list(bdir.glob("**/*") | pfilter(is_exe))
-        included_exes = list(exes | pfilter(include_patterns_filter))
-        excluded_exes = list(included_exes | pfilter(exclude_patterns_filter))
-        test_exes = list(included_exes | -pfilter(exclude_patterns_filter))
+    exes,unregistered_exes = get_test_candidates(config)
+    classified_exes = classify_paths(exes,include_patterns.tree,exclude_patterns.tree)
+    test_exes = classified_exes['included']
 
-        print("Found test executables:")
-        if len(test_exes) > 0:
-            for exe in test_exes:
+    print("Found test executables:")
+    if len(test_exes) > 0:
+        for exe in test_exes:
+            print("  ",exe)
+    if len(classified_exes['unspecified']) > 0:
+        print(f"These executables were found, but skipped because they did not match an include pattern ({include_patterns.tree}):")
+        for exe in classified_exes['unspecified']:
+            print("  ",exe)
+    if len(classified_exes['excluded']) > 0:
+        print(f"These executables were found, but skipped because they matched an exclude pattern ({exclude_patterns.tree}):")
+        for exe in classified_exes['excluded']:
+            print("  ",exe)
+    if len(unregistered_exes) > 0:
+        print("These executables were found, but skipped because they are not registered with CTest (set /run_tests/ctest_only to false to run them):")
+        for exe in unregistered_exes:
+            print("  ",exe)
+
+    changed_since = config.get('/run_tests/changed_since',None)
+    if changed_since is not None:
+        changed_files = get_changed_files(config['/directories/root'],changed_since)
+        test_exes,unaffected_exes = select_affected(test_exes,bdir,changed_files)
+        if len(unaffected_exes) > 0:
+            print(f"These executables were skipped because they are not affected by changes since '{changed_since}':")
+            for exe in unaffected_exes:
                 print("  ",exe)
-        if len(exes) != len(included_exes):
-            print(f"These executables were found, but skipped because they did not match an include pattern ({include_patterns.tree}):")
-            for exe in exes:
-                if exe not in included_exes:
-                    print("  ",exe)
-        if len(excluded_exes) > 0:
-            print(f"These executables were found, but skipped because they matched an exclude pattern ({exclude_patterns.tree}):")
-            for exe in exes:
-                if exe in excluded_exes:
-                    print("  ",exe)
 
-        for exe in test_exes:
-            args = []
-            for pattern in config.get('/run_tests/args',ConfSettings([])).tree:
-                if fnmatch.fnmatch(exe,pattern):
-                    if config[f'run_tests/args/{pattern}'] is not None:
-                        if type(config[f'run_tests/args/{pattern}']) == str:
-                            args = [config[f'run_tests/args/{pattern}']]
-                        else:
-                            args = config[f'run_tests/args/{pattern}'].tree
+    cache = None
+    cache_keys = {}
+    if run and config.get('/run_tests/cache',True):
+        cache = TestResultCache(config.get('/files/test_cache',bdir/'ccc-test-cache.json'),bdir).load()
+        env_hash = hash_run_environment(bdir)
+        cache_keys = { exe: cache.make_key(exe,get_test_args(config,exe),env_hash) for exe in test_exes }
+        cached_exes = [ exe for exe in test_exes if cache.passed(exe,cache_keys[exe]) ]
+        if len(cached_exes) > 0:
+            print("These executables were skipped because they passed before and their binary, arguments, and run environment have not changed (use --no-cache to run them):")
+            for exe in cached_exes:
+                print("   cached:",exe)
+            test_exes = [ exe for exe in test_exes if exe not in cached_exes ]
+
+    # the command lines in the script, so the timed commands can be matched up with the executables
+    calls = {}
+    for exe in test_exes:
+        call = script.cmd_generator.call(exe,bdir,get_test_args(config,exe))
+        calls[call] = exe
+        script.add_command(call)
+
+
+    script.write(pathlib.Path(script_filename),exit_on_error=True)
+
+    script.deactivate_run_environment(bdir,bdir)
+
+    if run:
+        jobs = config.get('/run_tests/jobs',None)
+        if jobs is not None and int(jobs) != 1:
+            results = run_tests_in_parallel(config,test_exes,int(jobs))
+            for r in results:
+                timing.record_command(shlex.join([str(r.exe)]+get_test_args(config,r.exe)),r.duration,r.returncode)
+            passed = { r.exe: r.passed for r in results }
+            returncode = 0 if all(passed.values()) else 1
+        else:
+            commands_before = len(timing.recorded_commands())
+            result = run_script(config,script_filename)
+            returncode = result.returncode
+            # the script stops at the first failure. the binaries that ran before it passed, the ones after it did not run.
+            results = [ TestResult(calls[c['command']],c['status'],c['seconds'],b'')
+                        for c in timing.recorded_commands()[commands_before:] if c['command'] in calls ]
+            passed = { r.exe: r.passed for r in results }
+            if returncode == 0 and len(results) == 0:
+                # the commands were not timed (see /timings/commands), but they all passed
+                passed = { exe: True for exe in test_exes }
+            record_test_history(config,results)
+
+        if cache is not None:
+            for exe in test_exes:
+                if exe in passed:
+                    cache.record(exe,cache_keys[exe],passed[exe])
+            cache.save()
+
+        return returncode
 
 
-            script.call(exe,bdir,args)
+def get_test_args(config:ConfSettings,exe:pathlib.Path):
+    '''
+    Return the command line arguments configured under /run_tests/args for a test executable.
+    '''
+    args = []
+    for pattern in config.get('/run_tests/args',ConfSettings([])).tree:
+        if fnmatch.fnmatch(exe,pattern):
+            if config[f'run_tests/args/{pattern}'] is not None:
+                if type(config[f'run_tests/args/{pattern}']) == str:
+                    args = [config[f'run_tests/args/{pattern}']]
+                else:
+                    args = config[f'run_tests/args/{pattern}'].tree
+    return args
+
+
+def record_test_history(config:ConfSettings,results):
+    '''
+    Record the duration and status of test executables that were run by the test script in the test history file.
+    The executables are only timed if the script's commands are (see /timings/commands), and the ones after a failure
+    don't run at all.
+    '''
+    if len(results) == 0:
+        return
+    bdir = config['directories/build'].absolute()
+    history = TestHistory(config.get('/files/test_history',bdir/'ccc-test-history.yml'),bdir).load()
+    for result in results:
+        history.record(result)
+    history.save()
+
+
+def run_tests_in_parallel(config:ConfSettings,test_exes,jobs:int):
+    '''
+    Run test executables in a pool of `jobs` processes (0 means one per CPU), print a summary, and return the TestResults.
+
+    Unlike the generated script, all tests are run even if one of them fails. Tests are started longest-first
+    (previously failed tests first) using the durations recorded in the test history file.
+    '''
+    bdir = config['directories/build'].absolute()
+    env = capture_environment(bdir)
+    history = TestHistory(config.get('/files/test_history',bdir/'ccc-test-history.yml'),bdir).load()
+    tests = [ (exe,get_test_args(config,exe)) for exe in history.schedule(test_exes) ]
+
+    def on_result(result):
+        history.record(result)
+        print_test_result(result,bdir)
 
+    results = run_test_binaries(tests,cwd=bdir,env=env,jobs=jobs,on_result=on_result)
+    history.save()
+    print_test_summary(results)
+    return results
 
-        script.write(pathlib.Path(script_filename),exit_on_error=True)
 
-        script.deactivate_run_environment(bdir,bdir)
-        
-        if run:
-            cmd = cmd_to_run_shell_script(script_filename)
-            result = subprocess.run(cmd)
-            return result.returncode
+def print_test_summary(results):
+    failed = [ r for r in results if not r.passed ]
+    print()
+    print(f"{len(results)-len(failed)} of {len(results)} test executables passed.")
+    if len(failed) > 0:
+        print("[red]These test executables failed:[/red]")
+        for r in failed:
+            print("  ",r.exe)
+
+
+def run_tests_pipelined(config:ConfSettings,build,poll_interval:float = 0.25):
+    '''
+    Run the test executables as the build (which is running at the same time) links them, and then the rest of them
+    when it finishes. `build` is a Future that is set to the run_build step's return code.
+
+    Test executables are selected like run_tests does (include/exclude patterns, --changed-since, and the test
+    cache). Once the build fails, no more tests are started.
+    '''
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    bdir = config['directories/build'].absolute()
+    targets,_ = get_test_executable_targets(config)
+    candidates = set(map(cmake_file_api.get_executable,targets)) if targets is not None else None
+    # with a File API reply, only the test executables need to be watched
+    watcher = LinkedExecutableWatcher(bdir,candidates)
+
+    include_patterns = config.get('/run_tests/include',ConfSettings(['*test*','*Test*'])).tree
+    exclude_patterns = config.get('/run_tests/exclude',ConfSettings([])).tree
+    changed_since = config.get('/run_tests/changed_since',None)
+    changed_files = get_changed_files(config['/directories/root'],changed_since) if changed_since is not None else None
+    # the dependencies are loaded once, from what the last build recorded. reading them (`ninja -t deps`, or all of the
+    # depfiles) for every batch would mean reading them while the build is writing them. executables that the last build
+    # did not know about are always run.
+    dependencies = BuildDependencies(bdir).load() if changed_files is not None else None
+    env = capture_environment(bdir)
+    history = TestHistory(config.get('/files/test_history',bdir/'ccc-test-history.yml'),bdir).load()
+    cache = None
+    if config.get('/run_tests/cache',True):
+        cache = TestResultCache(config.get('/files/test_cache',bdir/'ccc-test-cache.json'),bdir).load()
+        env_hash = hash_run_environment(bdir)
+    jobs = config.get('/run_tests/jobs',None)
+    jobs = int(jobs) if jobs is not None else 1
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+
+    considered = set()
+    running = {}
+    results = []
+
+    def start(exes):
+        # executables that are not known to be tests are left for after the build (the build may re-run CMake)
+        exes = [ exe for exe in exes if exe not in considered and (candidates is None or exe in candidates) ]
+        considered.update(exes)
+        exes = classify_paths(exes,include_patterns,exclude_patterns)['included']
+        if changed_files is not None and len(exes) > 0:
+            exes = select_affected(exes,bdir,changed_files,dependencies)[0]
+        for exe in exes:
+            args = get_test_args(config,exe)
+            key = cache.make_key(exe,args,env_hash) if cache is not None else None
+            if cache is not None and cache.passed(exe,key):
+                print("   cached:",exe)
+                continue
+            running[pool.submit(run_test_binary,exe,args,bdir,env)] = (exe,key)
+
+    def collect(futures):
+        for future in futures:
+            exe,key = running.pop(future)
+            result = future.result()
+            results.append(result)
+            history.record(result)
+            if cache is not None:
+                cache.record(exe,key,result.passed)
+            timing.record_command(shlex.join([str(exe)]+get_test_args(config,exe)),result.duration,result.returncode)
+            print_test_result(result,bdir)
+
+    print("Running test executables as they are linked.")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        try:
+            while not build.done():
+                start(watcher.poll())
+                collect([ f for f in list(running) if f.done() ])
+                wait([build],timeout=poll_interval)
+            build_ok = build.result() == 0
+            if build_ok:
+                start(watcher.poll())
+                # the executables that did not need to be relinked
+                candidates = None
+                start(history.schedule(get_test_candidates(config)[0]))
+            else:
+                print("[red]The build failed. Not starting any more test executables.[/red]")
+            while len(running):
+                done,_ = wait(list(running),return_when=FIRST_COMPLETED)
+                collect(done)
+        finally:
+            history.save()
+            if cache is not None:
+                cache.save()
+
+    print_test_summary(results)
+    return 0 if build_ok and all( r.passed for r in results ) else 1
 
 
 def debug_tests(config:ConfSettings,run=True):
@@ -206,76 +615,70 @@ def debug_tests(config:ConfSettings,run=True):
 
     cmd_generator = CmdGenerator(config.get('/system',None))
     script = Script( system=config.get('/system',get_system()), shell=config.get('/shell', get_shell()) )
-    script_filename = config.get('/run_build/script_filename','05-debug_tests')
+    script_filename = get_script_path(config,'debug_tests')
 
-    with working_directory(config['directories/scripts']):
-        script.cd(bdir.parent)
-        script.cd(relpath(bdir,bdir.parent))
-        script.activate_run_environment(bdir,bdir)
+    script.cd(bdir.parent)
+    script.cd(relpath(bdir,bdir.parent))
+    script.activate_run_environment(bdir,bdir)
 
-        include_patterns = config.get('/debug_tests/include',ConfSettings(['*test*','*Test*']))
-        exclude_patterns = config.get('/debug_tests/exclude',ConfSettings([]))
-        include_patterns_filter = filename_matches_pattern_filter(include_patterns.tree)
-        exclude_patterns_filter = filename_matches_pattern_filter(exclude_patterns.tree)
+    include_patterns = config.get('/debug_tests/include',ConfSettings(['*test*','*Test*']))
+    exclude_patterns = config.get('/debug_tests/exclude',ConfSettings([]))
 
-        exes = list(bdir.glob("**/*") | pfilter(is_debug_exe))
-        included_exes = list(exes | pfilter(include_patterns_filter))
-        excluded_exes = list(included_exes | pfilter(exclude_patterns_filter))
-        test_exes = list(included_exes | -pfilter(exclude_patterns_filter))
+    exes = get_artifact_index(config).executables(debug_only=True)
+    classified_exes = classify_paths(exes,include_patterns.tree,exclude_patterns.tree)
+    test_exes = classified_exes['included']
 
-        print("Found test executables:")
-        if len(test_exes) > 0:
-            for exe in test_exes:
-                print("  ",exe)
-        if len(exes) != len(included_exes):
-            print(f"These executables were found, but skipped because they did not match an include pattern ({include_patterns.tree}):")
-            for exe in exes:
-                if exe not in included_exes:
-                    print("  ",exe)
-        if len(excluded_exes) > 0:
-            print(f"These executables were found, but skipped because they matched an exclude pattern ({exclude_patterns.tree}):")
-            for exe in exes:
-                if exe in excluded_exes:
-                    print("  ",exe)
-
-
-        if len(test_exes) < 1:
-            print("[yellow]Did not find any test executables with debug symbols.[/yellow]")
-            return 0
-
-        choice = 0
-        if len(test_exes) > 1:
-            print("Found multiple test executables. Which one do you want to debug?")
-            for i,exe in enumerate(test_exes):
-                print(i,exe)
-            choice = typer.prompt("Select exe",choice)
-            print(choice)
-            while choice < 0 or choice >= len(test_exes):
-                choice = 0
-                choice = typer.prompt(f"Please choose number between 0 and {len(test_exes)-1}",choice)
-        
-        exe = test_exes[choice]
-
-        args = []
-        for pattern in config.get('/debug_tests/args',ConfSettings([])).tree:
-            if fnmatch.fnmatch(exe,pattern):
-                args = config[f'debug_tests/args/{pattern}'].tree
-
-        debugger = config.get('/debug_tests/debugger/cmd','gdb')
-        debugger_args = config.get('/debug_tests/debugger/args',['-tui'])
-        cmd = [ debugger ] + debugger_args + [str(exe)] +  args
-
-        script.add_command( shlex.join(cmd) )
-
-
-        script.write(pathlib.Path(script_filename),exit_on_error=True)
-
-        script.deactivate_run_environment(bdir,bdir)
-        
-        if run:
-            cmd = cmd_to_run_shell_script(script_filename)
-            result = subprocess.run(cmd)
-            return result.returncode
+    print("Found test executables:")
+    if len(test_exes) > 0:
+        for exe in test_exes:
+            print("  ",exe)
+    if len(classified_exes['unspecified']) > 0:
+        print(f"These executables were found, but skipped because they did not match an include pattern ({include_patterns.tree}):")
+        for exe in classified_exes['unspecified']:
+            print("  ",exe)
+    if len(classified_exes['excluded']) > 0:
+        print(f"These executables were found, but skipped because they matched an exclude pattern ({exclude_patterns.tree}):")
+        for exe in classified_exes['excluded']:
+            print("  ",exe)
+
+
+    if len(test_exes) < 1:
+        print("[yellow]Did not find any test executables with debug symbols.[/yellow]")
+        return 0
+
+    choice = 0
+    if len(test_exes) > 1:
+        import typer
+        print("Found multiple test executables. Which one do you want to debug?")
+        for i,exe in enumerate(test_exes):
+            print(i,exe)
+        choice = typer.prompt("Select exe",choice)
+        print(choice)
+        while choice < 0 or choice >= len(test_exes):
+            choice = 0
+            choice = typer.prompt(f"Please choose number between 0 and {len(test_exes)-1}",choice)
+    
+    exe = test_exes[choice]
+
+    args = []
+    for pattern in config.get('/debug_tests/args',ConfSettings([])).tree:
+        if fnmatch.fnmatch(exe,pattern):
+            args = config[f'debug_tests/args/{pattern}'].tree
+
+    debugger = config.get('/debug_tests/debugger/cmd','gdb')
+    debugger_args = config.get('/debug_tests/debugger/args',['-tui'])
+    cmd = [ debugger ] + debugger_args + [str(exe)] +  args
+
+    script.add_command( shlex.join(cmd) )
+
+
+    script.write(pathlib.Path(script_filename),exit_on_error=True)
+
+    script.deactivate_run_environment(bdir,bdir)
+    
+    if run:
+        result = run_script(config,script_filename)
+        return result.returncode
 
 
 def install(config:ConfSettings,run=True):
@@ -292,23 +695,21 @@ def install(config:ConfSettings,run=True):
         raise RuntimeError(f"The build directory '{bdir}' has not been created yet.")
 
     script = Script( system=config.get('/system',get_system()), shell=config.get('/shell', get_shell()) )
-    script_filename = config.get('/run_build/script_filename','05-install')
+    script_filename = get_script_path(config,'install')
 
-    with working_directory(config['directories/scripts']):
-        script.cd(bdir.parent)
-        script.cd(relpath(bdir,bdir.parent))
+    script.cd(bdir.parent)
+    script.cd(relpath(bdir,bdir.parent))
 
-        cmake_cmd = [ config.get('/cmake/cmd','cmake') ]
-        default_args = ["--install",'.']
-        cmake_cmd += [ arg for arg in config.get('/cmake/install/args',ConfSettings(default_args)).tree ]
-        cmake_cmd += [ arg for arg in config.get('/cmake/install/extra_args',ConfSettings([])).tree ]
+    cmake_cmd = [ config.get('/cmake/cmd','cmake') ]
+    default_args = ["--install",'.']
+    cmake_cmd += [ arg for arg in config.get('/cmake/install/args',ConfSettings(default_args)).tree ]
+    cmake_cmd += [ arg for arg in config.get('/cmake/install/extra_args',ConfSettings([])).tree ]
 
-        script.add_command( cmake_cmd )
+    script.add_command( cmake_cmd )
 
 
-        script.write(pathlib.Path(script_filename),exit_on_error=True)
-        
-        if run:
-            cmd = cmd_to_run_shell_script(script_filename)
-            result = subprocess.run(cmd)
-            return result.returncode
+    script.write(pathlib.Path(script_filename),exit_on_error=True)
+    
+    if run:
+        result = run_script(config,script_filename)
+        return result.returncode
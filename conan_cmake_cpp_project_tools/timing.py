@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import shlex
+import select
+import pathlib
+import datetime
+import threading
+from .utils import get_shell, cmd_to_run_shell_script
+from . import tracing
+
+# Timing for steps and the commands in the scripts they run.
+#
+# Scripts are run with bash's xtrace turned on, but the trace is written to a pipe (BASH_XTRACEFD) instead of
+# stderr, and PS4 is set so that each trace line only carries the script's name and line number. A thread reads the
+# pipe and stamps each line with a monotonic clock when it arrives, so the time of a command is the time from its
+# trace line to the next one (or to the end of the script). The script files themselves are not changed, and
+# scripts/commands run by the script (or sourced by it) are not traced.
+#
+# Scripts are written with `set -e`, so every command except the last one that ran succeeded, and the last one has
+# the script's exit status.
+#
+# Timings are kept in the progress file under /timings/<build type>/<step> as a list of runs (newest last). Only the
+# time and status of each run are kept there (the progress file is read and written by every command, and YAML is
+# slow). The times of the commands in the latest run of each step go in a separate JSON file (CommandTimings).
+
+trace_start = '\x1e'
+trace_separator = '\x1f'
+
+# the commands timed by run_script since the last call to take_recorded_commands. steps can run at the same time (in
+# different threads), so each thread has its own list.
+recorded = threading.local()
+
+
+def recorded_commands():
+    if not hasattr(recorded,'commands'):
+        recorded.commands = []
+    return recorded.commands
+
+
+def take_recorded_commands():
+    '''
+    Return (and forget) the commands that this thread has timed since the last call.
+    '''
+    commands = recorded_commands()
+    recorded.commands = []
+    return commands
+
+
+def record_command(command:str, seconds:float, status:int):
+    recorded_commands().append({'command':command,'seconds':round(seconds,3),'status':status})
+
+
+def parse_trace_line(line:str):
+    '''
+    Parse a trace line written with our PS4 and return (level,source,lineno), or None if it is not one of ours.
+
+    The level is the number of times the first character of PS4 is repeated (bash repeats it for each level of
+    sourcing, subshells, and command substitutions).
+    '''
+    level = len(line) - len(line.lstrip(trace_start))
+    if level == 0:
+        return None
+    fields = line[level:].split(trace_separator,2)
+    if len(fields) < 3 or not fields[0].isdigit():
+        return None
+    return level,fields[1],int(fields[0])
+
+
+def run_script(filename:pathlib.Path, trace:bool = True, **kwargs):
+    '''
+    Run a shell script like `subprocess.run(cmd_to_run_shell_script(filename))` does, and time each of its commands.
+    The commands are added to this thread's `recorded_commands()`. If `trace` is False, only the whole script is timed.
+    '''
+    shell = pathlib.Path(get_shell())
+    if shell.name != "bash" or not trace:
+        start = time.monotonic()
+        result = tracing.run_process(cmd_to_run_shell_script(filename),name=str(filename),cat='script',**kwargs)
+        record_command(shlex.join(result.args),time.monotonic()-start,result.returncode)
+        return result
+
+    try:
+        lines = pathlib.Path(filename).read_text().split('\n')
+    except OSError:
+        lines = []
+
+    trace_r,trace_w = os.pipe()
+    wake_r,wake_w = os.pipe()
+    trace = []
+    def read_trace():
+        # the trace pipe may be held open by something the script started in the background, so we stop when
+        # the script exits rather than waiting for the end of the pipe.
+        data = b''
+        while True:
+            ready,_,_ = select.select([trace_r,wake_r],[],[])
+            if trace_r in ready:
+                chunk = os.read(trace_r,64*1024)
+                if len(chunk) == 0:
+                    break
+                now = time.monotonic()
+                data += chunk
+                *complete,data = data.split(b'\n')
+                trace.extend( (now,line) for line in complete )
+            elif wake_r in ready:
+                break
+    reader = threading.Thread(target=read_trace,daemon=True)
+    reader.start()
+
+    # PS4 is expanded for every trace line, so the variables in it are quoted.
+    ps4 = f"$'{trace_start}''${{LINENO}}'$'{trace_separator}''${{BASH_SOURCE}}'$'{trace_separator}'"
+    wrapper = f'PS4={ps4}; BASH_XTRACEFD={trace_w}; set -x; source "$1"'
+    start = time.monotonic()
+    try:
+        result = tracing.run_process([str(shell),'-c',wrapper,'ccc',str(filename)],name=str(filename),cat='script',pass_fds=[trace_w],**kwargs)
+    finally:
+        end = time.monotonic()
+        os.close(trace_w)
+        # the reader drains whatever is still in the pipe before it looks at the wake pipe
+        os.write(wake_w,b'x')
+        reader.join()
+        os.close(trace_r)
+        os.close(wake_r)
+        os.close(wake_w)
+
+    # only commands at the top level of the script (not in subshells or command substitutions) are timed.
+    starts = []
+    top_level = None
+    for stamp,line in trace:
+        parsed = parse_trace_line(os.fsdecode(line))
+        if parsed is None or parsed[1] != str(filename):
+            continue
+        level,source,lineno = parsed
+        if top_level is None:
+            top_level = level
+        if level == top_level:
+            starts.append( (stamp,lineno) )
+    for i,(stamp,lineno) in enumerate(starts):
+        last = i+1 == len(starts)
+        seconds = (end if last else starts[i+1][0]) - stamp
+        command = lines[lineno-1] if 0 < lineno <= len(lines) else f"line {lineno}"
+        record_command(command,seconds,result.returncode if last else 0)
+        tracing.add_span(command,'command',stamp,stamp+seconds,{'line':lineno,'exit_code':result.returncode if last else 0})
+    if len(starts) == 0:
+        record_command(shlex.join(cmd_to_run_shell_script(filename)),end-start,result.returncode)
+
+    return result
+
+
+def record_step(progress, build_type:str, name:str, seconds:float, status:str, history_size:int = 50):
+    '''
+    Add a run of a step to the timings in the progress store, keeping the last `history_size` runs. Returns the run.
+    '''
+    timings = progress.tree.setdefault('timings',{})
+    runs = timings.setdefault(build_type,{}).setdefault(name,[])
+    run = {'started':(datetime.datetime.now()-datetime.timedelta(seconds=seconds)).isoformat(timespec='seconds'),
+           'seconds':round(seconds,3),
+           'status':status}
+    runs.append(run)
+    del runs[:-history_size]
+    # progress files written before the command timings moved out
+    for steps in timings.values():
+        for r in sum(steps.values(),[]):
+            r.pop('commands',None)
+    return run
+
+
+class CommandTimings:
+    '''
+    The times of the commands in the latest run of each step, stored in a JSON file (keyed by build type and step).
+    '''
+    version = 1
+    # steps can finish at the same time (in different threads)
+    lock = threading.Lock()
+
+    def __init__(self,filename:pathlib.Path):
+        self.filename = pathlib.Path(filename)
+        self.entries = {}
+
+    def load(self):
+        if self.filename.exists():
+            try:
+                data = json.loads(self.filename.read_text())
+                if data.get('version',None) == self.version:
+                    self.entries = data['entries']
+            except (ValueError,KeyError):
+                self.entries = {}
+        return self
+
+    def save(self):
+        self.filename.parent.mkdir(parents=True,exist_ok=True)
+        self.filename.write_text( json.dumps({'version':self.version,'entries':self.entries}) )
+
+    def get(self,build_type:str,name:str):
+        '''
+        Return the commands of the latest run of a step, and when it started.
+        '''
+        entry = self.entries.get(build_type,{}).get(name,{})
+        return entry.get('commands',[]),entry.get('started',None)
+
+    def set(self,build_type:str,name:str,started:str,commands):
+        self.entries.setdefault(build_type,{})[name] = {'started':started,'commands':list(commands)}
+
+    @classmethod
+    def record(cls,filename:pathlib.Path,build_type:str,name:str,started:str,commands):
+        '''
+        Replace the commands of a step in the file.
+        '''
+        with cls.lock:
+            timings = cls(filename).load()
+            timings.set(build_type,name,started,commands)
+            timings.save()
+
+
+def percentile(values, p:float):
+    '''
+    Return the p'th percentile (0-100) of a list of values, interpolating between the closest ranks.
+    '''
+    values = sorted(values)
+    if len(values) == 0:
+        return None
+    position = (len(values)-1)*p/100
+    lower = int(position)
+    upper = min(lower+1,len(values)-1)
+    return values[lower] + (values[upper]-values[lower])*(position-lower)
+
+
+def summarize(runs, threshold:float = 1.25, min_seconds:float = 1.0, min_runs:int = 3):
+    '''
+    Summarize the runs of a step.
+
+    The latest run is a regression if it took more than `threshold` times the median of the earlier successful runs
+    (and at least `min_seconds` longer), and there are at least `min_runs` earlier successful runs to compare against.
+    '''
+    latest = runs[-1]
+    history = [ r['seconds'] for r in runs[:-1] if r['status'] == 'complete' ]
+    everything = [ r['seconds'] for r in runs if r['status'] == 'complete' ]
+    median = percentile(history,50)
+    summary = {'latest':latest,
+               'runs':len(runs),
+               'p50':percentile(everything,50),
+               'p90':percentile(everything,90),
+               'baseline':median,
+               'regression':False}
+    if median is not None and len(history) >= min_runs and latest['status'] == 'complete':
+        summary['regression'] = latest['seconds'] > threshold*median and latest['seconds'] - median >= min_seconds
+    return summary
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+
+# Trace events for `ccc --trace out.json ...`.
+#
+# Spans are written in the Trace Event Format (the JSON that chrome://tracing, Perfetto, and speedscope load), as
+# "complete" events with a start and a duration. Everything ccc does is on the ccc process' track, one row per thread.
+# Subprocesses (step scripts, test binaries, ...) are spans on the thread that waited for them, with their pid, exit
+# code, and peak RSS in the span's args, so the gaps between them show where ccc itself was busy (or idle).
+#
+# When tracing is not enabled, `span` and `add_span` do nothing, so they can be left in code that runs all the time.
+
+enabled = False
+events = []
+origin = 0.0
+
+
+def start():
+    '''
+    Start collecting trace events. Times are relative to now.
+    '''
+    global enabled,origin
+    enabled = True
+    origin = time.monotonic()
+    events.clear()
+
+
+def stop():
+    global enabled
+    enabled = False
+
+
+def add_span(name:str, cat:str, start:float, end:float, args = None, tid:int = None):
+    '''
+    Add a span that has already finished. `start` and `end` are time.monotonic() times.
+    '''
+    if not enabled:
+        return
+    event = {'name':name,
+             'cat':cat,
+             'ph':'X',
+             'ts':round((start-origin)*1e6,1),
+             'dur':round(max(0.0,end-start)*1e6,1),
+             'pid':os.getpid(),
+             'tid':tid if tid is not None else threading.get_native_id()}
+    if args:
+        event['args'] = args
+    events.append(event)
+
+
+class span:
+    '''
+    A context manager that records a span for the code it wraps. Arguments can be added (i.e. an exit code)
+    through the `args` dict before the span ends.
+
+    with tracing.span('configure','step') as s:
+        s.args['status'] = ...
+    '''
+    def __init__(self,name:str,cat:str,**args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self,type,value,traceback):
+        if type is not None:
+            self.args.setdefault('error',type.__name__)
+        add_span(self.name,self.cat,self.start,time.monotonic(),self.args)
+
+
+def peak_rss_kb(rusage):
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+
+def run_process(cmd, name:str = None, cat:str = 'subprocess', capture_output:bool = False, **kwargs):
+    '''
+    Run a command like subprocess.run and record a span for it with its pid, exit code, and peak RSS.
+
+    The process is waited on with os.wait4, so its resource usage is known. (On Linux, the peak RSS is the largest of
+    the process and the descendants it waited for.) Output sent to pipes (stdout=subprocess.PIPE, capture_output=True)
+    is read and returned in the CompletedProcess like subprocess.run does.
+    '''
+    start = time.monotonic()
+    if not hasattr(os,'wait4'):
+        result = subprocess.run(cmd,capture_output=capture_output,**kwargs)
+        add_span(name or str(cmd[0]),cat,start,time.monotonic(),{'exit_code':result.returncode,'cmd':list(map(str,cmd))})
+        return result
+
+    if capture_output:
+        kwargs['stdout'] = subprocess.PIPE
+        kwargs['stderr'] = subprocess.PIPE
+    process = subprocess.Popen(cmd,**kwargs)
+    try:
+        # read both pipes at the same time so that the process can't block on a full one
+        output = {}
+        def read(stream,key):
+            output[key] = stream.read()
+            stream.close()
+        readers = []
+        if process.stderr is not None:
+            readers.append( threading.Thread(target=read,args=(process.stderr,'stderr'),daemon=True) )
+            readers[-1].start()
+        if process.stdout is not None:
+            read(process.stdout,'stdout')
+        for reader in readers:
+            reader.join()
+        _,status,rusage = os.wait4(process.pid,0)
+    except BaseException:
+        # like subprocess.run, give the process a moment to exit on its own (it probably got the SIGINT too)
+        try:
+            process.wait(timeout=0.25)
+        except BaseException:
+            pass
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        raise
+    process.returncode = os.waitstatus_to_exitcode(status)
+    add_span(name or str(cmd[0]),cat,start,time.monotonic(),{'pid':process.pid,
+                                                             'exit_code':process.returncode,
+                                                             'peak_rss_kb':peak_rss_kb(rusage),
+                                                             'cmd':list(map(str,cmd))})
+    return subprocess.CompletedProcess(cmd,process.returncode,output.get('stdout',None),output.get('stderr',None))
+
+
+def write(filename, metadata = None):
+    '''
+    Write the collected events to a trace file.
+    '''
+    process_name = {'name':'process_name','ph':'M','pid':os.getpid(),'tid':0,'args':{'name':'ccc'}}
+    data = {'traceEvents':[process_name]+sorted(events,key=lambda e: e['ts']),
+            'displayTimeUnit':'ms',
+            'otherData':metadata or {}}
+    with open(filename,'w') as f:
+        json.dump(data,f)
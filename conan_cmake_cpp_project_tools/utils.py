@@ -5,7 +5,6 @@ import platform
 import os
 import subprocess
 import fnmatch
-import yaml
 import typing
 import itertools
 from .path_filter_utils import *
@@ -61,6 +60,62 @@ def find_file_at_or_below(path : pathlib.Path, filename : str):
     files = path.glob("**/"+filename)
     return files
 
+# directories that contain one of these files are build directories, they are never searched for project files.
+build_directory_markers = ['CMakeCache.txt','ccc-progress.yml']
+
+def find_shallowest_file_at_or_below(path : pathlib.Path, filenames, prune_ignored = True):
+    '''
+    Look for a file with one of the given names in the current directory and its children, breadth first,
+    and return the shallowest match (or None).
+
+    If there are several matches at the same depth, the one whose name comes first in `filenames` is returned
+    (and then the first one in sorted order). The search stops at the first depth with a match, and does not
+    descend into `.git`, build directories, symlinked directories, or (if `prune_ignored` is set) directories
+    that git ignores.
+    '''
+    if type(filenames) == str:
+        filenames = [filenames]
+    path = pathlib.Path(path)
+    git = shutil.which('git') if prune_ignored else None
+
+    level = [path]
+    while len(level) > 0:
+        matches = []
+        subdirs = []
+        for dir in level:
+            try:
+                entries = list(os.scandir(dir))
+            except OSError:
+                continue
+            names = set( e.name for e in entries )
+            if dir != path and any( marker in names for marker in build_directory_markers ):
+                continue
+            for i,filename in enumerate(filenames):
+                if filename in names and (dir/filename).is_file():
+                    matches.append( (i,(dir/filename).parts) )
+            for e in entries:
+                if e.name != '.git' and e.is_dir(follow_symlinks=False):
+                    subdirs.append(dir/e.name)
+
+        if len(matches) > 0:
+            return pathlib.Path(*min(matches)[1])
+
+        if git is not None and len(subdirs) > 0:
+            # check the whole level with one git call
+            result = subprocess.run([git,'check-ignore','-z','--stdin'],cwd=path,capture_output=True,
+                                    input=b'\0'.join( os.fsencode(os.path.relpath(d,path)) for d in subdirs ))
+            if result.returncode == 0:
+                ignored = set( os.path.normpath(os.fsdecode(p)) for p in result.stdout.split(b'\0') if len(p) )
+                subdirs = [ d for d in subdirs if os.path.relpath(d,path) not in ignored ]
+            elif result.returncode != 1:
+                # not a git repository (1 means nothing was ignored)
+                git = None
+
+        level = sorted(subdirs)
+
+    return None
+
+
 def get_all_paths_below(root_path:pathlib.Path):
     return root_path.glob("**/*")
     
@@ -77,33 +132,82 @@ def find_project_root(path : pathlib.Path, sentinal_files = ['.git','CMakeLists.
 def make_build_dir_name(build_type:str, system:str):
     return f"build-{system.lower()}-{build_type.lower()}"
 
-def get_source_files(path : pathlib.Path, filt = lambda f: True):
+def read_nul_delimited(stream, chunk_size:int = 64*1024):
     '''
-    Return generator with project's source files.
+    Return generator with the (bytes) entries of a NUL-delimited stream, as soon as each one has been read.
+    '''
+    pending = b''
+    while True:
+        chunk = stream.read1(chunk_size) if hasattr(stream,'read1') else stream.read(chunk_size)
+        if len(chunk) == 0:
+            break
+        entries = (pending + chunk).split(b'\0')
+        pending = entries.pop()
+        for entry in entries:
+            if len(entry) > 0:
+                yield entry
+    if len(pending) > 0:
+        yield pending
+
+def stream_command_output(cmd, cwd:pathlib.Path):
+    '''
+    Run a command that writes NUL-delimited file names and return generator with the names (as str) while it runs.
+
+    If the generator is closed before the command is done, the command is killed.
+    '''
+    process = subprocess.Popen(cmd,cwd=cwd,stdout=subprocess.PIPE,stderr=subprocess.DEVNULL)
+    try:
+        for entry in read_nul_delimited(process.stdout):
+            yield os.fsdecode(entry)
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+
+def walk_files(path:pathlib.Path):
+    '''
+    Return generator with the names (relative to path) of all files below a directory.
+    '''
+    for dirpath,dirnames,filenames in os.walk(path):
+        dirnames.sort()
+        reldir = os.path.relpath(dirpath,path)
+        for filename in sorted(filenames):
+            yield filename if reldir == '.' else os.path.join(reldir,filename)
+
+def get_source_file_names(path : pathlib.Path, filt = None):
+    '''
+    Return generator with the names (str, relative to path) of the project's source files.
 
     This function will use `git ls-files` if path is in a git repository.
 
     If not, then it will check for the `fd` command call `fd .` from the path directory if it exists.
 
-    If not, then it will glob all files under the path directory.
+    If not, then it will walk all files under the path directory.
+
+    Names are produced as the listing command writes them (it is not waited on), and `filt` is
+    called with the name string so that no Path objects are created for files that are filtered out.
     '''
-    if is_git_repo(path):
-        git = shutil.which('git')
-        with working_directory(path):
-            result = subprocess.run([git,'ls-files'],capture_output=True)
-        files = result.stdout.strip().decode(encoding).split('\n')
+    git = shutil.which('git')
+    fd = shutil.which('fd')
+    if git is not None and is_git_repo(path):
+        names = stream_command_output([git,'ls-files','-z'],path)
+    elif fd is not None:
+        names = stream_command_output([fd,'.','-t','f','-0'],path)
     else:
-        fd = shutil.which('fd')
-        if fd is not None:
-            with working_directory(path):
-                result = subprocess.run([fd,'.','-t','f'],capture_output=True)
-                
-            files = result.stdout.decode(encoding).strip().split('\n')
-        else:
-            files = path.glob('**/*')
+        names = walk_files(path)
 
+    if filt is None:
+        return names
+    return ( name for name in names if filt(name) )
 
-    for file in files:
+def get_source_files(path : pathlib.Path, filt = lambda f: True):
+    '''
+    Return generator with project's source files.
+
+    See get_source_file_names. `filt` is called with a pathlib.Path here.
+    '''
+    for file in get_source_file_names(path):
         file = pathlib.Path(file)
         if filt(file):
             yield file
@@ -111,6 +215,9 @@ def get_source_files(path : pathlib.Path, filt = lambda f: True):
 def find_unit_test_binaries(dir_to_search:pathlib.Path, filters = is_exe, include_patterns = ['*test*','*Test*'], exclude_patterns = ['*/CMakeFiles/*']):
     '''
     Return a iterator of unit test binaries.
+
+    Only executables are considered. They are looked up in the build artifact index (which does not
+    descend into CMakeFiles directories), so the directory tree is not globbed.
     '''
     if type(filters) is not list:
         filters = [filters]
@@ -119,10 +226,10 @@ def find_unit_test_binaries(dir_to_search:pathlib.Path, filters = is_exe, includ
     if type(exclude_patterns) is not list:
         exclude_patterns = [exclude_patterns]
 
-    files = (dir_to_search.glob('**/*') | pfilter(all_filters(*filters))
-                                        | pfilter(filename_matches_pattern_filter(*include_patterns))
-                                        | -pfilter(filename_matches_pattern_filter(*exclude_patterns))
-            )
+    from .build_index import BuildArtifactIndex
+    index = BuildArtifactIndex(dir_to_search,dir_to_search/'ccc-artifacts.json').load().refresh()
+    # the name patterns are checked before any filters that have to look at the file.
+    files = index.executables() | pfilter(FilterPipeline(include_exclude_pattern_filter(include_patterns,exclude_patterns),*filters))
     for file in files:
         yield file
 
@@ -162,24 +269,23 @@ def sort_paths(paths:typing.List[pathlib.Path], filters = None, include_patterns
         exclude_patterns = [exclude_patterns]
 
 
-    sorted_paths = {"included":[],"excluded":[],"removed by filter":[],"unspecified":[]}
-
+    passed = []
+    removed = []
+    passes = FilterPipeline(*filters)
     for path in paths:
-        category = "unspecified"
-        if any([ not f(path) for f in filters ]):
-            category = "removed by filter"
+        if passes(path):
+            passed.append(path)
         else:
-            if any([ fnmatch.fnmatch(path.stem,pattern) for pattern in include_patterns ]):
-                category = "included"
-            if any([ fnmatch.fnmatch(path.stem,pattern) for pattern in exclude_patterns ]):
-                category = "excluded"
+            removed.append(path)
 
-        sorted_paths[category].append(path)
+    sorted_paths = classify_paths(passed,include_patterns,exclude_patterns,key=lambda p : p.stem)
+    sorted_paths["removed by filter"] = removed
 
     return sorted_paths
 
 
 def parse_option_to_config_entry(option_string:str):
+    import yaml
     data = yaml.safe_load(option_string)
     return data
 
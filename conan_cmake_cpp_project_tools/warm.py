@@ -0,0 +1,48 @@
+import os
+
+# State that is kept between commands when ccc is running as a server (`ccc serve`).
+#
+# Results that are expensive to compute (parsed config files, detected files, the source list, the build artifact
+# index, captured run environments, ...) are memoized here along with a "stamp" (i.e. the mtimes of the files they
+# were computed from) that is checked every time they are used. When ccc is run normally, `enabled` is False and
+# `memoize` just calls the function.
+
+enabled = False
+caches = {}
+
+
+def memoize(name:str, key, compute, stamp = None, valid = None):
+    '''
+    Return the cached value for `key` in the cache `name` if its stamp matches (and `valid(value)` is true),
+    otherwise call `compute()` and cache the result.
+
+    Cached values are shared between commands, callers must copy them before modifying them.
+    '''
+    if not enabled:
+        return compute()
+    cache = caches.setdefault(name,{})
+    if key in cache:
+        old_stamp,value = cache[key]
+        if old_stamp == stamp and (valid is None or valid(value)):
+            return value
+    value = compute()
+    cache[key] = (stamp,value)
+    return value
+
+
+def file_stamp(*paths):
+    '''
+    Return a tuple of (mtime,size) for each path (None for files that don't exist).
+    '''
+    stamps = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamps.append( (st.st_mtime_ns,st.st_size) )
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def clear():
+    caches.clear()
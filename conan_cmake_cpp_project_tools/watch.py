@@ -0,0 +1,151 @@
+import os
+import time
+import select
+import struct
+import pathlib
+import platform
+
+# File watchers used by `ccc watch`. On Linux, inotify is used (through ctypes, so there are no extra dependencies).
+# Everywhere else, or if inotify is not available, the files are polled.
+#
+# Both watchers have the same interface: `wait(timeout)` blocks until at least one of the watched files changes
+# (or the timeout expires) and returns the set of changed paths.
+
+
+class PollingWatcher:
+    '''
+    Watch files by periodically checking their modification times.
+    '''
+    def __init__(self,paths,interval:float = 0.5):
+        self.interval = interval
+        self.set_paths(paths)
+
+    def _stamp(self,path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns,st.st_size,st.st_ino)
+        except OSError:
+            return None
+
+    def set_paths(self,paths):
+        self.stamps = { pathlib.Path(p).absolute(): None for p in paths }
+        for path in self.stamps:
+            self.stamps[path] = self._stamp(path)
+
+    def wait(self,timeout:float = None):
+        start = time.monotonic()
+        while True:
+            changed = set()
+            for path,stamp in self.stamps.items():
+                new_stamp = self._stamp(path)
+                if new_stamp != stamp:
+                    self.stamps[path] = new_stamp
+                    changed.add(path)
+            if len(changed) > 0:
+                return changed
+            if timeout is not None and time.monotonic() - start >= timeout:
+                return changed
+            time.sleep(self.interval if timeout is None else min(self.interval,max(0,timeout - (time.monotonic() - start))))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    '''
+    Watch files with inotify.
+
+    The directories containing the files are watched (editors often save by writing a new file and
+    renaming it over the old one, which would remove a watch on the file itself). Changes to files
+    in those directories that are not being watched are reported too, so the caller can detect new files.
+    '''
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    event_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ATTRIB
+
+    def __init__(self,paths):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK|self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(),"inotify_init1 failed")
+        self.watches = {}
+        self.set_paths(paths)
+
+    def set_paths(self,paths):
+        self.paths = set( pathlib.Path(p).absolute() for p in paths )
+        for wd in list(self.watches.keys()):
+            self.libc.inotify_rm_watch(self.fd,wd)
+        self.watches = {}
+        for directory in set( p.parent for p in self.paths ):
+            wd = self.libc.inotify_add_watch(self.fd,os.fsencode(str(directory)),self.event_mask)
+            if wd >= 0:
+                self.watches[wd] = directory
+
+    def _read_events(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd,64*1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + 16 <= len(data):
+                wd,mask,cookie,length = struct.unpack_from('iIII',data,offset)
+                name = data[offset+16:offset+16+length].rstrip(b'\0')
+                offset += 16 + length
+                if mask & self.IN_Q_OVERFLOW:
+                    # events were lost, so we have to assume everything changed
+                    changed |= self.paths
+                elif wd in self.watches and len(name) > 0:
+                    changed.add( self.watches[wd]/os.fsdecode(name) )
+        return changed
+
+    def wait(self,timeout:float = None):
+        ready,_,_ = select.select([self.fd],[],[],timeout)
+        if len(ready) == 0:
+            return set()
+        return self._read_events()
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(paths,poll:bool = False,interval:float = 0.5):
+    '''
+    Return an inotify watcher if possible, and a polling watcher otherwise.
+    '''
+    if not poll and platform.system().lower() == "linux":
+        try:
+            return InotifyWatcher(paths)
+        except (OSError,AttributeError):
+            pass
+    return PollingWatcher(paths,interval)
+
+
+def wait_for_changes(watcher,debounce:float = 0.2,timeout:float = None):
+    '''
+    Wait for files to change, and then keep collecting changes until no more changes occur for `debounce` seconds.
+
+    This groups a burst of saves (i.e. "save all" in an editor, or a `git checkout`) into one set of changes.
+    '''
+    changed = watcher.wait(timeout)
+    if len(changed) == 0:
+        return changed
+    while True:
+        more = watcher.wait(debounce)
+        if len(more) == 0:
+            return changed
+        changed |= more
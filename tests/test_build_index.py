@@ -0,0 +1,47 @@
+from conan_cmake_cpp_project_tools import build_index
+import tempfile
+import pathlib
+import os
+import stat
+
+
+def make_exe(path:pathlib.Path, text:str = ''):
+    path.parent.mkdir(parents=True,exist_ok=True)
+    path.write_text("#! /bin/bash\n"+text)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def test_build_artifact_index():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bdir = pathlib.Path(tmpdir)/"build"
+        make_exe(bdir/"unit-tests")
+        make_exe(bdir/"testing/lib-tests")
+        make_exe(bdir/"CMakeFiles/3.25/CompilerIdC/a.out")
+        (bdir/"testing/CMakeFiles/lib-tests.dir").mkdir(parents=True)
+        (bdir/"testing/libA.a").write_text('')
+        (bdir/"testing/CMakeFiles/lib-tests.dir/main.cpp.o").write_text('')
+
+        index = build_index.get_build_artifact_index(bdir)
+        assert (bdir/"ccc-artifacts.json").exists()
+        assert index.executables() == [bdir/"testing/lib-tests", bdir/"unit-tests"]
+        assert index.get(bdir/"unit-tests")['target'] == "unit-tests"
+        assert index.get(bdir/"unit-tests")['debug'] is False
+        assert index.get(bdir/"testing/libA.a") is None
+        assert index.executables(debug_only=True) == []
+
+        # new executable in an existing directory
+        make_exe(bdir/"testing/other-tests")
+        # executable rewritten in place
+        (bdir/"unit-tests").write_text("#! /bin/bash\necho 'rebuilt'\n")
+
+        index = build_index.BuildArtifactIndex(bdir,bdir/"ccc-artifacts.json").load()
+        assert len(index.executables()) == 2
+        index.refresh()
+        assert index.executables() == [bdir/"testing/lib-tests", bdir/"testing/other-tests", bdir/"unit-tests"]
+        assert index.get(bdir/"unit-tests")['size'] == os.stat(bdir/"unit-tests").st_size
+
+        # removed executable
+        (bdir/"testing/lib-tests").unlink()
+        index.refresh()
+        assert index.executables() == [bdir/"testing/other-tests", bdir/"unit-tests"]
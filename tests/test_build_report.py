@@ -0,0 +1,104 @@
+from conan_cmake_cpp_project_tools import build_report
+import tempfile
+import pathlib
+
+
+build_ninja = '''
+rule CXX_COMPILER
+  command = c++ -c $in -o $out
+rule CXX_EXECUTABLE_LINKER
+  command = c++ $in -o $out
+rule CXX_STATIC_LIBRARY_LINKER
+  command = ar qc $out $in
+
+build a.o: CXX_COMPILER ../a.cpp
+build b.o: CXX_COMPILER ../b.cpp
+build c.o: CXX_COMPILER ../c.cpp
+build liba.a: CXX_STATIC_LIBRARY_LINKER a.o b.o
+build app: CXX_EXECUTABLE_LINKER c.o | liba.a
+build all: phony app
+'''
+
+# two builds (entries are written as edges finish). in the first one, a.o and b.o are compiled in parallel. the
+# second only rebuilds c.o and app.
+first_build = [ (0,1000,'a.o','h1'),
+                (1000,2000,'c.o','h3'),
+                (0,3000,'b.o','h2'),
+                (3000,3500,'liba.a','h4'),
+                (3500,4500,'app','h5'),
+              ]
+second_build = [ (0,1500,'c.o','h3'),
+                 (1500,2000,'app','h5'),
+               ]
+
+
+def write_log(path:pathlib.Path, entries, append = False):
+    with open(path,'a' if append else 'w') as f:
+        if not append:
+            f.write("# ninja log v5\n")
+        for start,end,output,cmd_hash in entries:
+            f.write(f"{start}\t{end}\t0\t{output}\t{cmd_hash}\n")
+
+
+def test_ninja_log():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bdir = pathlib.Path(tmpdir)
+        write_log(bdir/".ninja_log",first_build)
+        log = build_report.NinjaLog(bdir,bdir/"state.json").load().update()
+        log.save()
+        assert log.previous_build() is None
+        assert [ e['outputs'] for e in log.last_build() ] == [['a.o'],['c.o'],['b.o'],['liba.a'],['app']]
+
+        # only the new entries are read, and a partially written line is left for later
+        write_log(bdir/".ninja_log",second_build,append=True)
+        with open(bdir/".ninja_log",'a') as f:
+            f.write("2000\t2100\t0\tpartial")
+        log = build_report.NinjaLog(bdir,bdir/"state.json").load()
+        offset = log.offset
+        log.update()
+        assert log.offset > offset
+        assert len(log.previous_build()) == 5
+        assert [ e['outputs'] for e in log.last_build() ] == [['c.o'],['app']]
+        with open(bdir/".ninja_log",'a') as f:
+            f.write("\tout\n2000\t2100\t0\tout2\tout\n")
+        log.update()
+        # an edge with two outputs is one edge
+        assert log.last_build()[-1]['outputs'] == ['partial','out2']
+
+        # a recompacted (shorter) log is read again from the start
+        write_log(bdir/".ninja_log",first_build[:2])
+        log.update()
+        assert [ e['outputs'] for e in log.last_build() ] == [['a.o'],['c.o']]
+
+
+def test_build_analysis():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bdir = pathlib.Path(tmpdir)
+        (bdir/"build.ninja").write_text(build_ninja)
+        write_log(bdir/".ninja_log",first_build+second_build)
+        log = build_report.NinjaLog(bdir).update()
+
+        summary = build_report.analyze_build(log.previous_build(),build_report.load_build_statements(bdir),top=2)
+        assert summary['edges'] == 5
+        assert summary['wall_ms'] == 4500
+        assert summary['total_ms'] == 1000+3000+1000+500+1000
+        assert abs(summary['parallelism'] - 6500/4500) < 1e-6
+        assert summary['compile_ms'] == 5000
+        assert summary['link_ms'] == 1500
+        assert [ e['outputs'][0] for e in summary['slowest_compiles'] ] == ['b.o','a.o']
+        assert [ e['outputs'][0] for e in summary['slowest_links'] ] == ['app','liba.a']
+        # b.o -> liba.a -> app
+        assert summary['critical_path_ms'] == 4500
+        assert [ e['outputs'][0] for e in summary['critical_path'] ] == ['b.o','liba.a','app']
+
+        summary = build_report.analyze_build(log.last_build(),build_report.load_build_statements(bdir))
+        assert [ e['outputs'][0] for e in summary['critical_path'] ] == ['c.o','app']
+        assert summary['critical_path_ms'] == 2000
+
+        changes = build_report.compare_builds(log.previous_build(),log.last_build())
+        assert changes == [('c.o',1000,1500),('app',1000,500)]
+
+    assert build_report.classify_output('src/CMakeFiles/a.dir/a.cpp.o') == 'compile'
+    assert build_report.classify_output('libfoo.so.1.2') == 'link'
+    assert build_report.classify_output('bin/unit_tests') == 'link'
+    assert build_report.classify_output('CMakeFiles/x.util') == 'other'
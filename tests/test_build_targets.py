@@ -0,0 +1,51 @@
+from conan_cmake_cpp_project_tools import build_targets
+
+
+makefile_help = '''The following are some of the valid targets for this Makefile:
+... all (the default if no target is provided)
+... clean
+... depend
+... edit_cache
+... rebuild_cache
+... test
+... ContinuousBuild
+... ExperimentalTest
+... parser-tests
+... lexer-tests
+... common
+... main
+... src/parser.o
+... src/parser.i
+... src/parser.s
+'''
+
+ninja_help = '''build.ninja: RERUN_CMAKE
+cmake_object_order_depends_target_common: phony
+CMakeFiles/common.dir/src/common.cpp.o: CXX_COMPILER__common_Debug
+libcommon.a: CXX_STATIC_LIBRARY_LINKER__common_Debug
+common: phony
+CMakeFiles/parser-tests.dir/src/parser.cpp.o: CXX_COMPILER__parser-tests_Debug
+parser-tests: CXX_EXECUTABLE_LINKER__parser-tests_Debug
+libshared.so.1.2: CXX_SHARED_LIBRARY_LINKER__shared_Debug
+shared: phony
+main: CXX_EXECUTABLE_LINKER__main_Debug
+edit_cache: phony
+install/strip: phony
+all: phony
+help: HELP
+'''
+
+
+def test_parse_target_help():
+    assert build_targets.parse_target_help(makefile_help) == ['parser-tests','lexer-tests','common','main']
+    assert build_targets.parse_target_help(ninja_help) == ['common','parser-tests','shared','main']
+
+
+def test_select_targets():
+    targets = ['parser-tests','lexer-tests','common','main']
+    assert build_targets.select_targets(targets,['*test*','*Test*'],['*/CMakeFiles/*']) == ['parser-tests','lexer-tests']
+    assert build_targets.select_targets(targets,['*parser*'],[]) == ['parser-tests']
+    assert build_targets.select_targets(targets,['*test*'],['lexer*']) == ['parser-tests']
+    assert build_targets.select_targets(targets,['*bench*'],[]) == []
+    # can't tell which targets build executables in a directory
+    assert build_targets.select_targets(targets,['*/unit/*'],[]) is None
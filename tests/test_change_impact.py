@@ -0,0 +1,82 @@
+from conan_cmake_cpp_project_tools import change_impact
+import tempfile
+import pathlib
+
+
+def test_parsing_depfiles():
+    deps = change_impact.parse_depfile('''CMakeFiles/a.dir/src/a.cpp.o: /project/src/a.cpp \\
+ /project/src/my\\ header.h /usr/include/stdio.h \\
+ /project/src/other.h
+/project/src/other.h:
+''')
+    assert deps['CMakeFiles/a.dir/src/a.cpp.o'] == ['/project/src/a.cpp','/project/src/my header.h','/usr/include/stdio.h','/project/src/other.h']
+    assert deps['/project/src/other.h'] == []
+
+
+def test_parsing_ninja_deps():
+    deps = change_impact.parse_ninja_deps('''CMakeFiles/a.dir/src/a.cpp.o: #deps 2, deps mtime 1681234 (VALID)
+    /project/src/a.cpp
+    /project/src/a.h
+
+CMakeFiles/b.dir/src/b.cpp.o: #deps 1, deps mtime 1681234 (STALE)
+    /project/src/b.cpp
+
+''')
+    assert deps['CMakeFiles/a.dir/src/a.cpp.o'] == ['/project/src/a.cpp','/project/src/a.h']
+    assert deps['CMakeFiles/b.dir/src/b.cpp.o'] == ['/project/src/b.cpp']
+
+
+def test_reading_ninja_build_statements():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"rules.ninja").write_text("rule CXX_EXECUTABLE_LINKER__a-tests_Debug\n  command = c++ $in -o $out\n")
+        (tmpdir/"build.ninja").write_text('''include rules.ninja
+build CMakeFiles/a-tests.dir/src/a.cpp.o: CXX_COMPILER__a-tests_Debug /project/src/a.cpp || cmake_object_order_depends_target_a-tests
+build a-tests: CXX_EXECUTABLE_LINKER__a-tests_Debug CMakeFiles/a-tests.dir/src/a.cpp.o $
+  CMakeFiles/a-tests.dir/src/with$ space.cpp.o | libcommon.a || libcommon.a
+  FLAGS = -g
+''')
+        statements = change_impact.read_ninja_build_statements(tmpdir/"build.ninja")
+        assert len(statements) == 2
+        outputs,rule,explicit,implicit = statements[1]
+        assert outputs == ['a-tests']
+        assert rule == "CXX_EXECUTABLE_LINKER__a-tests_Debug"
+        assert explicit == ['CMakeFiles/a-tests.dir/src/a.cpp.o','CMakeFiles/a-tests.dir/src/with space.cpp.o']
+        assert implicit == ['libcommon.a']
+
+
+def test_selecting_affected_tests():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        src = tmpdir/"src"
+        bdir = tmpdir/"build"
+        for target,link in [ ('a-tests','/usr/bin/c++ -g CMakeFiles/a-tests.dir/src/a.cpp.o -o a-tests libcommon.a'),
+                             ('b-tests','/usr/bin/c++ -g CMakeFiles/b-tests.dir/src/b.cpp.o -o b-tests'),
+                             ('common','/usr/bin/ar qc libcommon.a CMakeFiles/common.dir/src/common.cpp.o') ]:
+            (bdir/f"CMakeFiles/{target}.dir/src").mkdir(parents=True)
+            (bdir/f"CMakeFiles/{target}.dir/link.txt").write_text(link+"\n")
+        (bdir/"CMakeFiles/a-tests.dir/src/a.cpp.o.d").write_text(f"CMakeFiles/a-tests.dir/src/a.cpp.o: {src}/a.cpp {src}/a.h\n")
+        (bdir/"CMakeFiles/b-tests.dir/src/b.cpp.o.d").write_text(f"CMakeFiles/b-tests.dir/src/b.cpp.o: {src}/b.cpp {src}/a.h\n")
+        (bdir/"CMakeFiles/common.dir/src/common.cpp.o.d").write_text(f"CMakeFiles/common.dir/src/common.cpp.o: {src}/common.cpp\n")
+
+        exes = [bdir/"a-tests",bdir/"b-tests",bdir/"c-tests"]
+
+        affected,unaffected = change_impact.select_affected(exes,bdir,[src/"common.cpp"])
+        # we don't know anything about c-tests, so it is always run
+        assert affected == [bdir/"a-tests",bdir/"c-tests"]
+        assert unaffected == [bdir/"b-tests"]
+
+        affected,unaffected = change_impact.select_affected(exes,bdir,[src/"a.h"])
+        assert affected == exes
+
+        affected,unaffected = change_impact.select_affected(exes,bdir,[src/"README.md"])
+        assert affected == [bdir/"c-tests"]
+
+        # batches of executables can be sorted with dependencies that were loaded once (i.e. while the build is running)
+        dependencies = change_impact.BuildDependencies(bdir).load()
+        (bdir/"CMakeFiles/common.dir/src/common.cpp.o.d").unlink()
+        assert change_impact.select_affected(exes[:1],bdir,[src/"common.cpp"],dependencies) == ([bdir/"a-tests"],[])
+        assert change_impact.select_affected(exes[1:],bdir,[src/"common.cpp"],dependencies) == ([bdir/"c-tests"],[bdir/"b-tests"])
+
+        affected,unaffected = change_impact.select_affected(exes,bdir,[tmpdir/"CMakeLists.txt"])
+        assert affected == exes
@@ -11,3 +11,15 @@ def test_app():
   assert result.exit_code == 0
   assert "Usage: ccc" in result.stdout
 
+
+def test_step_graph_force():
+  def forced(graph):
+    return [ name for name,node in graph.nodes.items() if node.run.keywords['force_run'] ]
+
+  assert forced(get_step_graph(['run_build'])) == ['run_build']
+  assert forced(get_step_graph(['run_tests'])) == ['run_build','run_tests']
+  # only the install itself is run every time, the build and tests are run if they haven't been
+  assert forced(get_step_graph(['install'])) == ['install']
+  assert forced(get_step_graph(['configure_build'])) == []
+  import conan_cmake_cpp_project_tools.steps as steps
+  assert forced(get_step_graph(['install'],force=True)) == list(steps.step_dependencies)
@@ -0,0 +1,64 @@
+from conan_cmake_cpp_project_tools import cmake_file_api
+import tempfile
+import pathlib
+import json
+
+
+ctest_file = '''# CMake generated Testfile for
+# Source directory: /src
+# Build directory: /build
+add_test(parser "/build/parser-tests" "--reporter" "compact")
+set_tests_properties(parser PROPERTIES  _BACKTRACE_TRIPLES "/src/CMakeLists.txt;10;add_test;/src/CMakeLists.txt;0;")
+add_test([=[lexer tests]=] "/build/bin/lexer-tests")
+subdirs("sub")
+'''
+
+
+def write_json(path:pathlib.Path, data):
+    path.parent.mkdir(parents=True,exist_ok=True)
+    path.write_text(json.dumps(data))
+
+
+def write_reply(bdir:pathlib.Path, targets):
+    reply_dir = bdir/'.cmake/api/v1/reply'
+    for target in targets:
+        write_json(reply_dir/f"target-{target['name']}.json",target)
+    write_json(reply_dir/'codemodel-v2-1234.json',
+               {'kind':'codemodel',
+                'paths':{'build':str(bdir),'source':'/src'},
+                'configurations':[{'name':'Release','directories':[],'targets':[]},
+                                  {'name':'Debug',
+                                   'directories':[{'source':'.','build':'.'},{'source':'sub','build':'sub'}],
+                                   'targets':[ {'name':target['name'],'jsonFile':f"target-{target['name']}.json"} for target in targets ]}]})
+    # an older reply, that CMake has not cleaned up yet
+    write_json(reply_dir/'index-2024-01-01T00-00-00-0000.json',{'reply':{}})
+    write_json(reply_dir/'index-2024-01-02T00-00-00-0000.json',
+               {'reply':{'client-ccc':{'codemodel-v2':{'kind':'codemodel','jsonFile':'codemodel-v2-1234.json'}}}})
+
+
+def test_parse_ctest_file():
+    assert cmake_file_api.parse_ctest_file(ctest_file) == ['/build/parser-tests','/build/bin/lexer-tests']
+
+
+def test_get_targets():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bdir = pathlib.Path(tmpdir)
+        assert cmake_file_api.get_targets(bdir) is None
+        query = cmake_file_api.write_query(bdir)
+        assert query == bdir/'.cmake/api/v1/query/client-ccc/codemodel-v2'
+        assert query.exists()
+        assert cmake_file_api.get_targets(bdir) is None
+
+        write_reply(bdir,[{'name':'parser-tests','type':'EXECUTABLE','artifacts':[{'path':'parser-tests'}]},
+                          {'name':'gen-tables','type':'EXECUTABLE','artifacts':[{'path':'tools/gen-tables'}]},
+                          {'name':'sub-tests','type':'EXECUTABLE','artifacts':[{'path':'bin/sub-tests.exe'},{'path':'bin/sub-tests.pdb'}]},
+                          {'name':'common','type':'STATIC_LIBRARY','artifacts':[{'path':'libcommon.a'}]},
+                         ])
+        (bdir/'CTestTestfile.cmake').write_text(f'add_test(parser "{bdir}/parser-tests")\n')
+        (bdir/'sub').mkdir()
+        (bdir/'sub/CTestTestfile.cmake').write_text(f'add_test(sub "{bdir}/bin/sub-tests.exe" "--all")\n')
+
+        targets = cmake_file_api.get_targets(bdir,'Debug')
+        assert [ t['name'] for t in targets ] == ['parser-tests','gen-tables','sub-tests','common']
+        assert [ t['ctest'] for t in targets ] == [True,False,True,False]
+        assert [ cmake_file_api.get_executable(t) for t in targets ] == [bdir/'parser-tests',bdir/'tools/gen-tables',bdir/'bin/sub-tests.exe',None]
@@ -0,0 +1,73 @@
+from conan_cmake_cpp_project_tools import compiler_cache, steps, config
+import tempfile
+import pathlib
+import json
+
+
+def test_compiler_cache_settings():
+    assert compiler_cache.get_tool_name('/usr/bin/ccache') == 'ccache'
+    assert compiler_cache.get_tool_name(pathlib.Path('C:/tools/sccache.exe')) == 'sccache'
+    assert compiler_cache.get_tool_name('distcc') is None
+
+    assert compiler_cache.launcher_args('ccache',['C','CXX']) == ['-DCMAKE_C_COMPILER_LAUNCHER=ccache','-DCMAKE_CXX_COMPILER_LAUNCHER=ccache']
+    # a launcher the user already set is left alone
+    assert compiler_cache.launcher_args('ccache',['C','CXX'],['..','-DCMAKE_CXX_COMPILER_LAUNCHER:STRING=distcc']) == ['-DCMAKE_C_COMPILER_LAUNCHER=ccache']
+
+    assert compiler_cache.cache_environment('ccache','/cache','5G') == {'CCACHE_DIR':'/cache','CCACHE_MAXSIZE':'5G'}
+    assert compiler_cache.cache_environment('/usr/bin/sccache',max_size='10G') == {'SCCACHE_CACHE_SIZE':'10G'}
+    assert compiler_cache.cache_environment('distcc','/cache') == {}
+
+    ccache_stats = "stats_updated_timestamp\t1700000000\ndirect_cache_hit\t10\npreprocessed_cache_hit\t2\ncache_miss\t5\n"
+    assert compiler_cache.parse_ccache_stats(ccache_stats) == {'hits':12,'misses':5}
+    sccache_stats = json.dumps({'stats':{'cache_hits':{'counts':{'C/C++':7,'Rust':1}},'cache_misses':{'counts':{'C/C++':3}}}})
+    assert compiler_cache.parse_sccache_stats(sccache_stats) == {'hits':8,'misses':3}
+
+    assert compiler_cache.stats_delta({'hits':12,'misses':5},{'hits':20,'misses':6}) == {'hits':8,'misses':1}
+    assert compiler_cache.stats_delta(None,{'hits':20,'misses':6}) is None
+
+
+def test_compiler_cache_build_steps(capsys):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"Project1/build-test").mkdir(parents=True)
+        (tmpdir/"Project1/CMakeLists.txt").write_text("")
+
+        # a fake ccache that reports a counter the (fake) build bumps, from the cache directory it was given
+        ccache = tmpdir/"ccache"
+        ccache.write_text('#! /bin/bash\nprintf "direct_cache_hit\\t%s\\ncache_miss\\t1\\n" $(cat "$CCACHE_DIR/hits" 2>/dev/null || echo 0)\n')
+        ccache.chmod(0o755)
+        cmake = tmpdir/"cmake"
+        cmake.write_text('#! /bin/bash\necho 3 > "$CCACHE_DIR/hits"\n')
+        cmake.chmod(0o755)
+
+        cfg = config.ConfSettings()
+        cfg.allow_missing_keys(True)
+        cfg["/directories/root"] = tmpdir/"Project1"
+        cfg["/directories/build"] = tmpdir/"Project1/build-test"
+        cfg["/directories/scripts"] = tmpdir/"Project1"
+        cfg["/files/CMakeLists.txt"] = tmpdir/"Project1/CMakeLists.txt"
+        cfg["/system"] = "linux"
+        cfg["/shell"] = "bash"
+        cfg["/cmake/cmd"] = str(cmake)
+        cfg["/compiler_cache/tool"] = str(ccache)
+        cfg["/compiler_cache/directory"] = "ccache-dir"
+        cfg["/compiler_cache/max_size"] = "1G"
+        (tmpdir/"Project1/ccache-dir").mkdir()
+
+        steps.configure_build(cfg,run=False)
+        script_lines = (tmpdir/"Project1/02-configure_build").read_text().split('\n')
+        assert script_lines[-1] == f"{cmake} .. -DCMAKE_BUILD_TYPE=Debug -DCMAKE_C_COMPILER_LAUNCHER={ccache} -DCMAKE_CXX_COMPILER_LAUNCHER={ccache}"
+
+        capsys.readouterr()
+        assert steps.run_build(cfg) == 0
+        script_lines = (tmpdir/"Project1/03-run_build").read_text().split('\n')
+        assert f"export CCACHE_DIR={tmpdir/'Project1/ccache-dir'}" in script_lines
+        assert "export CCACHE_MAXSIZE=1G" in script_lines
+        assert "Compiler cache (ccache): 3 hits, 0 misses (100.0% hit rate)" in capsys.readouterr().out
+
+        # turning it off removes the launcher and environment
+        cfg["/compiler_cache/enabled"] = False
+        steps.configure_build(cfg,run=False)
+        assert "LAUNCHER" not in (tmpdir/"Project1/02-configure_build").read_text()
+        steps.run_build(cfg,run=False)
+        assert "CCACHE" not in (tmpdir/"Project1/03-run_build").read_text()
@@ -0,0 +1,128 @@
+from conan_cmake_cpp_project_tools import steps, config, conan_cache
+import tempfile
+import pathlib
+import os
+import stat
+import shutil
+
+
+def test_conan_install_cache(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        monkeypatch.setenv("CONAN_HOME",str(tmpdir/"conan-home"))
+        (tmpdir/"conan-home/p/zlib1a2b3c/p").mkdir(parents=True)
+        (tmpdir/"Project1").mkdir()
+        (tmpdir/"Project1/conanfile.txt").write_text("[generators]\nCMakeToolchain\n")
+
+        # a fake conan that records how many times it was called and generates a few files
+        (tmpdir/"conan").write_text(f'''#! /bin/bash
+[ "$1" == "--version" ] && echo version >> {tmpdir}/conan-version-calls && echo "Conan version 2.0.0" && exit 0
+echo run >> {tmpdir}/conan-calls
+echo "set(CONAN_BUILD_DIR \\"$PWD\\")" > conan_toolchain.cmake
+echo "export PATH=/opt/bin:$PATH" > activate.sh
+mkdir -p generators
+echo "# find module" > generators/FindBoost.cmake
+echo "set(ZLIB_ROOT \\"{tmpdir}/conan-home/p/zlib1a2b3c/p\\")" > generators/ZLIB-data.cmake
+''')
+        os.chmod(tmpdir/"conan", os.stat(tmpdir/"conan").st_mode | stat.S_IEXEC)
+
+        cfg = config.ConfSettings()
+        cfg.allow_missing_keys(True)
+        cfg["/directories/root"] = tmpdir/"Project1"
+        cfg["/directories/scripts"] = tmpdir/"Project1"
+        cfg["/files/conanfile"] = tmpdir/"Project1/conanfile.txt"
+        cfg["/system"] = "linux"
+        cfg["/shell"] = "bash"
+        cfg["/build_type"] = "Debug"
+        cfg["/conan/cmd"] = str(tmpdir/"conan")
+        cfg["/conan/cache/directory"] = tmpdir/"cache"
+
+        cfg["/directories/build"] = tmpdir/"Project1/build-1"
+        # files that conan rewrites in a directory that already existed are stored too
+        (tmpdir/"Project1/build-1/generators").mkdir(parents=True)
+        (tmpdir/"Project1/build-1/generators/FindBoost.cmake").write_text("# old\n")
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 1
+
+        cfg["/directories/build"] = tmpdir/"Project1/build-2"
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 1
+        assert (tmpdir/"Project1/build-2/conan_toolchain.cmake").read_text() == f'set(CONAN_BUILD_DIR "{tmpdir}/Project1/build-2")\n'
+        assert (tmpdir/"Project1/build-2/generators/FindBoost.cmake").read_text() == "# find module\n"
+        assert os.stat(tmpdir/"Project1/build-2/generators/FindBoost.cmake").st_nlink == 2
+        assert (tmpdir/"Project1/build-2/activate.sh").exists()
+        assert (tmpdir/"Project1/build-2/generators/ZLIB-data.cmake").exists()
+        # the conan version is only asked for once
+        assert len((tmpdir/"conan-version-calls").read_text().split()) == 1
+
+        # different settings miss the cache
+        cfg["/build_type"] = "Release"
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 2
+        # files that were materialized are removed before conan runs, so the cache entry is not modified
+        assert (tmpdir/"Project1/build-1/generators/FindBoost.cmake").read_text() == "# find module\n"
+        assert os.stat(tmpdir/"Project1/build-2/generators/FindBoost.cmake").st_nlink == 1
+
+        # changing the conanfile misses the cache
+        cfg["/build_type"] = "Debug"
+        (tmpdir/"Project1/conanfile.txt").write_text("[generators]\nCMakeDeps\nCMakeToolchain\n")
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 3
+
+        # conan uses a conan.lock next to the conanfile, so changing it misses the cache
+        (tmpdir/"Project1/conan.lock").write_text('{"version": "0.5", "requires": ["zlib/1.2.13"]}\n')
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 4
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 4
+        (tmpdir/"Project1/conan.lock").write_text('{"version": "0.5", "requires": ["zlib/1.3"]}\n')
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 5
+
+        # and so does changing conan's global.conf
+        (tmpdir/"conan-home/global.conf").write_text("tools.cmake.cmaketoolchain:generator=Ninja\n")
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 6
+
+        # the packages the cached files point to were removed from conan's cache
+        shutil.rmtree(tmpdir/"conan-home/p/zlib1a2b3c")
+        cfg["/directories/build"] = tmpdir/"Project1/build-3"
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 7
+
+        cfg["/conan/cache/enabled"] = False
+        assert steps.install_deps(cfg) == 0
+        assert len((tmpdir/"conan-calls").read_text().split()) == 8
+
+
+def test_finding_package_folders():
+    storage = [ (pathlib.Path('/home/me/.conan2/p'),1), (pathlib.Path('/home/me/.conan/data'),6) ]
+    data = b'''set(A "/home/me/.conan2/p/zlib1234/p/include")
+set(B /home/me/.conan2/p/b/boost5678/p/lib;/home/me/.conan2/p/zlib1234/p)
+set(C "/home/me/.conan/data/fmt/9.0/_/_/package/abcd/lib")
+set(D "/home/me/.conan2/p")
+'''
+    assert conan_cache.find_package_folders(data,storage) == {'/home/me/.conan2/p/zlib1234','/home/me/.conan2/p/b/boost5678',
+                                                               '/home/me/.conan/data/fmt/9.0/_/_/package/abcd'}
+
+
+def test_finding_conan_profiles():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"myprofile").write_text("[settings]\n")
+
+        profiles = conan_cache.find_conan_profiles(['install','..','-pr:b=default','-pr','myprofile'],tmpdir)
+        assert profiles[0] == tmpdir/"myprofile"
+        assert profiles[1].name == "default"
+
+        profiles = conan_cache.find_conan_profiles(['install','..','--profile:all=myprofile'],tmpdir)
+        assert profiles == [tmpdir/"myprofile",tmpdir/"myprofile"]
+
+        # included profiles are found relative to the profile that includes them
+        (tmpdir/"profiles").mkdir()
+        (tmpdir/"profiles/gcc").write_text("include(common)\n[settings]\ncompiler=gcc\n")
+        (tmpdir/"profiles/common").write_text("include(../myprofile)\n")
+        profiles = conan_cache.find_conan_profiles(['install','..','--profile:all','profiles/gcc'],tmpdir)
+        assert profiles == [tmpdir/"profiles/gcc",tmpdir/"profiles/gcc",tmpdir/"profiles/common",tmpdir/"profiles/../myprofile"]
+
+        assert conan_cache.find_option_values(['install','..','--lockfile','a.lock','--lockfile-out=b.lock'],['--lockfile','--lockfile-out']) == ['a.lock','b.lock']
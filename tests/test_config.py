@@ -112,3 +112,23 @@ def test_config_settings_class():
 
 
 
+
+
+def test_deferred_settings():
+
+    calls = []
+    def detect():
+        calls.append(1)
+        return "detected"
+
+    cfg = config.ConfSettings()
+    cfg['/files/conanfile'] = config.ConfSettings.Deferred(detect)
+    cfg['/files/CMakeLists.txt'] = config.ConfSettings.Deferred(lambda: None)
+    assert len(calls) == 0
+
+    assert cfg['/files/conanfile'] == "detected"
+    assert cfg.get('/files/conanfile',None) == "detected"
+    assert len(calls) == 1
+
+    assert cfg.get('/files/CMakeLists.txt','missing') == "missing"
+    assert type(cfg['/files/CMakeLists.txt']) == config.ConfSettings.Null
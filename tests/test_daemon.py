@@ -0,0 +1,134 @@
+from conan_cmake_cpp_project_tools import client, daemon, warm
+import pytest
+import socket
+import subprocess
+import tempfile
+import pathlib
+import time
+import sys
+import os
+
+package_dir = pathlib.Path(__file__).parent.parent
+
+
+def test_memoize():
+    calls = []
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert warm.memoize('test',1,compute) == 1
+    assert warm.memoize('test',1,compute) == 2
+
+    warm.enabled = True
+    try:
+        assert warm.memoize('test',1,compute,stamp='a') == 3
+        assert warm.memoize('test',1,compute,stamp='a') == 3
+        assert warm.memoize('test',2,compute,stamp='a') == 4
+        assert warm.memoize('test',1,compute,stamp='b') == 5
+        assert warm.memoize('test',1,compute,stamp='b',valid=lambda v: v != 5) == 6
+    finally:
+        warm.enabled = False
+        warm.clear()
+
+
+def test_server_and_client():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        root = tmpdir/"project"
+        (root/"src").mkdir(parents=True)
+        (root/"CMakeLists.txt").write_text("")
+        (root/"src/main.cpp").write_text("")
+        env = dict(os.environ, PYTHONPATH=str(package_dir), XDG_RUNTIME_DIR=str(tmpdir/"run"))
+
+        ccc = [sys.executable,'-c',"import sys; from conan_cmake_cpp_project_tools.cli import app; app(prog_name='ccc')"]
+        ccc_client = [sys.executable,'-c',"from conan_cmake_cpp_project_tools.client import main; main()"]
+
+        # without a server, the client runs the command itself
+        result = subprocess.run(ccc_client+['list-sources'],cwd=root/"src",env=env,capture_output=True)
+        assert result.returncode == 0
+        assert "src/main.cpp" in result.stdout.decode()
+
+        server = subprocess.Popen(ccc+['serve','--idle-timeout','60'],cwd=root,env=env,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
+        try:
+            socket_path = pathlib.Path(env['XDG_RUNTIME_DIR'])
+            for i in range(100):
+                if len(list(socket_path.glob('*/*.sock'))) > 0:
+                    break
+                time.sleep(0.1)
+            assert client.find_server(root/"src") is None # different XDG_RUNTIME_DIR in this process
+
+            for i in range(2):
+                result = subprocess.run(ccc_client+['list-sources'],cwd=root/"src",env=env,capture_output=True)
+                assert result.returncode == 0
+                assert "src/main.cpp" in result.stdout.decode()
+
+            # output is written by the server to the client's stdout/stderr, and the exit code is passed back
+            result = subprocess.run(ccc_client+['no-such-command'],cwd=root,env=env,capture_output=True)
+            assert result.returncode == 2
+            assert "no-such-command" in result.stderr.decode()
+
+            result = subprocess.run(ccc_client+['info'],cwd=root,env=env,capture_output=True)
+            assert result.returncode == 0
+            assert str(root/"CMakeLists.txt") in result.stdout.decode()
+
+            # only one server per project
+            result = subprocess.run(ccc+['serve'],cwd=root,env=env,capture_output=True)
+            assert result.returncode == 1
+            assert "already running" in result.stdout.decode()
+            assert "Traceback" not in result.stderr.decode()
+
+            result = subprocess.run(ccc+['serve','--stop'],cwd=root,env=env,capture_output=True)
+            assert result.returncode == 0
+            assert server.wait(timeout=10) == 0
+            assert len(list(socket_path.glob('*/*.sock'))) == 0
+        finally:
+            if server.poll() is None:
+                server.kill()
+
+
+def test_socket_directory_permissions(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        monkeypatch.delenv('XDG_RUNTIME_DIR',raising=False)
+        monkeypatch.setenv('TMPDIR',str(tmpdir))
+        root = tmpdir/"project"
+        root.mkdir()
+        socket_dir = pathlib.Path(client.get_socket_directory())
+        assert socket_dir == tmpdir/f"ccc-{os.getuid()}"
+        assert client.find_server(root) is None
+
+        # someone else could have created the directory in a shared location
+        socket_dir.mkdir(mode=0o755)
+        os.chmod(socket_dir,0o755)
+        with pytest.raises(PermissionError):
+            client.find_server(root)
+        with pytest.raises(PermissionError):
+            daemon.Server(root,lambda argv: 0).listen()
+        with pytest.raises(PermissionError):
+            daemon.stop_server(root)
+        # the client just runs the command itself
+        assert client.run(['info'],cwd=root) is None
+
+        socket_dir.rmdir()
+        (tmpdir/"elsewhere").mkdir(mode=0o700)
+        socket_dir.symlink_to(tmpdir/"elsewhere")
+        with pytest.raises(PermissionError):
+            client.find_server(root)
+
+        socket_dir.unlink()
+        server = daemon.Server(root,lambda argv: 0)
+        server.listen()
+        try:
+            assert client.find_server(root) == server.socket_path
+        finally:
+            server.close()
+
+
+def test_peer_uid():
+    a,b = socket.socketpair(socket.AF_UNIX,socket.SOCK_STREAM)
+    with a, b:
+        if hasattr(socket,'SO_PEERCRED'):
+            assert client.get_peer_uid(a) == os.getuid()
+        client.check_peer(a)
+        client.check_peer(b)
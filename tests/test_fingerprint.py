@@ -0,0 +1,51 @@
+from conan_cmake_cpp_project_tools import fingerprint, config
+import tempfile
+import pathlib
+
+
+def test_step_fingerprints():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"conanfile.txt").write_text("[requires]\n")
+        (tmpdir/"CMakeLists.txt").write_text("project(test)\n")
+
+        cfg = config.ConfSettings()
+        cfg.allow_missing_keys(True)
+        cfg['/files/conanfile'] = tmpdir/"conanfile.txt"
+        cfg['/files/CMakeLists.txt'] = tmpdir/"CMakeLists.txt"
+        cfg['/conan/cmd'] = "ccc-missing-conan"
+        cfg['/cmake/cmd'] = "ccc-missing-cmake"
+
+        assert fingerprint.compute_step_fingerprint(cfg,"run_tests","./unit-tests") is None
+
+        f1 = fingerprint.compute_step_fingerprint(cfg,"install_deps","conan install ..")
+        assert f1 == fingerprint.compute_step_fingerprint(cfg,"install_deps","conan install ..")
+        assert f1 != fingerprint.compute_step_fingerprint(cfg,"install_deps","conan install .. -s build_type=Release")
+
+        (tmpdir/"conanfile.txt").write_text("[requires]\nboost/1.72.0\n")
+        f2 = fingerprint.compute_step_fingerprint(cfg,"install_deps","conan install ..")
+        assert f1 != f2
+
+        c1 = fingerprint.compute_step_fingerprint(cfg,"configure_build","cmake ..",fingerprints={'install_deps':f1})
+        c2 = fingerprint.compute_step_fingerprint(cfg,"configure_build","cmake ..",fingerprints={'install_deps':f2})
+        assert c1 != c2
+        # configure_build does not depend on the conanfile directly
+        (tmpdir/"conanfile.txt").write_text("[requires]\n")
+        assert c2 == fingerprint.compute_step_fingerprint(cfg,"configure_build","cmake ..",fingerprints={'install_deps':f2})
+
+        (tmpdir/"CMakeLists.txt").write_text("project(test2)\n")
+        assert c2 != fingerprint.compute_step_fingerprint(cfg,"configure_build","cmake ..",fingerprints={'install_deps':f2})
+
+
+def test_tool_version_cache():
+    cache = {}
+    version = fingerprint.get_tool_version("bash",cache)
+    assert version is not None
+    assert len(cache) == 1
+    tool = list(cache.keys())[0]
+    cache[tool]['version'] = "cached version"
+    assert fingerprint.get_tool_version("bash",cache) == "cached version"
+    cache[tool]['stamp'] = [0,0]
+    assert fingerprint.get_tool_version("bash",cache) == version
+
+    assert fingerprint.get_tool_version("ccc-missing-tool",cache) is None
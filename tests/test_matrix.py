@@ -0,0 +1,50 @@
+from conan_cmake_cpp_project_tools import matrix, config
+import tempfile
+import pathlib
+import sys
+
+
+def test_matrix_configurations():
+    variants = {'asan':{'build_type':'RelWithDebInfo','cmake':{'extra_args':['-DCMAKE_CXX_FLAGS=-fsanitize=address']}},
+                'tsan':{'cmake':{'extra_args':['-DCMAKE_CXX_FLAGS=-fsanitize=thread']}}}
+    configurations = matrix.get_configurations(['Debug','asan','tsan'],variants)
+    assert [ (c['name'],c['build_type']) for c in configurations ] == [('Debug','Debug'),('asan','RelWithDebInfo'),('tsan','Debug')]
+    assert configurations[0]['settings'] == {}
+    assert configurations[1]['settings'] == {'cmake':{'extra_args':['-DCMAKE_CXX_FLAGS=-fsanitize=address']}}
+    # the variants are not modified
+    assert variants['asan']['build_type'] == 'RelWithDebInfo'
+
+    assert matrix.split_jobs(8,3) == 2
+    assert matrix.split_jobs(2,3) == 1
+    assert matrix.split_jobs(None,3) is None
+
+    assert matrix.get_failed_step(0) is None
+    assert matrix.get_failed_step(matrix.step_exit_codes['configure_build']) == 'configure_build'
+    assert matrix.get_failed_step(-9) == 'error'
+
+    cfg = config.ConfSettings({'cmake':{'cmd':'cmake','extra_args':['-GNinja']},'build_type':'Debug'})
+    config.apply_settings(cfg,{'build_type':'Release','cmake':{'extra_args':['-DX=1']}})
+    assert cfg['/build_type'] == 'Release'
+    assert cfg['/cmake/cmd'] == 'cmake'
+    assert list(cfg['/cmake/extra_args'].tree) == ['-DX=1']
+
+
+def test_matrix_run_forked():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        state = {'value':'parent'}
+        def run(configuration):
+            # each build has its own copy of everything
+            state['value'] = configuration['name']
+            print(f"building {state['value']}")
+            if configuration['name'] == 'crash':
+                raise RuntimeError("crashed")
+            return configuration['code']
+
+        configurations = [{'name':'ok','code':0},{'name':'bad','code':matrix.step_exit_codes['run_build']},{'name':'crash','code':0}]
+        matrix.run_forked(configurations,run,lambda c: tmpdir/c['name']/'log')
+        assert state['value'] == 'parent'
+        assert [ c['exit_code'] for c in configurations ] == [0,matrix.step_exit_codes['run_build'],matrix.error_exit_code]
+        assert all( c['seconds'] >= 0 for c in configurations )
+        assert (tmpdir/"ok/log").read_text() == "building ok\n"
+        assert "RuntimeError: crashed" in matrix.tail(tmpdir/"crash/log")[-1]
@@ -0,0 +1,205 @@
+from conan_cmake_cpp_project_tools import parallel_tests
+import tempfile
+import pathlib
+import os
+import stat
+import shutil
+import subprocess
+import pytest
+
+
+def make_exe(path:pathlib.Path, text:str):
+    path.write_text("#! /bin/bash\n"+text)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def test_capture_environment():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+
+        env = parallel_tests.capture_environment(tmpdir)
+        assert env == dict(os.environ)
+
+        (tmpdir/"activate_run.sh").write_text('''
+echo "this should not be captured"
+export CCC_TEST_VAR="one two"
+export CCC_TEST_MULTILINE="one
+two"
+        ''')
+        env = parallel_tests.capture_environment(tmpdir)
+        assert env['CCC_TEST_VAR'] == "one two"
+        assert env['CCC_TEST_MULTILINE'] == "one\ntwo"
+
+
+def test_running_test_binaries_in_parallel():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        passing = make_exe(tmpdir/"passing-tests", 'echo "pass $1"')
+        failing = make_exe(tmpdir/"failing-tests", 'echo "fail"; exit 3')
+        env_tests = make_exe(tmpdir/"env-tests", 'echo "$CCC_TEST_VAR"')
+
+        finished = []
+        results = parallel_tests.run_test_binaries( [ (passing,['one']), (failing,[]), (env_tests,[]) ],
+                                                 cwd=tmpdir,
+                                                 env=dict(os.environ,CCC_TEST_VAR="from env"),
+                                                 jobs=3,
+                                                 on_result=lambda r: finished.append(r.exe) )
+
+        assert len(results) == 3
+        assert len(finished) == 3
+        assert results[0].exe == passing
+        assert results[0].passed
+        assert results[0].output == b"pass one\n"
+        assert not results[1].passed
+        assert results[1].returncode == 3
+        assert results[2].output == b"from env\n"
+
+
+        results = parallel_tests.run_test_binaries( [ (tmpdir/"missing-tests",[]) ], cwd=tmpdir, jobs=1, on_result=None )
+        assert not results[0].passed
+
+
+def test_test_history_scheduling():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        bdir = tmpdir/"build"
+        (bdir/"tests").mkdir(parents=True)
+        history_file = bdir/"ccc-test-history.yml"
+
+        history = parallel_tests.TestHistory(history_file,bdir).load()
+        assert history.entries == {}
+
+        short = bdir/"short-tests"
+        long = bdir/"tests/long-tests"
+        failed = bdir/"failed-tests"
+        new = bdir/"new-tests"
+
+        history.record( parallel_tests.TestResult(short,0,1.0,b'') )
+        history.record( parallel_tests.TestResult(long,0,10.0,b'') )
+        history.record( parallel_tests.TestResult(failed,1,0.1,b'') )
+        history.save()
+
+        history = parallel_tests.TestHistory(history_file,bdir).load()
+        assert history.entries['tests/long-tests']['duration'] == 10.0
+        assert history.entries['failed-tests']['status'] == "failed"
+
+        assert history.schedule([short,long,failed,new]) == [failed,new,long,short]
+
+
+def test_test_result_cache():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        bdir = tmpdir/"build"
+        bdir.mkdir()
+        cache_file = bdir/"ccc-test-cache.json"
+
+        assert parallel_tests.hash_run_environment(bdir) is None
+        (bdir/"activate_run.sh").write_text(". conanrunenv-release-x86_64.sh\n")
+        (bdir/"conanrunenv-release-x86_64.sh").write_text("export LD_LIBRARY_PATH=/one\n")
+        env_hash = parallel_tests.hash_run_environment(bdir)
+        assert env_hash is not None
+
+        exe = make_exe(bdir/"unit-tests", 'echo "pass"')
+        cache = parallel_tests.TestResultCache(cache_file,bdir).load()
+        key = cache.make_key(exe,[],env_hash)
+        assert not cache.passed(exe,key)
+        cache.record(exe,key,True)
+        assert cache.passed(exe,key)
+        cache.save()
+
+        cache = parallel_tests.TestResultCache(cache_file,bdir).load()
+        assert cache.passed(exe,cache.make_key(exe,[],env_hash))
+        # different arguments
+        assert not cache.passed(exe,cache.make_key(exe,['--verbose'],env_hash))
+
+        # different run environment
+        (bdir/"conanrunenv-release-x86_64.sh").write_text("export LD_LIBRARY_PATH=/two\n")
+        assert parallel_tests.hash_run_environment(bdir) != env_hash
+        assert not cache.passed(exe,cache.make_key(exe,[],parallel_tests.hash_run_environment(bdir)))
+
+        # relinked binary with different content
+        exe.unlink()
+        make_exe(exe, 'echo "pass again"')
+        key = cache.make_key(exe,[],env_hash)
+        assert not cache.passed(exe,key)
+
+        cache.record(exe,key,True)
+        assert cache.passed(exe,key)
+        cache.record(exe,key,False)
+        assert not cache.passed(exe,key)
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="needs gcc to build a shared library")
+def test_test_result_cache_shared_libraries():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        bdir = tmpdir/"build"
+        (bdir/"lib").mkdir(parents=True)
+        cache_file = bdir/"ccc-test-cache.json"
+
+        def build_library(value):
+            (tmpdir/"lib.c").write_text(f"int value() {{ return {value}; }}\n")
+            subprocess.run(['gcc','-shared','-fPIC','-o',bdir/"lib/libvalue.so",tmpdir/"lib.c"],check=True)
+        def build_exe():
+            (tmpdir/"main.c").write_text("int value(); int main() { return value() == 1 ? 0 : 1; }\n")
+            subprocess.run(['gcc','-o',bdir/"unit-tests",tmpdir/"main.c",'-L',bdir/"lib",'-lvalue',
+                            '-Wl,--enable-new-dtags,-rpath,$ORIGIN/lib'],check=True)
+
+        build_library(1)
+        build_exe()
+        exe = bdir/"unit-tests"
+        assert subprocess.run([exe]).returncode == 0
+
+        cache = parallel_tests.TestResultCache(cache_file,bdir).load()
+        assert cache.get_libraries(exe) == [bdir/"lib/libvalue.so"]
+        key = cache.make_key(exe,[],None)
+        cache.record(exe,key,True)
+        cache.save()
+
+        # relinked binary with the same content, and the same library
+        cache = parallel_tests.TestResultCache(cache_file,bdir).load()
+        build_exe()
+        assert cache.passed(exe,cache.make_key(exe,[],None))
+
+        # the library changed, but the binary did not need to be relinked
+        build_library(2)
+        assert subprocess.run([exe]).returncode != 0
+        assert not cache.passed(exe,cache.make_key(exe,[],None))
+
+
+def test_serial_test_results_are_cached():
+    from conan_cmake_cpp_project_tools import steps, config
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        bdir = tmpdir/"build"
+        bdir.mkdir()
+        ran = tmpdir/"ran"
+        make_exe(bdir/"a-tests", f'echo a >> {ran}')
+        make_exe(bdir/"b-tests", f'echo b >> {ran}; exit 1')
+        make_exe(bdir/"c-tests", f'echo c >> {ran}')
+
+        cfg = config.ConfSettings()
+        cfg.allow_missing_keys(True)
+        cfg["/directories/root"] = tmpdir
+        cfg["/directories/build"] = bdir
+        cfg["/directories/scripts"] = tmpdir
+        cfg["/system"] = "linux"
+        cfg["/shell"] = "bash"
+
+        def run_tests():
+            ran.write_text('')
+            returncode = steps.run_tests(cfg)
+            return returncode,ran.read_text().split()
+
+        # the script stops at the first failure
+        assert run_tests() == (1,['a','b'])
+        # the binary that passed before the failure is cached
+        assert run_tests() == (1,['b'])
+        history = parallel_tests.TestHistory(bdir/'ccc-test-history.yml',bdir).load()
+        assert history.entries['a-tests']['status'] == "passed"
+        assert history.entries['b-tests']['status'] == "failed"
+
+        make_exe(bdir/"b-tests", f'echo b >> {ran}')
+        assert run_tests() == (0,['b','c'])
+        assert run_tests() == (0,[])
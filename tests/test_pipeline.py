@@ -0,0 +1,99 @@
+from conan_cmake_cpp_project_tools import pipeline
+import tempfile
+import pathlib
+import os
+import stat
+
+
+def make_exe(path:pathlib.Path, text:str = ''):
+    path.parent.mkdir(parents=True,exist_ok=True)
+    path.write_text("#! /bin/bash\n"+text)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def append_log(path:pathlib.Path, outputs, newline = True):
+    with open(path,'a') as f:
+        for output in outputs:
+            f.write(f"0\t100\t0\t{output}\th1" + ("\n" if newline else ""))
+
+
+def test_watching_ninja_log():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bdir = pathlib.Path(tmpdir)/"build"
+        bdir.mkdir()
+        (bdir/"build.ninja").write_text('')
+        (bdir/".ninja_log").write_text("# ninja log v5\n")
+        # from a previous build
+        append_log(bdir/".ninja_log",['old-tests'])
+        make_exe(bdir/"old-tests")
+        make_exe(bdir/"unit-tests")
+
+        watcher = pipeline.LinkedExecutableWatcher(bdir)
+        assert watcher.ninja
+        assert watcher.poll() == []
+
+        # objects are not executables, and an executable that was not relinked is not reported
+        append_log(bdir/".ninja_log",['CMakeFiles/unit-tests.dir/main.cpp.o','old-tests'])
+        (bdir/"CMakeFiles/unit-tests.dir").mkdir(parents=True)
+        (bdir/"CMakeFiles/unit-tests.dir/main.cpp.o").write_text('')
+        assert watcher.poll() == []
+
+        # a line that ninja is still writing is read on the next poll
+        make_exe(bdir/"unit-tests","echo 'rebuilt'\n")
+        append_log(bdir/".ninja_log",['unit-tests'],newline=False)
+        assert watcher.poll() == []
+        with open(bdir/".ninja_log",'a') as f:
+            f.write("\n")
+        assert watcher.poll() == [bdir/"unit-tests"]
+
+        # only reported once
+        append_log(bdir/".ninja_log",['unit-tests'])
+        assert watcher.poll() == []
+
+        # ninja recompacts the log
+        make_exe(bdir/"testing/lib-tests")
+        (bdir/".ninja_log").unlink()
+        (bdir/".ninja_log").write_text("# ninja log v5\n")
+        append_log(bdir/".ninja_log",['old-tests','unit-tests','testing/lib-tests'])
+        assert watcher.poll() == [bdir/"testing/lib-tests"]
+
+
+def test_watching_build_tree():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bdir = pathlib.Path(tmpdir)/"build"
+        make_exe(bdir/"old-tests")
+        make_exe(bdir/"unit-tests")
+
+        watcher = pipeline.LinkedExecutableWatcher(bdir)
+        assert not watcher.ninja
+        assert watcher.poll() == []
+
+        # the linker may still be writing these, they are reported once they stop changing
+        make_exe(bdir/"unit-tests","echo 'rebuilt'\n")
+        make_exe(bdir/"testing/lib-tests")
+        assert watcher.poll() == []
+        assert watcher.poll() == [bdir/"testing/lib-tests",bdir/"unit-tests"]
+        assert watcher.poll() == []
+
+        make_exe(bdir/"other-tests")
+        assert watcher.poll() == []
+        make_exe(bdir/"other-tests","echo 'still linking'\n")
+        assert watcher.poll() == []
+        assert watcher.poll() == [bdir/"other-tests"]
+
+
+def test_watching_known_executables():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bdir = pathlib.Path(tmpdir)/"build"
+        make_exe(bdir/"unit-tests")
+
+        watcher = pipeline.LinkedExecutableWatcher(bdir,[bdir/"unit-tests",bdir/"bin/other-tests"])
+        assert watcher.index is None
+        assert watcher.poll() == []
+
+        # executables the watcher was not told about are not reported
+        make_exe(bdir/"helper")
+        make_exe(bdir/"bin/other-tests")
+        assert watcher.poll() == []
+        assert watcher.poll() == [bdir/"bin/other-tests"]
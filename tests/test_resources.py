@@ -0,0 +1,85 @@
+from conan_cmake_cpp_project_tools import resources, steps, config
+import tempfile
+import pathlib
+
+
+def test_default_jobs(monkeypatch):
+    assert resources.parse_size('512M') == 512*1024**2
+    assert resources.parse_size('1.5G') == int(1.5*1024**3)
+    assert resources.parse_size('2GiB') == 2*1024**3
+    assert resources.parse_size(1000) == 1000
+
+    # one job per CPU, unless they don't fit in memory
+    assert resources.get_default_jobs('1G',cpus=8,memory=16*1024**3) == 8
+    assert resources.get_default_jobs('4G',cpus=8,memory=16*1024**3) == 4
+    assert resources.get_default_jobs('4G',cpus=8,memory=1024**3) == 1
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        monkeypatch.setattr(resources,'cgroup_root',tmpdir)
+
+        # cgroup v2
+        (tmpdir/"cpu.max").write_text("max 100000\n")
+        (tmpdir/"memory.max").write_text("max\n")
+        assert resources.get_cgroup_cpu_limit() is None
+        assert resources.get_cgroup_memory_limit() is None
+        (tmpdir/"cpu.max").write_text("250000 100000\n")
+        (tmpdir/"memory.max").write_text(f"{8*1024**3}\n")
+        assert resources.get_cgroup_cpu_limit() == 3
+        assert resources.get_cgroup_memory_limit() == 8*1024**3
+        assert resources.get_total_memory() <= 8*1024**3
+        assert resources.get_available_cpus() <= 3
+
+        # cgroup v1
+        for name in ["cpu.max","memory.max"]:
+            (tmpdir/name).unlink()
+        (tmpdir/"cpu").mkdir()
+        (tmpdir/"cpu/cpu.cfs_quota_us").write_text("-1\n")
+        (tmpdir/"cpu/cpu.cfs_period_us").write_text("100000\n")
+        assert resources.get_cgroup_cpu_limit() is None
+        (tmpdir/"cpu/cpu.cfs_quota_us").write_text("50000\n")
+        assert resources.get_cgroup_cpu_limit() == 1
+        (tmpdir/"memory").mkdir()
+        (tmpdir/"memory/memory.limit_in_bytes").write_text(f"{2**63-4096}\n")
+        assert resources.get_cgroup_memory_limit() is None
+        (tmpdir/"memory/memory.limit_in_bytes").write_text(f"{4*1024**3}\n")
+        assert resources.get_cgroup_memory_limit() == 4*1024**3
+
+    # the default is limited by the total memory
+    monkeypatch.setattr(resources,'get_total_memory',lambda: 2*1024**3)
+    assert resources.get_default_jobs('1G',cpus=4) == 2
+
+
+def test_build_parallelism():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"Project1/build-test").mkdir(parents=True)
+        (tmpdir/"Project1/CMakeLists.txt").write_text("")
+
+        cfg = config.ConfSettings()
+        cfg.allow_missing_keys(True)
+        cfg["/directories/root"] = tmpdir/"Project1"
+        cfg["/directories/build"] = tmpdir/"Project1/build-test"
+        cfg["/directories/scripts"] = tmpdir/"Project1"
+        cfg["/files/CMakeLists.txt"] = tmpdir/"Project1/CMakeLists.txt"
+        cfg["/system"] = "linux"
+        cfg["/shell"] = "bash"
+        cfg["/run_build/jobs"] = 6
+        cfg["/run_build/link_jobs"] = 2
+
+        steps.run_build(cfg,run=False)
+        assert (tmpdir/"Project1/03-run_build").read_text().split('\n')[-1] == "cmake --build . --parallel 6"
+        # a -j the user gave wins
+        cfg["/cmake/build/extra_args"] = ["-j2"]
+        steps.run_build(cfg,run=False)
+        assert (tmpdir/"Project1/03-run_build").read_text().split('\n')[-1] == "cmake --build . -j2"
+
+        # the link pool is only used with ninja
+        steps.configure_build(cfg,run=False)
+        assert "JOB_POOL" not in (tmpdir/"Project1/02-configure_build").read_text()
+        cfg["/cmake/extra_args"] = ["-G","Ninja"]
+        steps.configure_build(cfg,run=False)
+        assert (tmpdir/"Project1/02-configure_build").read_text().split('\n')[-1] == "cmake .. -DCMAKE_BUILD_TYPE=Debug -G Ninja -DCMAKE_JOB_POOLS=link_jobs=2 -DCMAKE_JOB_POOL_LINK=link_jobs"
+
+    assert steps.uses_ninja(['..','-GNinja Multi-Config'])
+    assert not steps.uses_ninja(['..','-G','Unix Makefiles'])
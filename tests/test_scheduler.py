@@ -0,0 +1,62 @@
+from conan_cmake_cpp_project_tools import scheduler
+import threading
+import pytest
+
+
+def test_step_graph_order():
+    graph = scheduler.StepGraph()
+    graph.add('install_deps',lambda: 0)
+    graph.add('configure_build',lambda: 0,['install_deps'])
+    graph.add('run_build',lambda: 0,['configure_build'])
+    graph.add('capture_environment',lambda: 0,['install_deps'])
+    graph.add('run_tests',lambda: 0,['run_build','capture_environment'])
+
+    order = graph.get_order(['run_tests'])
+    assert sorted(order) == ['capture_environment','configure_build','install_deps','run_build','run_tests']
+    for name in order:
+        for dep in graph.nodes[name].deps:
+            assert order.index(dep) < order.index(name)
+    assert graph.get_order(['configure_build']) == ['install_deps','configure_build']
+
+    graph.add('install_deps',lambda: 0,['run_tests'])
+    with pytest.raises(RuntimeError):
+        graph.get_order(['run_tests'])
+    with pytest.raises(RuntimeError):
+        graph.get_order(['missing'])
+
+
+def test_step_graph_run():
+    ran = []
+    # the two middle nodes can only both get past the barrier if they run at the same time
+    barrier = threading.Barrier(2,timeout=5)
+    def node(name,returncode = 0,wait = False):
+        def run():
+            if wait:
+                barrier.wait()
+            ran.append(name)
+            return returncode
+        return run
+
+    graph = scheduler.StepGraph()
+    graph.add('a',node('a'))
+    graph.add('b',node('b',wait=True),['a'])
+    graph.add('c',node('c',wait=True),['a'])
+    graph.add('d',node('d'),['b','c'])
+    status = graph.run(['d'])
+    assert status == {'a':'complete','b':'complete','c':'complete','d':'complete'}
+    assert ran[0] == 'a' and ran[-1] == 'd'
+
+    # nothing is started after a failure
+    ran.clear()
+    graph.add('b',node('b',returncode=1),['a'])
+    graph.add('c',node('c'),['b'])
+    status = graph.run(['d'])
+    assert status == {'a':'complete','b':'failed','c':'not run','d':'not run'}
+    assert scheduler.get_failed(status) == 'b'
+    assert ran == ['a','b']
+
+    # completed nodes are not run again
+    ran.clear()
+    status = graph.run(['a','d'],completed=['a','b','c'])
+    assert ran == ['d']
+    assert scheduler.get_failed(status) is None
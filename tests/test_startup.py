@@ -0,0 +1,114 @@
+import subprocess
+import tempfile
+import pathlib
+import sys
+import json
+import os
+
+# `ccc` is run a lot by editor integrations, so we check that the commands that don't run any steps don't import
+# the modules that are only needed to run them, and don't search the project or touch the build directory.
+
+package_dir = pathlib.Path(__file__).parent.parent
+
+modules_not_needed_at_startup = [ 'yaml',
+                                  'rich.console',
+                                  'concurrent.futures',
+                                  'conan_cmake_cpp_project_tools.steps',
+                                  'conan_cmake_cpp_project_tools.fingerprint',
+                                  'conan_cmake_cpp_project_tools.parallel_tests',
+                                  'conan_cmake_cpp_project_tools.conan_cache',
+                                  'conan_cmake_cpp_project_tools.change_impact',
+                                  'conan_cmake_cpp_project_tools.watch',
+                                  'conan_cmake_cpp_project_tools.daemon',
+                                  'conan_cmake_cpp_project_tools.timing',
+                                  'conan_cmake_cpp_project_tools.scheduler',
+                                  'conan_cmake_cpp_project_tools.matrix',
+                                  'conan_cmake_cpp_project_tools.pipeline',
+                                  'conan_cmake_cpp_project_tools.build_targets',
+                                  'conan_cmake_cpp_project_tools.cmake_file_api',
+                                  'conan_cmake_cpp_project_tools.build_index',
+                                  'conan_cmake_cpp_project_tools.elf_utils',
+                                  'conan_cmake_cpp_project_tools.compiler_cache',
+                                  'conan_cmake_cpp_project_tools.resources',
+                                ]
+
+
+def run_ccc(args, cwd):
+    '''
+    Run ccc in a fresh interpreter and return the list of modules that were imported along with the command's output.
+    '''
+    code = f'''
+import sys, json
+sys.argv = ['ccc'] + {args!r}
+from conan_cmake_cpp_project_tools.cli import app
+try:
+    app()
+except SystemExit:
+    pass
+sys.stderr.write(json.dumps(sorted(sys.modules.keys())))
+'''
+    env = dict(os.environ, PYTHONPATH=str(package_dir))
+    result = subprocess.run([sys.executable,'-c',code],cwd=cwd,env=env,capture_output=True)
+    return json.loads(result.stderr.decode().splitlines()[-1]),result.stdout.decode()
+
+
+def make_project(root:pathlib.Path):
+    (root/"src").mkdir()
+    (root/"CMakeLists.txt").write_text("")
+    (root/"conanfile.txt").write_text("")
+    (root/"src/main.cpp").write_text("")
+
+
+def test_importing_cli_is_lazy():
+    env = dict(os.environ, PYTHONPATH=str(package_dir))
+    result = subprocess.run([sys.executable,'-c','import sys, json, conan_cmake_cpp_project_tools.cli; print(json.dumps(list(sys.modules)))'],env=env,capture_output=True)
+    modules = json.loads(result.stdout.decode())
+    for module in modules_not_needed_at_startup:
+        assert module not in modules
+
+
+def test_list_sources_startup():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        make_project(tmpdir)
+
+        modules,output = run_ccc(['list-sources'],tmpdir)
+        assert "src/main.cpp" in output
+        for module in modules_not_needed_at_startup:
+            assert module not in modules
+        # the build directory and progress file are only created by commands that run steps
+        assert len(list(tmpdir.glob("build-*"))) == 0
+
+        modules,output = run_ccc(['list-sources','--print0'],tmpdir)
+        assert sorted(output.split('\0')) == ['','CMakeLists.txt','conanfile.txt','src/main.cpp']
+
+
+def test_deferred_detection():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        make_project(tmpdir)
+
+        modules,output = run_ccc(['info'],tmpdir)
+        assert str(tmpdir/"conanfile.txt") in output
+        assert str(tmpdir/"CMakeLists.txt") in output
+
+
+def test_startup_imports():
+    '''
+    Check what `ccc --help` and `ccc list-sources` import, rather than timing them (timings are too noisy to assert on).
+    '''
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        make_project(tmpdir)
+
+        modules,output = run_ccc(['--help'],tmpdir)
+        assert "list-sources" in output
+        # typer renders the help with rich
+        for module in modules_not_needed_at_startup:
+            if module != 'rich.console':
+                assert module not in modules
+
+        modules,output = run_ccc(['list-sources'],tmpdir)
+        assert "src/main.cpp" in output
+        for module in modules_not_needed_at_startup:
+            assert module not in modules
@@ -0,0 +1,80 @@
+from conan_cmake_cpp_project_tools import timing, config
+import tempfile
+import pathlib
+
+
+def test_timing_script_commands():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"helper.sh").write_text("sleep 0.1\nx=$(echo nested)\n")
+        script = tmpdir/"my script"
+        script.write_text("set -e\nsleep 0.2\nsource ./helper.sh\nx=$(true)\nfalse\necho never\n")
+
+        timing.take_recorded_commands()
+        result = timing.run_script(script,cwd=tmpdir,capture_output=True)
+        assert result.returncode == 1
+        assert b'never' not in result.stdout
+        commands = timing.take_recorded_commands()
+        # the sourced file and the command substitutions are part of the commands that run them
+        assert [ c['command'] for c in commands ] == ["set -e","sleep 0.2","source ./helper.sh","x=$(true)","false"]
+        assert [ c['status'] for c in commands ] == [0,0,0,0,1]
+        assert commands[1]['seconds'] >= 0.2
+        assert commands[2]['seconds'] >= 0.1
+        assert timing.take_recorded_commands() == []
+
+        # without tracing, the whole script is one command
+        result = timing.run_script(script,trace=False,cwd=tmpdir,capture_output=True)
+        assert result.returncode == 1
+        commands = timing.take_recorded_commands()
+        assert len(commands) == 1
+        assert commands[0]['seconds'] >= 0.3
+
+
+def test_timing_history():
+    progress = config.fspathtree()
+    for i in range(5):
+        timing.record_step(progress,'Debug','run_build',10+i,'complete',history_size=4)
+    runs = progress['/timings/Debug/run_build'].tree
+    assert len(runs) == 4
+    assert [ r['seconds'] for r in runs ] == [11,12,13,14]
+    assert sorted(runs[-1].keys()) == ['seconds','started','status']
+
+    summary = timing.summarize(runs)
+    assert summary['runs'] == 4
+    assert summary['p50'] == 12.5
+    assert not summary['regression']
+
+    timing.record_step(progress,'Debug','run_build',30,'complete',history_size=4)
+    summary = timing.summarize(progress['/timings/Debug/run_build'].tree)
+    assert summary['baseline'] == 13
+    assert summary['regression']
+
+    # failed runs are not compared against the history
+    timing.record_step(progress,'Debug','run_build',1,'error',history_size=4)
+    summary = timing.summarize(progress['/timings/Debug/run_build'].tree)
+    assert not summary['regression']
+
+    assert timing.percentile([],50) is None
+    assert timing.percentile([3,1,2],50) == 2
+    assert timing.percentile([1,2,3,4,5],90) == 4.6
+
+
+def test_command_timings():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = pathlib.Path(tmpdir)/"ccc-command-timings.json"
+        commands = [{'command':'cmake --build .','seconds':10.0,'status':0}]
+        timing.CommandTimings.record(filename,'Debug','run_build','2024-01-01T00:00:00',commands)
+        timing.CommandTimings.record(filename,'Debug','run_tests','2024-01-01T00:00:10',[])
+        timings = timing.CommandTimings(filename).load()
+        assert timings.get('Debug','run_build') == (commands,'2024-01-01T00:00:00')
+        assert timings.get('Release','run_build') == ([],None)
+
+        # only the latest run is kept
+        timing.CommandTimings.record(filename,'Debug','run_build','2024-01-02T00:00:00',[])
+        assert timing.CommandTimings(filename).load().get('Debug','run_build') == ([],'2024-01-02T00:00:00')
+
+    # commands stored by older versions are dropped from the progress history
+    progress = config.fspathtree()
+    progress['/timings/Debug/run_build'] = [{'started':'2024-01-01T00:00:00','seconds':1,'status':'complete','commands':[]}]
+    timing.record_step(progress,'Debug','run_build',2,'complete')
+    assert all( 'commands' not in r for r in progress['/timings/Debug/run_build'].tree )
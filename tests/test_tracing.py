@@ -0,0 +1,71 @@
+from conan_cmake_cpp_project_tools import tracing
+import subprocess
+import tempfile
+import pathlib
+import json
+import sys
+import os
+
+package_dir = pathlib.Path(__file__).parent.parent
+
+
+def test_trace_events():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+
+        # nothing is recorded unless tracing was started
+        tracing.stop()
+        with tracing.span('ignored','test'):
+            pass
+        tracing.run_process([sys.executable,'-c','pass'])
+
+        tracing.start()
+        try:
+            with tracing.span('outer','test',step='x') as s:
+                s.args['status'] = 'done'
+                result = tracing.run_process([sys.executable,'-c','import sys; print("out"); print("err",file=sys.stderr); sys.exit(3)'],
+                                             name='child',capture_output=True)
+            assert result.returncode == 3
+            assert result.stdout.strip() == b'out'
+            assert result.stderr.strip() == b'err'
+            try:
+                with tracing.span('failing','test'):
+                    raise ValueError()
+            except ValueError:
+                pass
+        finally:
+            tracing.stop()
+        tracing.write(tmpdir/"trace.json",{'argv':['test']})
+
+        data = json.loads((tmpdir/"trace.json").read_text())
+        events = { e['name']: e for e in data['traceEvents'] }
+        assert 'ignored' not in events
+        assert events['outer']['args'] == {'step':'x','status':'done'}
+        assert events['outer']['ph'] == 'X'
+        child = events['child']
+        assert child['args']['exit_code'] == 3
+        assert child['args']['pid'] != os.getpid()
+        assert child['args']['peak_rss_kb'] > 0
+        # the child's span is inside the outer span
+        assert events['outer']['ts'] <= child['ts']
+        assert child['ts'] + child['dur'] <= events['outer']['ts'] + events['outer']['dur']
+        assert events['failing']['args']['error'] == 'ValueError'
+        assert data['otherData']['argv'] == ['test']
+
+
+def test_trace_option():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"CMakeLists.txt").write_text("")
+        (tmpdir/"conanfile.txt").write_text("")
+        env = dict(os.environ, PYTHONPATH=str(package_dir))
+        code = "import sys; sys.argv=['ccc','--trace','trace.json','info']; from conan_cmake_cpp_project_tools.cli import app; app()"
+        result = subprocess.run([sys.executable,'-c',code],cwd=tmpdir,env=env,capture_output=True)
+        assert result.returncode == 0
+
+        data = json.loads((tmpdir/"trace.json").read_text())
+        names = [ e['name'] for e in data['traceEvents'] ]
+        assert 'ccc info' in names
+        assert 'load config files' in names
+        assert 'find conanfile' in names
+        assert 'find CMakeLists.txt' in names
@@ -5,6 +5,7 @@ import pathlib
 import os
 import stat
 import tempfile
+import subprocess
 
 def test_running_scripts():
     cmd = utils.cmd_to_run_shell_script("run.sh",return_as_string=True)
@@ -101,6 +102,45 @@ def test_find_files():
 
 
 
+def test_find_shallowest_file():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        for d in ["src/lib", "build-linux-debug", "vendored/zlib", ".git", "z"]:
+            (tmpdir/d).mkdir(parents=True)
+
+        assert utils.find_shallowest_file_at_or_below(tmpdir,"CMakeLists.txt") is None
+
+        (tmpdir/"src/lib/CMakeLists.txt").write_text('')
+        (tmpdir/"z/CMakeLists.txt").write_text('')
+        assert utils.find_shallowest_file_at_or_below(tmpdir,"CMakeLists.txt") == tmpdir/"z/CMakeLists.txt"
+
+        (tmpdir/"vendored/CMakeLists.txt").write_text('')
+        assert utils.find_shallowest_file_at_or_below(tmpdir,"CMakeLists.txt") == tmpdir/"vendored/CMakeLists.txt"
+
+        # build directories and .git are never searched
+        (tmpdir/"build-linux-debug/CMakeCache.txt").write_text('')
+        (tmpdir/"build-linux-debug/conanfile.txt").write_text('')
+        (tmpdir/".git/conanfile.txt").write_text('')
+        assert utils.find_shallowest_file_at_or_below(tmpdir,["conanfile.py","conanfile.txt"]) is None
+
+        # earlier names win at the same depth, but a shallower file wins over an earlier name
+        (tmpdir/"src/lib/conanfile.py").write_text('')
+        (tmpdir/"z/conanfile.txt").write_text('')
+        assert utils.find_shallowest_file_at_or_below(tmpdir,["conanfile.py","conanfile.txt"]) == tmpdir/"z/conanfile.txt"
+        (tmpdir/"vendored/conanfile.py").write_text('')
+        assert utils.find_shallowest_file_at_or_below(tmpdir,["conanfile.py","conanfile.txt"]) == tmpdir/"vendored/conanfile.py"
+
+        (tmpdir/"CMakeLists.txt").write_text('')
+        assert utils.find_shallowest_file_at_or_below(tmpdir,"CMakeLists.txt") == tmpdir/"CMakeLists.txt"
+
+        if shutil.which("git"):
+            shutil.rmtree(tmpdir/".git")
+            subprocess.run(["git","init","-q",str(tmpdir)],check=True)
+            (tmpdir/".gitignore").write_text("vendored/\n")
+            assert utils.find_shallowest_file_at_or_below(tmpdir,["conanfile.py","conanfile.txt"]) == tmpdir/"z/conanfile.txt"
+            assert utils.find_shallowest_file_at_or_below(tmpdir,["conanfile.py","conanfile.txt"],prune_ignored=False) == tmpdir/"vendored/conanfile.py"
+
+
 def test_working_directory_context_manager():
 
     cwd = os.getcwd()
@@ -145,6 +185,32 @@ def test_list_source_files():
 
 
 
+def test_streaming_source_file_names():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = pathlib.Path(tmpdir)
+        (root/"src").mkdir()
+        (root/"src/main.cpp").write_text('')
+        (root/"src/odd\nname.cpp").write_text('')
+        (root/"src/[brackets].h").write_text('')
+
+        # not a git repository (and fd may not be installed either), so the files are walked. directories are not included.
+        assert sorted(utils.get_source_file_names(root)) == sorted(['src/main.cpp','src/odd\nname.cpp','src/[brackets].h'])
+
+        subprocess.run(['git','init','-q'],cwd=root)
+        subprocess.run(['git','add','.'],cwd=root)
+        names = list(utils.get_source_file_names(root,utils.PatternSet('*.cpp')))
+        assert sorted(names) == ['src/main.cpp','src/odd\nname.cpp']
+
+        # stopping early does not leave git running
+        names = utils.get_source_file_names(root)
+        assert next(names) in ['src/main.cpp','src/odd\nname.cpp','src/[brackets].h']
+        names.close()
+
+    import io
+    stream = io.BytesIO(b'a\0b c\0\0d')
+    assert list(utils.read_nul_delimited(stream,chunk_size=3)) == [b'a',b'b c',b'd']
+
+
 def test_cmd_option_cfg_entry_parsing():
 
     data = utils.parse_option_to_config_entry("/directories/build : /home/user/build")
@@ -249,6 +315,96 @@ def test_pipes():
 
 
 
+def test_pattern_set():
+    import fnmatch
+    patterns = ['*.cpp','*.h','build*','*/CMakeFiles/*','CMakeLists.txt','*test_[0-9]*','src/?ain.cc']
+    names = ['main.cpp','main.cpp.o','include/lib.h','build-debug/x','src/build.cpp','a/CMakeFiles/b.dir/x.o','CMakeFiles',
+             'CMakeLists.txt','a/CMakeLists.txt','unit_test_1','unit_test_a','src/main.cc','src/main.ccc','']
+    pattern_set = utils.PatternSet(patterns)
+    for name in names:
+        assert pattern_set(name) == any( fnmatch.fnmatch(name,p) for p in patterns ), name
+        assert pattern_set(pathlib.Path(name)) == any( fnmatch.fnmatch(pathlib.Path(name),p) for p in patterns ), name
+
+    assert utils.PatternSet('*')('anything/at/all')
+    assert not utils.PatternSet([])('anything')
+    assert not utils.PatternSet()
+    assert utils.PatternSet('*.txt',['*.bin']).select(['a.txt','b.bin','c.cpp']) == ['a.txt','b.bin']
+    assert utils.PatternSet('*test*').select([pathlib.Path('x/test.cpp'),pathlib.Path('test/x.cpp')],key=lambda p : p.name) == [pathlib.Path('x/test.cpp')]
+
+    classified = utils.classify_paths(['a_test','b_test','main','c'],['*test*','main'],['b*'])
+    assert classified == {'included':['a_test','main'],'excluded':['b_test'],'unspecified':['c']}
+
+    keep = utils.include_exclude_pattern_filter(['*.cpp'],['*/CMakeFiles/*'])
+    assert keep('src/main.cpp')
+    assert not keep('build/CMakeFiles/x.cpp')
+    assert not keep('src/main.h')
+
+    sorted_paths = utils.sort_paths([pathlib.Path('bin/a_test'),pathlib.Path('bin/b_test.exe'),pathlib.Path('bin/main'),pathlib.Path('lib/x_test')],
+                                    filters=[lambda p : p.parts[0] == 'bin'], include_patterns=['*test'], exclude_patterns=['b*'])
+    assert sorted_paths['included'] == [pathlib.Path('bin/a_test')]
+    assert sorted_paths['excluded'] == [pathlib.Path('bin/b_test.exe')]
+    assert sorted_paths['unspecified'] == [pathlib.Path('bin/main')]
+    assert sorted_paths['removed by filter'] == [pathlib.Path('lib/x_test')]
+
+
+def test_filter_pipeline():
+    calls = []
+    def record(name,result):
+        def f(path):
+            calls.append(name)
+            return result
+        return f
+
+    expensive = utils.PathFilter(record('expensive',True),utils.SUBPROCESS_COST)
+    cheap = utils.PathFilter(record('cheap',False),utils.NAME_COST)
+    unknown = record('unknown',True)
+
+    # cheap filters run first, and evaluation stops at the first failure
+    assert not utils.all_filters(expensive,unknown,cheap)('x')
+    assert calls == ['cheap']
+
+    calls.clear()
+    assert utils.FilterPipeline(expensive,unknown)('x')
+    assert calls == ['unknown','expensive']
+
+    calls.clear()
+    assert utils.any_filters(expensive,unknown,cheap)('x')
+    assert calls == ['cheap','unknown']
+
+    assert utils.all_filters()('x')
+    assert not utils.any_filters()('x')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        exe = pathlib.Path(tmpdir)/"unit_test"
+        exe.write_text("")
+        os.chmod(exe, os.stat(exe).st_mode | stat.S_IEXEC)
+        (pathlib.Path(tmpdir)/"data.txt").write_text("")
+
+        stats = []
+        original_stat = os.stat
+        def counting_stat(path,*args,**kwargs):
+            stats.append(path)
+            return original_stat(path,*args,**kwargs)
+        os.stat = counting_stat
+        try:
+            pipeline = utils.FilterPipeline(utils.is_file,utils.is_exe,utils.filename_matches_pattern_filter('*test*'))
+            assert pipeline(exe)
+            assert len(stats) == 1
+            stats.clear()
+            # the name pattern fails, so the file is never stat'ed
+            assert not pipeline(pathlib.Path(tmpdir)/"data.txt")
+            assert len(stats) == 0
+        finally:
+            os.stat = original_stat
+
+        # the filters still work on their own
+        assert utils.is_exe(exe)
+        assert utils.is_file(exe)
+        assert not utils.is_exe(pathlib.Path(tmpdir)/"data.txt")
+        assert not utils.is_file(pathlib.Path(tmpdir)/"missing")
+        assert not utils.is_debug_exe(exe)
+
+
 def test_sorting_paths():
 
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -282,3 +438,79 @@ def test_sorting_paths():
 
         
 
+
+
+def make_elf_file(path:pathlib.Path, section_names, elf_class=2, byte_order='<'):
+    '''Write a minimal ELF file that only contains a section header table.'''
+    import struct
+    strtab = b'\0'
+    name_offsets = [0]
+    for name in section_names + ['.shstrtab']:
+        name_offsets.append(len(strtab))
+        strtab += name.encode() + b'\0'
+
+    header_size,shentsize = (64,64) if elf_class == 2 else (52,40)
+    strtab_offset = header_size
+    shoff = strtab_offset + len(strtab)
+    shnum = len(name_offsets)
+
+    ident = b'\x7fELF' + bytes([elf_class, 1 if byte_order == '<' else 2, 1]) + b'\0'*9
+    if elf_class == 2:
+        header = ident + struct.pack(byte_order+'HHIQQQIHHHHHH',2,62,1,0,0,shoff,0,header_size,0,0,shentsize,shnum,shnum-1)
+    else:
+        header = ident + struct.pack(byte_order+'HHIIIIIHHHHHH',2,3,1,0,0,shoff,0,header_size,0,0,shentsize,shnum,shnum-1)
+
+    sections = b''
+    for i,name_offset in enumerate(name_offsets):
+        offset,size = (strtab_offset,len(strtab)) if i == shnum-1 else (0,0)
+        if elf_class == 2:
+            sections += struct.pack(byte_order+'IIQQQQIIQQ',name_offset,1,0,0,offset,size,0,0,1,0)
+        else:
+            sections += struct.pack(byte_order+'IIIIIIIIII',name_offset,1,0,0,offset,size,0,0,1,0)
+
+    path.write_bytes(header + strtab + sections)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def test_elf_debug_info_detection():
+    from conan_cmake_cpp_project_tools import elf_utils
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+
+        make_elf_file(tmpdir/"debug-exe", ['.text','.debug_info'])
+        make_elf_file(tmpdir/"debuglink-exe", ['.text','.gnu_debuglink'])
+        make_elf_file(tmpdir/"release-exe", ['.text','.data'])
+        make_elf_file(tmpdir/"debug-exe-32", ['.text','.debug_info'], elf_class=1)
+        make_elf_file(tmpdir/"debug-exe-be", ['.text','.debug_info'], byte_order='>')
+        (tmpdir/"script").write_text("#! /bin/bash\n")
+        os.chmod(tmpdir/"script", os.stat(tmpdir/"script").st_mode | stat.S_IEXEC)
+
+        assert elf_utils.read_section_names(tmpdir/"release-exe") == ['','.text','.data','.shstrtab']
+        assert elf_utils.read_section_names(tmpdir/"debug-exe-32") == ['','.text','.debug_info','.shstrtab']
+        assert elf_utils.read_section_names(tmpdir/"debug-exe-be") == ['','.text','.debug_info','.shstrtab']
+
+        assert elf_utils.has_debug_info(tmpdir/"debug-exe")
+        assert elf_utils.has_debug_info(tmpdir/"debuglink-exe")
+        assert elf_utils.has_debug_info(tmpdir/"debug-exe-32")
+        assert elf_utils.has_debug_info(tmpdir/"debug-exe-be")
+        assert not elf_utils.has_debug_info(tmpdir/"release-exe")
+        assert not elf_utils.has_debug_info(tmpdir/"script")
+
+        if platform.system().lower() == "linux":
+            assert utils.is_debug_exe(tmpdir/"debug-exe")
+            assert not utils.is_debug_exe(tmpdir/"release-exe")
+            assert not utils.is_debug_exe(tmpdir/"script")
+
+        # rebuilding the file with a different size invalidates the cached result
+        make_elf_file(tmpdir/"release-exe", ['.text','.data','.debug_info'])
+        assert elf_utils.has_debug_info(tmpdir/"release-exe")
+
+        # the cache is bounded (the server keeps it for as long as it runs)
+        maxsize = elf_utils._has_debug_info.cache_info().maxsize
+        for i in range(maxsize+10):
+            elf_utils._has_debug_info(str(tmpdir/"script"),(0,i,0,0))
+        assert elf_utils._has_debug_info.cache_info().currsize == maxsize
+        # and a file with a new stamp is read again
+        misses = elf_utils._has_debug_info.cache_info().misses
+        elf_utils._has_debug_info(str(tmpdir/"script"),(0,maxsize+10,0,0))
+        assert elf_utils._has_debug_info.cache_info().misses == misses+1
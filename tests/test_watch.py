@@ -0,0 +1,41 @@
+from conan_cmake_cpp_project_tools import watch
+import tempfile
+import pathlib
+import platform
+import os
+import pytest
+
+
+def check_watcher(watcher,tmpdir):
+    assert watcher.wait(0.01) == set()
+
+    (tmpdir/"src/main.cpp").write_text("int main(){ return 1; }")
+    changed = watch.wait_for_changes(watcher,debounce=0.1,timeout=5)
+    assert tmpdir/"src/main.cpp" in changed
+
+    # editors often save by renaming a new file over the old one
+    (tmpdir/"src/main.cpp.tmp").write_text("int main(){ return 2; }")
+    os.rename(tmpdir/"src/main.cpp.tmp",tmpdir/"src/main.cpp")
+    changed = watch.wait_for_changes(watcher,debounce=0.1,timeout=5)
+    assert tmpdir/"src/main.cpp" in changed
+    assert tmpdir/"src/lib.cpp" not in changed
+
+    assert watcher.wait(0.01) == set()
+
+
+@pytest.mark.parametrize("poll",[True,False])
+def test_watchers(poll):
+    if not poll and platform.system().lower() != "linux":
+        pytest.skip("inotify is only available on linux")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = pathlib.Path(tmpdir)
+        (tmpdir/"src").mkdir()
+        (tmpdir/"src/main.cpp").write_text("int main(){ return 0; }")
+        (tmpdir/"src/lib.cpp").write_text("")
+
+        watcher = watch.make_watcher([tmpdir/"src/main.cpp",tmpdir/"src/lib.cpp"],poll=poll,interval=0.01)
+        assert isinstance(watcher,watch.PollingWatcher if poll else watch.InotifyWatcher)
+        try:
+            check_watcher(watcher,tmpdir)
+        finally:
+            watcher.close()